@@ -1,4 +1,5 @@
 import streamlit as st
+import database.db as db
 
 st.set_page_config(page_title="Data explorer",page_icon=":material/edit:",layout="wide")
 
@@ -12,5 +13,9 @@ grn_explorer = st.Page("server/grn_explorer.py", title="Gene Regulatory Network"
 
 pg = st.navigation([home_page,expression_page,gene_query_page, grn_explorer])
 
-pg.run()
+try:
+    pg.run()
+finally:
+    # return this script run's session to the pool so state doesn't leak into the next rerun
+    db.release_session()
 
@@ -1,24 +1,337 @@
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import quote
 import sqlalchemy as sq
-from sqlalchemy.orm import sessionmaker, joinedload, subqueryload, aliased
+from sqlalchemy.orm import sessionmaker, scoped_session, joinedload, subqueryload, aliased
 import database.models as models 
 import pandas as pd
-from sqlalchemy import or_, func
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import or_, func, event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from sqlalchemy.exc import SQLAlchemyError
 from utils.constants import DEGFilter
 import re
 
+####################
+# Connection profiles
+####################
+# The web app never writes, so it is served through a read-only connection that can use a large
+# memory map and page cache and share the OS page cache between worker processes. Ingestion in
+# db_manager.py uses the read-write profile. The profile is chosen per deployment with the
+# XEROPHYTA_DB_PROFILE environment variable (see DB.PROFILE).
+MMAP_SIZE = int(os.environ.get("XEROPHYTA_DB_MMAP_SIZE", 512 * 1024 * 1024))  # bytes
+CACHE_SIZE = int(os.environ.get("XEROPHYTA_DB_CACHE_SIZE", -64 * 1024))  # negative values are KiB
+
+CONNECTION_PROFILES = {
+    # read-only serving, the file may still be replaced/written by another process
+    "read_only": {
+        "uri_params": {"mode": "ro"},
+        "pragmas": {
+            "query_only": "ON",
+            "mmap_size": MMAP_SIZE,
+            "cache_size": CACHE_SIZE,
+            "temp_store": "MEMORY",
+        },
+    },
+    # read-only serving of a file that is guaranteed not to change (e.g. a built release artifact),
+    # SQLite skips all locking and change detection
+    "immutable": {
+        "uri_params": {"mode": "ro", "immutable": "1"},
+        "pragmas": {
+            "query_only": "ON",
+            "mmap_size": MMAP_SIZE,
+            "cache_size": CACHE_SIZE,
+            "temp_store": "MEMORY",
+        },
+    },
+    # offline builds into a throwaway staging file (db_manager.build_database): no journal and no fsync.
+    # A crash or rollback can corrupt the file, which is then rebuilt from scratch
+    "bulk_load": {
+        "uri_params": {},
+        "pragmas": {
+            "journal_mode": "OFF",
+            "synchronous": "OFF",
+            "cache_size": CACHE_SIZE,
+            "temp_store": "MEMORY",
+        },
+    },
+    # ingestion, WAL lets readers keep working while the loader writes
+    "read_write": {
+        "uri_params": {},
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": CACHE_SIZE,
+            "temp_store": "MEMORY",
+        },
+    },
+}
+
+
+def build_database_url(database_name, profile):
+    """Build the SQLAlchemy URL for a database file opened with the given connection profile."""
+    if profile not in CONNECTION_PROFILES:
+        raise ValueError(f"Unknown connection profile '{profile}'. Expected one of: {list(CONNECTION_PROFILES)}")
+    uri_params = CONNECTION_PROFILES[profile]["uri_params"]
+    if not uri_params:
+        return f"sqlite:///{database_name}"
+    query = "&".join(f"{key}={value}" for key, value in uri_params.items())
+    return f"sqlite:///file:{quote(str(database_name))}?{query}&uri=true"
+
+
+def apply_pragmas(engine, pragmas):
+    """Run the given PRAGMA statements on every new connection made by the engine."""
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+
+####################
+# Free-text search
+####################
+# search field: (FTS5 index table, indexed column), see models.FTS_INDEXES
+TEXT_SEARCH_FIELDS = {
+    "go_name": ("go_name_fts", "go_name"),
+    "enzyme_name": ("enzyme_name_fts", "enzyme_name"),
+    "a_thaliana_common_name": ("a_thaliana_common_name_fts", "a_thaliana_common_name"),
+}
+# terms per compound SELECT, SQLite allows at most 500
+TEXT_SEARCH_CHUNK_SIZE = 200
+
+
+####################
+# Process-wide engine registry
+####################
+# Every page (and every call to retreive_query_data) creates a DB() on each Streamlit rerun.
+# Engines and their connection pools are expensive, so they are built once per database file
+# and profile and shared by the whole process. Sessions are thread-scoped: each Streamlit script
+# thread gets its own session, which is released by release_session() at the end of the script run.
+_ENGINES = {}
+_SESSION_REGISTRIES = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_engine(database_name, profile=None, pool_size=None, max_overflow=None, pool_timeout=None, pool_recycle=None):
+    """Return the shared engine for a database file, creating it on first use.
+
+    Args:
+        database_name (str): Path to the SQLite database file.
+        profile (str, optional): Key of CONNECTION_PROFILES to open the file with. Defaults to DB.PROFILE.
+        pool_size (int, optional): Number of connections kept open in the pool. Defaults to DB.POOL_SIZE.
+        max_overflow (int, optional): Connections allowed above pool_size under load. Defaults to DB.MAX_OVERFLOW.
+        pool_timeout (int, optional): Seconds to wait for a free connection. Defaults to DB.POOL_TIMEOUT.
+        pool_recycle (int, optional): Seconds after which a connection is replaced. Defaults to DB.POOL_RECYCLE.
+
+    Returns:
+        Engine: The SQLAlchemy engine for this database.
+    """
+    profile = profile or DB.PROFILE
+    key = (database_name, profile)
+    engine = _ENGINES.get(key)
+    if engine is not None:
+        return engine
+
+    with _REGISTRY_LOCK:
+        # another thread may have created it while we waited for the lock
+        engine = _ENGINES.get(key)
+        if engine is None:
+            engine = sq.create_engine(
+                build_database_url(database_name, profile),
+                echo=False,
+                poolclass=sq.pool.QueuePool,
+                pool_size=pool_size if pool_size is not None else DB.POOL_SIZE,
+                max_overflow=max_overflow if max_overflow is not None else DB.MAX_OVERFLOW,
+                pool_timeout=pool_timeout if pool_timeout is not None else DB.POOL_TIMEOUT,
+                pool_recycle=pool_recycle if pool_recycle is not None else DB.POOL_RECYCLE,
+                pool_pre_ping=True,
+            )
+            apply_pragmas(engine, CONNECTION_PROFILES[profile]["pragmas"])
+            _ENGINES[key] = engine
+    return engine
+
+
+def get_session_registry(database_name, profile=None):
+    """Return the thread-scoped session registry bound to the shared engine of a database file.
+
+    Calling the registry (or any Session method on it) returns the session of the current thread.
+    """
+    profile = profile or DB.PROFILE
+    key = (database_name, profile)
+    registry = _SESSION_REGISTRIES.get(key)
+    if registry is not None:
+        return registry
+
+    engine = get_engine(database_name, profile)
+    with _REGISTRY_LOCK:
+        registry = _SESSION_REGISTRIES.get(key)
+        if registry is None:
+            registry = scoped_session(sessionmaker(bind=engine))
+            _SESSION_REGISTRIES[key] = registry
+    return registry
+
+
+def release_session(database_name=None):
+    """Close the current thread's session and return its connection to the pool.
+
+    Should be called at the end of every script run so that session state (identity map,
+    open transactions) does not leak into the next rerun.
+
+    Args:
+        database_name (str, optional): Only release the sessions for this database. If None, release all.
+    """
+    for (name, _), registry in list(_SESSION_REGISTRIES.items()):
+        if database_name is None or name == database_name:
+            registry.remove()
+
+
+def dispose_engines(database_name=None):
+    """Release sessions and close every pooled connection. Used by tests and before deleting or swapping database files.
+
+    Args:
+        database_name (str, optional): Only dispose the engines for this database. If None, dispose all.
+    """
+    with _REGISTRY_LOCK:
+        for key in list(_SESSION_REGISTRIES):
+            if database_name is None or key[0] == database_name:
+                _SESSION_REGISTRIES.pop(key).remove()
+        for key in list(_ENGINES):
+            if database_name is None or key[0] == database_name:
+                _ENGINES.pop(key).dispose()
+
+
+####################
+# Published releases
+####################
+# A build (db_manager.build_database) writes an immutable artifact and then atomically rewrites a pointer file
+# holding the artifact's path. When XEROPHYTA_DB_RELEASE_POINTER is set, every new DB() reads the pointer (only
+# when the file changed), so a running app moves to a new release on its next rerun without a restart.
+_RELEASE = {"pointer": None, "mtime": None, "database_name": None}
+
+# expression store files: path -> (mtime, experiment data version the file was exported from)
+_STORE_VERSIONS = {}
+# (path, data version) of the stale store files that were already reported
+_STALE_STORE_WARNINGS = set()
+
+
+def resolve_database_name(default):
+    """Return the database file of the currently published release, or default if no release pointer is configured."""
+    pointer = DB.RELEASE_POINTER
+    if not pointer:
+        return default
+    try:
+        mtime = os.stat(pointer).st_mtime_ns
+    except FileNotFoundError:
+        return default
+    if (_RELEASE["pointer"], _RELEASE["mtime"]) == (pointer, mtime):
+        return _RELEASE["database_name"]
+
+    with open(pointer) as f:
+        database_name = os.path.join(os.path.dirname(pointer), f.read().strip())
+    previous = _RELEASE["database_name"]
+    _RELEASE.update(pointer=pointer, mtime=mtime, database_name=database_name)
+    if previous and previous != database_name:
+        # sessions already handed out keep working, new DB() instances use the new release
+        dispose_engines(previous)
+    return database_name
+
+
 class DB():
 
     # DATABASE_NAME = "test_db.sqlite"
     DATABASE_NAME = "database/data/all_xerophyta_species_db.sqlite"
-    def __init__(self) -> None:
-        
-        self.engine = sq.create_engine(f"sqlite:///{self.DATABASE_NAME}", echo = False)
-        self.conn = self.engine.connect()
 
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+    # Connection pool settings for the shared engine, can be overridden per deployment with environment variables
+    POOL_SIZE = int(os.environ.get("XEROPHYTA_DB_POOL_SIZE", 5))
+    MAX_OVERFLOW = int(os.environ.get("XEROPHYTA_DB_MAX_OVERFLOW", 10))
+    POOL_TIMEOUT = int(os.environ.get("XEROPHYTA_DB_POOL_TIMEOUT", 30))
+    POOL_RECYCLE = int(os.environ.get("XEROPHYTA_DB_POOL_RECYCLE", 3600))
+
+    # Records written per executemany call by bulk_upsert
+    BULK_CHUNK_SIZE = 10000
+    # Genes whose coding sequences are held in memory at once by iter_coding_sequences
+    SEQUENCE_CHUNK_SIZE = 500
+    # Values per IN (...) list of a read or delete, SQLite builds before 3.32 allow at most 999 bound parameters
+    # per statement
+    LOOKUP_CHUNK_SIZE = 900
+
+    # Directory of the optional Parquet expression store (see export_expression_store), None to read from SQLite
+    EXPRESSION_STORE = os.environ.get("XEROPHYTA_EXPRESSION_STORE")
+    # Rows per Parquet row group, about 500 genes of a 60 sample experiment
+    EXPRESSION_STORE_ROW_GROUP_SIZE = 32 * 1024
+    # Parquet schema metadata key holding the experiment data version a store file was exported from
+    EXPRESSION_STORE_VERSION_KEY = b"xerophyta.expression_data_version"
+    EXPRESSION_COLUMNS = ["gene_id", "normalised_expression", "log2_expression", "treatment", "time", "replicate", "gene_name"]
+    # Expression columns with a few distinct values repeated over many rows, returned as pandas categoricals
+    EXPRESSION_DTYPES = {"treatment": "category", "replicate": "category", "gene_name": "category"}
+    # Columns of get_expression_summary, the value columns hold the replicate means
+    SUMMARY_COLUMNS = ["gene_id", "gene_name", "treatment", "time", "n",
+                       "normalised_expression", "normalised_expression_sd", "normalised_expression_sem",
+                       "log2_expression", "log2_expression_sd", "log2_expression_sem"]
+
+    # Connection profile (see CONNECTION_PROFILES). The app only reads, so serve read-only by default
+    PROFILE = os.environ.get("XEROPHYTA_DB_PROFILE", "read_only")
+
+    # Pointer file of the published release to serve instead of DATABASE_NAME (see resolve_database_name),
+    # usually combined with the "immutable" profile
+    RELEASE_POINTER = os.environ.get("XEROPHYTA_DB_RELEASE_POINTER")
+
+    def __init__(self, profile=None) -> None:
+        """
+        Args:
+            profile (str, optional): Connection profile to open the database with, e.g. "read_write"
+                                     for ingestion. Defaults to DB.PROFILE.
+        """
+        self.profile = profile or self.PROFILE
+        self.database_name = resolve_database_name(self.DATABASE_NAME)
+        # engine and session registry are shared across all DB instances in the process,
+        # so constructing a DB on every rerun is cheap
+        self.engine = get_engine(self.database_name, self.profile)
+        self.session = get_session_registry(self.database_name, self.profile)
+        self._conn = None
+
+    @property
+    def conn(self):
+        """A raw connection from the pool, only checked out when first needed."""
+        if self._conn is None or self._conn.closed:
+            self._conn = self.engine.connect()
+        return self._conn
+
+    def close(self):
+        """Release this thread's session and any raw connection held by this instance."""
+        if self._conn is not None and not self._conn.closed:
+            self._conn.close()
+        self.session.remove()
+
+    def read_frame(self, query, dtypes=None):
+        """
+        Execute a query and load its result straight into a DataFrame.
+
+        The query's Core SELECT runs on the session's connection and pandas builds the columns from the cursor,
+        skipping the ORM Row objects made by query.all(). Columns are named after the query's column labels.
+
+        Args:
+            query: an ORM Query or a Core select
+            dtypes (dict, optional): column -> dtype to convert to, e.g. DB.EXPRESSION_DTYPES.
+                                     Columns not in the result are ignored.
+
+        Returns:
+            pd.DataFrame
+        """
+        statement = query.statement if hasattr(query, "statement") else query
+        df = pd.read_sql(statement, self.session.connection())
+        if dtypes:
+            df = df.astype({column: dtype for column, dtype in dtypes.items() if column in df.columns})
+        return df
 
     def add_species(self, name):
         species = self.session.query(models.Species).filter_by(name=name).first()
@@ -42,49 +355,186 @@ class DB():
     def add_a_thaliana_gene_mappings(self, mapping_df):
         """Add A. thaliana gene locus and common name mappings to the Arabidopsis Homologue table.
 
+        Set-based: the distinct loci are upserted into arabidopsis_homologues once, then the gene to homologue
+        pairs are bulk inserted into gene_homologue_association. Existing homologues and links are left unchanged,
+        and for a new locus listed more than once, the common name of its first row is used.
 
         Args:
             mapping_df: dataframe containing the mapping data in format [Gene name, At Locus ID, Wiki gene description] 
                         e.g Xele.ptg000001l.104,AT5G47390,myb-like transcription factor family protein
+
+        Returns:
+            dict: counts of "homologues" and "links" inserted
         """
         required_columns = ["Gene name","At Locus ID","Wiki gene description"]
         if not all(col in mapping_df.columns for col in required_columns):
             raise ValueError(f"Mapping dataframe must contain columns: {required_columns}")
-        
-        i = 0
-        for  _, row in mapping_df.iterrows():
-            gene_name = row['Gene name']
-            locus = row['At Locus ID']
-            common_name = row['Wiki gene description']
-            
-            # 1. Find the existing Gene
-            gene = self.session.query(models.Gene).filter_by(gene_name=gene_name).first()
-            if not gene:
-                # If you have missing genes, handle it or skip
-                print(f"No gene found for {gene_name}, skipping.")
-                continue
-            
-            # 2. See if there's an existing ArabidopsisHomologue with this locus
-            homologue = self.session.query(models.ArabidopsisHomologue).filter_by(a_thaliana_locus=locus).first()
-            if not homologue:
-                # Create new
-                homologue = models.ArabidopsisHomologue(
-                    a_thaliana_locus=locus,
-                    a_thaliana_common_name=common_name,
-                )
-                self.session.add(homologue)
-            
-            # 3. Link them (only if not already linked)
-            if homologue not in gene.arabidopsis_homologues:
-                gene.arabidopsis_homologues.append(homologue)
-
-            if i % 100 == 0:
-                self.session.commit() 
-                print(f"Processed {i} gene mappings.")   
-            i += 1
-        self.session.commit()
-        print(f"Added {i} gene mappings to the database.")
-        
+
+        mapping_df = mapping_df.dropna(subset=["At Locus ID"])
+
+        # 1. Find the existing Genes
+        gene_ids = mapping_df["Gene name"].map(self.get_gene_index()["id"])
+        missing_genes = mapping_df.loc[gene_ids.isna(), "Gene name"].unique()
+        if len(missing_genes):
+            print(f"No gene found for {len(missing_genes)} gene names, skipping them.")
+        mapping_df = mapping_df[gene_ids.notna()]
+        gene_ids = gene_ids[gene_ids.notna()]
+
+        # 2. Add the loci that are not in the homologue table yet
+        homologues = (
+            mapping_df[["At Locus ID", "Wiki gene description"]]
+            .drop_duplicates("At Locus ID")
+            .rename(columns={"At Locus ID": "a_thaliana_locus", "Wiki gene description": "a_thaliana_common_name"})
+        )
+        homologues = homologues.astype(object).where(homologues.notna(), None)
+        added_homologues = self.bulk_upsert(models.ArabidopsisHomologue, homologues.to_dict("records"),
+                                            ["a_thaliana_locus"], update_fields=[])
+
+        # 3. Link them (only if not already linked)
+        homologue_ids = mapping_df["At Locus ID"].map(self.get_id_map(models.ArabidopsisHomologue, "a_thaliana_locus"))
+        links = pd.DataFrame({"gene_id": gene_ids, "homologue_id": homologue_ids}).dropna().astype(int).drop_duplicates()
+        added_links = self.bulk_upsert(models.gene_homologue_association, links.to_dict("records"),
+                                       ["gene_id", "homologue_id"], update_fields=[])
+
+        print(f"Added {added_homologues['inserted']} homologues and {added_links['inserted']} gene mappings to the database.")
+        return {"homologues": added_homologues["inserted"], "links": added_links["inserted"]}
+
+    def bulk_upsert(self, model, values, conflict_fields, update_fields=None, chunk_size=None):
+        """
+        Set-based create or update for large numbers of records, using SQLite's INSERT ... ON CONFLICT DO UPDATE.
+
+        Records are written in chunks with executemany inside a single transaction. The conflict fields must
+        match a unique constraint or unique index declared on the model (e.g. gene_name for Gene).
+
+        The counts come from the statement itself rather than from counting the table: RETURNING gives the rowid
+        of every row that was inserted or updated (rows left unchanged by ON CONFLICT DO NOTHING are not returned),
+        and rows with a rowid above the table's largest rowid before the chunk was written are the inserted ones.
+
+        Parameters:
+            model: the model (or table) in which to perform the Create or Update task
+            values: an iterable of dictionaries specifying the values each record should contain
+            conflict_fields: the unique key columns used to identify whether a record exists
+            update_fields: the columns to overwrite when the record already exists.
+                           Defaults to every other column in the records. If empty, existing records are left unchanged.
+            chunk_size: number of records sent to the database per statement, defaults to DB.BULK_CHUNK_SIZE
+
+        Returns:
+            dict: counts of "inserted", "updated" and "skipped" (existing and left unchanged) records
+        """
+        table = model.__table__ if hasattr(model, "__table__") else model
+        chunk_size = chunk_size or self.BULK_CHUNK_SIZE
+        rowid = sq.literal_column("rowid")
+        max_rowid = sq.select(func.max(rowid)).select_from(table)
+
+        statement = None
+        summary = {"inserted": 0, "updated": 0, "skipped": 0}
+
+        def write(chunk):
+            nonlocal statement
+            if statement is None:
+                statement = self._upsert_statement(table, chunk[0], conflict_fields, update_fields).returning(rowid)
+            last_rowid = self.session.execute(max_rowid).scalar() or 0
+            written = self.session.execute(statement, chunk).scalars().all()
+            inserted = sum(1 for row in written if row > last_rowid)
+            summary["inserted"] += inserted
+            summary["updated"] += len(written) - inserted
+            summary["skipped"] += len(chunk) - len(written)
+
+        processed = 0
+        chunk = []
+        try:
+            for value in values:
+                chunk.append(value)
+                if len(chunk) < chunk_size:
+                    continue
+                write(chunk)
+                processed += len(chunk)
+                print(f"Processed {processed} records")
+                chunk = []
+            if chunk:
+                write(chunk)
+            self.session.commit()
+        except SQLAlchemyError as e:
+            self.session.rollback()
+            print(e)
+            raise e
+
+        print(f"{table.name}: inserted {summary['inserted']}, updated {summary['updated']}, skipped {summary['skipped']} records")
+        return summary
+
+    def get_id_map(self, model, key_field):
+        """
+        Map the values of a lookup column to the ids of the rows that hold them, for tables without a unique
+        key to upsert on (e.g. go_id in GO). If a value occurs more than once, the lowest id is used.
+
+        Args:
+            model: the model whose rows are mapped
+            key_field (str): the lookup column, e.g. "go_id"
+
+        Returns:
+            dict: {key value: id}
+        """
+        key = getattr(model, key_field)
+        rows = self.session.query(key, func.min(model.id)).group_by(key).all()
+        return dict(rows)
+
+    def get_ingestion_ledger(self, source):
+        """
+        Return what was last loaded for an ingestion source (see models.IngestionFile).
+
+        Args:
+            source (str): loader and scope, e.g. "deg:xe_seedlings_time_course"
+
+        Returns:
+            (str or None, dict): the hash of the last loaded file, and {row key: row hash} of the loaded rows
+        """
+        file_hash = self.session.query(models.IngestionFile.file_hash).filter_by(source=source).scalar()
+        rows = self.session.query(models.IngestionRow.row_key, models.IngestionRow.row_hash).filter_by(source=source).all()
+        return file_hash, dict(rows)
+
+    def record_ingestion(self, source, file_name, file_hash, changed_rows, deleted_keys, row_count):
+        """
+        Update the ingestion ledger of a source after its changes were applied.
+
+        Args:
+            source (str): loader and scope, e.g. "deg:xe_seedlings_time_course"
+            file_name (str or None): the input file
+            file_hash (str or None): sha256 of the input file
+            changed_rows (dict): {row key: row hash} of the inserted and updated rows
+            deleted_keys (list): row keys that were deleted
+            row_count (int): number of rows in the input
+        """
+        self.bulk_upsert(models.IngestionRow,
+                         ({"source": source, "row_key": key, "row_hash": row_hash} for key, row_hash in changed_rows.items()),
+                         ["source", "row_key"])
+        try:
+            for start in range(0, len(deleted_keys), self.LOOKUP_CHUNK_SIZE):
+                self.session.query(models.IngestionRow).filter(
+                    models.IngestionRow.source == source,
+                    models.IngestionRow.row_key.in_(deleted_keys[start:start + self.LOOKUP_CHUNK_SIZE])
+                ).delete(synchronize_session=False)
+            self.session.commit()
+        except SQLAlchemyError as e:
+            self.session.rollback()
+            print(e)
+            raise e
+        self.bulk_upsert(models.IngestionFile,
+                         [{"source": source, "file_name": file_name, "file_hash": file_hash,
+                           "row_count": row_count, "loaded_at": datetime.now(timezone.utc)}],
+                         ["source"])
+
+    def _upsert_statement(self, table, sample_record, conflict_fields, update_fields=None):
+        """Build the INSERT ... ON CONFLICT statement for records with the same keys as sample_record."""
+        statement = sqlite_insert(table)
+        if update_fields is None:
+            update_fields = [field for field in sample_record if field not in conflict_fields]
+        if not update_fields:
+            return statement.on_conflict_do_nothing(index_elements=conflict_fields)
+        return statement.on_conflict_do_update(
+            index_elements=conflict_fields,
+            set_={field: statement.excluded[field] for field in update_fields}
+        )
+
     def create_or_update(self, model, values, lookup_fields):
         """
     Generic method to create or update any record in any model and return an instance of that record.
@@ -184,19 +634,28 @@ class DB():
         if instances:
             self.session.commit()
 
-    def get_gene_expression_data(self, gene_names, experiment_name, filter_deg=DEGFilter.SHOW_ALL):
+    def get_gene_expression_data(self, gene_names, experiment_name, filter_deg=DEGFilter.SHOW_ALL, treatments=None,
+                                 gene_ids=None):
         """
         Fetches RNA-seq gene expression data for the specified genes and experiment, applying DEG filtering if required.
 
+        If an expression store is configured (see DB.EXPRESSION_STORE) and holds an up to date copy of the
+        experiment, the values are read from its Parquet file instead of SQLite.
+
         Parameters:
-            gene_names (list): List of gene names.
+            gene_names (list): List of gene names. Ignored when gene_ids is given.
             experiment_name (str): Name of the experiment.
             filter_deg (DEGFilter): DEG filter option (Enum).
+            treatments (list, optional): Only return these treatments, e.g. ["De"].
+            gene_ids (list, optional): Ids of the genes to fetch instead of gene_names, e.g. from match_terms_to_genes.
 
         Returns:
             pd.DataFrame: A DataFrame containing the filtered gene expression data.
         """
-        
+        store_path = self.expression_store_path(experiment_name)
+        if store_path is not None and self._expression_store_is_current(store_path, experiment_name):
+            return self._get_gene_expression_data_from_store(store_path, gene_names, filter_deg, treatments, gene_ids)
+
         query = (
             self.session.query(
                 models.Gene_expressions.gene_id,
@@ -210,30 +669,281 @@ class DB():
             .join(models.Gene, models.Gene_expressions.gene_id == models.Gene.id)
             .join(models.Experiments, models.Gene_expressions.experiment_id == models.Experiments.id)
             .filter(models.Experiments.experiment_name == experiment_name)
-            .filter(models.Gene.gene_name.in_(gene_names))
         )
+        if treatments is not None:
+            query = query.filter(models.Gene_expressions.treatment.in_(treatments))
 
         # Apply DEG filtering based on the selected option
-        if filter_deg == DEGFilter.SHOW_DEG:
+        deg_condition = self._deg_filter_condition(filter_deg)
+        if deg_condition is not None:
             query = query.join(models.DifferentialExpression, models.DifferentialExpression.gene_id == models.Gene.id)
-            query = query.filter(
-                (models.DifferentialExpression.re_set.isnot(None)) | (models.DifferentialExpression.de_set.isnot(None))
-            )
+            query = query.filter(deg_condition)
+
+        return self._read_gene_frame(query, models.Gene_expressions.gene_id, gene_names, gene_ids)
+
+    def _gene_conditions(self, gene_id_column, gene_names, gene_ids):
+        """
+        Filters on gene_id_column for gene_ids if given, otherwise on the gene names (which needs a join to Gene),
+        one per DB.LOOKUP_CHUNK_SIZE genes. An empty list gives a single filter matching nothing.
+        """
+        if gene_ids is not None:
+            genes, column = [int(gene_id) for gene_id in gene_ids], gene_id_column
+        else:
+            genes, column = list(gene_names), models.Gene.gene_name
+        for start in range(0, max(len(genes), 1), self.LOOKUP_CHUNK_SIZE):
+            yield column.in_(genes[start:start + self.LOOKUP_CHUNK_SIZE])
+
+    def _read_gene_frame(self, query, gene_id_column, gene_names, gene_ids, sort_by=None):
+        """
+        read_frame of a query for the genes in gene_ids or gene_names (see _gene_conditions), with the columns in
+        DB.EXPRESSION_DTYPES converted. Long gene lists are read one chunk at a time and concatenated, re-sorted on
+        sort_by if given.
+        """
+        frames = [self.read_frame(query.filter(condition))
+                  for condition in self._gene_conditions(gene_id_column, gene_names, gene_ids)]
+        if len(frames) == 1:
+            df = frames[0]
+        else:
+            df = pd.concat(frames, ignore_index=True)
+            if sort_by is not None:
+                df = df.sort_values(sort_by, ignore_index=True)
+        return df.astype({column: dtype for column, dtype in self.EXPRESSION_DTYPES.items() if column in df.columns})
+
+    def _deg_filter_condition(self, filter_deg):
+        """The DifferentialExpression filter of a DEG filter option, or None to show all genes."""
+        if filter_deg == DEGFilter.SHOW_DEG:
+            return (models.DifferentialExpression.re_set.isnot(None)) | (models.DifferentialExpression.de_set.isnot(None))
         elif filter_deg == DEGFilter.SHOW_UP:
-            query = query.join(models.DifferentialExpression, models.DifferentialExpression.gene_id == models.Gene.id)
-            query = query.filter(
-                (models.DifferentialExpression.re_direction == "Up-regulated") | (models.DifferentialExpression.de_direction == "Up-regulated")
-            )
+            return (models.DifferentialExpression.re_direction == "Up-regulated") | (models.DifferentialExpression.de_direction == "Up-regulated")
         elif filter_deg == DEGFilter.SHOW_DOWN:
-            query = query.join(models.DifferentialExpression, models.DifferentialExpression.gene_id == models.Gene.id)
-            query = query.filter(
-                (models.DifferentialExpression.re_direction == "Down-regulated") | (models.DifferentialExpression.de_direction == "Down-regulated")
+            return (models.DifferentialExpression.re_direction == "Down-regulated") | (models.DifferentialExpression.de_direction == "Down-regulated")
+        return None
+
+    # Columnar expression store: an optional Parquet copy of the gene_expressions table, one file per experiment, sorted by gene name and
+    # written in row groups of a few hundred genes. Filters on gene_name and treatment are pushed down to the
+    # row group statistics, so a query only decodes the row groups holding the requested genes.
+    # The store is a plain directory that can outlive the database it was exported from (a reload, a new release), so
+    # every file records the experiment's data_version and is only read while that matches the database being served.
+
+    def get_expression_data_version(self, experiment_name):
+        """The data version of an experiment's expression values (see touch_expression_data), None if it has none yet."""
+        return self.session.query(models.Experiments.data_version).filter(
+            models.Experiments.experiment_name == experiment_name).scalar()
+
+    def touch_expression_data(self, experiment_ids=None):
+        """
+        Give experiments a new data version after their expression values were written or deleted, so copies
+        exported before (the expression store) are no longer used.
+
+        Args:
+            experiment_ids (list, optional): the experiments that changed, defaults to all experiments
+        """
+        try:
+            experiments = self.session.query(models.Experiments)
+            if experiment_ids is not None:
+                experiments = experiments.filter(models.Experiments.id.in_([int(i) for i in experiment_ids]))
+            for experiment in experiments:
+                experiment.data_version = uuid.uuid4().hex
+            self.session.commit()
+        except SQLAlchemyError as e:
+            self.session.rollback()
+            print(e)
+            raise e
+
+    def _expression_store_is_current(self, path, experiment_name):
+        """Whether an experiment's store file exists and was exported from its current expression values."""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        cached = _STORE_VERSIONS.get(path)
+        if cached is None or cached[0] != mtime:
+            metadata = pq.read_schema(path).metadata or {}
+            cached = (mtime, metadata.get(self.EXPRESSION_STORE_VERSION_KEY, b"").decode())
+            _STORE_VERSIONS[path] = cached
+
+        data_version = self.get_expression_data_version(experiment_name)
+        if data_version is not None and cached[1] == data_version:
+            return True
+        if (path, data_version) not in _STALE_STORE_WARNINGS:
+            _STALE_STORE_WARNINGS.add((path, data_version))
+            print(f"Warning: {path} was not exported from the expression values of {experiment_name} in "
+                  f"{self.database_name}, reading them from SQLite. Re-export the expression store to use it.")
+        return False
+
+    def expression_store_path(self, experiment_name, store_dir=None):
+        """Path of an experiment's Parquet file in the expression store, or None if no store is configured."""
+        store_dir = store_dir or self.EXPRESSION_STORE
+        if not store_dir:
+            return None
+        return os.path.join(store_dir, f"{experiment_name}.parquet")
+
+    def export_expression_store(self, experiment_name, store_dir=None):
+        """
+        Write the expression values of an experiment to the expression store.
+
+        Args:
+            experiment_name (str): Name of the experiment.
+            store_dir (str, optional): Directory of the store, defaults to DB.EXPRESSION_STORE.
+
+        Returns:
+            str: path of the written Parquet file
+        """
+        path = self.expression_store_path(experiment_name, store_dir)
+        if path is None:
+            raise ValueError("No expression store directory given and XEROPHYTA_EXPRESSION_STORE is not set")
+        query = (
+            self.session.query(
+                models.Gene_expressions.gene_id,
+                models.Gene_expressions.normalised_expression,
+                models.Gene_expressions.log2_expression,
+                models.Gene_expressions.treatment,
+                models.Gene_expressions.time,
+                models.Gene_expressions.replicate,
+                models.Gene.gene_name
             )
+            .join(models.Gene, models.Gene_expressions.gene_id == models.Gene.id)
+            .join(models.Experiments, models.Gene_expressions.experiment_id == models.Experiments.id)
+            .filter(models.Experiments.experiment_name == experiment_name)
+            .order_by(models.Gene.gene_name, models.Gene_expressions.treatment, models.Gene_expressions.time,
+                      models.Gene_expressions.replicate)
+        )
+        df = self.read_frame(query)
+        data_version = self.get_expression_data_version(experiment_name)
+        if data_version is None:
+            # loaded before data versions were recorded
+            self.touch_expression_data([self.get_experiment_by_name(experiment_name).id])
+            data_version = self.get_expression_data_version(experiment_name)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               self.EXPRESSION_STORE_VERSION_KEY: data_version.encode()})
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file and swap it in, so readers never see a partial file
+        temp_path = f"{path}.tmp"
+        pq.write_table(table, temp_path, row_group_size=self.EXPRESSION_STORE_ROW_GROUP_SIZE, compression="zstd")
+        os.replace(temp_path, path)
+        print(f"Exported {len(df)} expression values of {experiment_name} to {path}")
+        return path
+
+    def _get_gene_expression_data_from_store(self, path, gene_names, filter_deg, treatments, gene_ids=None):
+        """get_gene_expression_data read from an experiment's Parquet file."""
+        deg_condition = self._deg_filter_condition(filter_deg)
+        if deg_condition is not None or gene_ids is not None:
+            # the file is sorted and pruned by gene name, and the DEG flags are small and live in SQLite,
+            # so resolve the ids and apply the flags to the gene names before reading
+            query = self.session.query(models.Gene.gene_name).distinct()
+            if deg_condition is not None:
+                query = query.join(models.DifferentialExpression, models.DifferentialExpression.gene_id == models.Gene.id)
+                query = query.filter(deg_condition)
+            gene_names = [name for condition in self._gene_conditions(models.Gene.id, gene_names, gene_ids)
+                          for (name,) in query.filter(condition)]
+        gene_names = list(gene_names)
+
+        condition = pc.field("gene_name").isin(pa.array(gene_names, type=pa.string()))
+        if treatments is not None:
+            condition = condition & pc.field("treatment").isin(pa.array(list(treatments), type=pa.string()))
+        table = ds.dataset(path, format="parquet").to_table(columns=self.EXPRESSION_COLUMNS, filter=condition)
+        return table.to_pandas().astype(self.EXPRESSION_DTYPES)
+
+    # Replicate summary: models.ExpressionSummary holds the mean, SD and SEM of every gene's time points, so pages that
+    # only plot mean lines read one row per time point instead of every replicate and aggregating them on each rerun.
+
+    def refresh_expression_summary(self, experiment_name, gene_ids=None):
+        """
+        Recompute the replicate summary of an experiment from its expression values.
 
-        # Execute query and return results as a DataFrame
-        result = query.all()
-        columns = ["gene_id", "normalised_expression", "log2_expression", "treatment", "time", "replicate","gene_name"]
-        return pd.DataFrame(result, columns=columns)
+        Args:
+            experiment_name (str): Name of the experiment.
+            gene_ids (list, optional): Only recompute these genes, e.g. the genes that were just loaded. Defaults to all genes.
+
+        Returns:
+            int: number of summary rows written
+        """
+        experiment_id = self.session.query(models.Experiments.id).filter(
+            models.Experiments.experiment_name == experiment_name).scalar()
+        if experiment_id is None:
+            raise ValueError(f"Experiment '{experiment_name}' not found in the database")
+
+        expression = models.Gene_expressions
+        summary = models.ExpressionSummary
+        gene_ids = sorted({int(gene_id) for gene_id in gene_ids}) if gene_ids is not None else None
+        gene_chunks = [None] if gene_ids is None else [
+            gene_ids[start:start + self.LOOKUP_CHUNK_SIZE] for start in range(0, len(gene_ids), self.LOOKUP_CHUNK_SIZE)]
+
+        written = 0
+        try:
+            for chunk in gene_chunks:
+                values = self.session.query(expression.gene_id, expression.treatment, expression.time,
+                                            expression.normalised_expression, expression.log2_expression
+                                            ).filter(expression.experiment_id == experiment_id)
+                stale = self.session.query(summary).filter(summary.experiment_id == experiment_id)
+                if chunk is not None:
+                    values = values.filter(expression.gene_id.in_(chunk))
+                    stale = stale.filter(summary.gene_id.in_(chunk))
+                df = self.read_frame(values)
+                stale.delete(synchronize_session=False)
+                records = summarise_replicates(df)
+                if records.empty:
+                    continue
+                records["experiment_id"] = experiment_id
+                records = records.astype(object).where(records.notna(), None).to_dict("records")
+                for start in range(0, len(records), self.BULK_CHUNK_SIZE):
+                    self.session.execute(sq.insert(summary), records[start:start + self.BULK_CHUNK_SIZE])
+                written += len(records)
+            self.session.commit()
+        except SQLAlchemyError as e:
+            self.session.rollback()
+            print(e)
+            raise e
+        return written
+
+    def get_expression_summary(self, gene_names, experiment_name, filter_deg=DEGFilter.SHOW_ALL, treatments=None,
+                               gene_ids=None):
+        """
+        Fetches the replicate mean, SD, SEM and number of replicates of each time point for the specified genes,
+        with the same filters as get_gene_expression_data.
+
+        Parameters:
+            gene_names (list): List of gene names.
+            experiment_name (str): Name of the experiment.
+            filter_deg (DEGFilter): DEG filter option (Enum).
+            treatments (list, optional): Only return these treatments, e.g. ["De"].
+            gene_ids (list, optional): Ids of the genes to fetch instead of gene_names.
+
+        Returns:
+            pd.DataFrame: one row per gene, treatment and time with the columns in DB.SUMMARY_COLUMNS
+        """
+        summary = models.ExpressionSummary
+        query = (
+            self.session.query(
+                summary.gene_id,
+                models.Gene.gene_name,
+                summary.treatment,
+                summary.time,
+                summary.n,
+                summary.normalised_expression,
+                summary.normalised_expression_sd,
+                summary.normalised_expression_sem,
+                summary.log2_expression,
+                summary.log2_expression_sd,
+                summary.log2_expression_sem,
+            )
+            .join(models.Gene, summary.gene_id == models.Gene.id)
+            .join(models.Experiments, summary.experiment_id == models.Experiments.id)
+            .filter(models.Experiments.experiment_name == experiment_name)
+        )
+        if treatments is not None:
+            query = query.filter(summary.treatment.in_(treatments))
+
+        deg_condition = self._deg_filter_condition(filter_deg)
+        if deg_condition is not None:
+            query = query.join(models.DifferentialExpression, models.DifferentialExpression.gene_id == models.Gene.id)
+            query = query.filter(deg_condition)
+
+        query = query.order_by(models.Gene.gene_name, summary.treatment, summary.time)
+        return self._read_gene_frame(query, summary.gene_id, gene_names, gene_ids,
+                                     sort_by=["gene_name", "treatment", "time"])
 
     def get_species(self):
         """Retrieve all the species from the database.
@@ -269,6 +979,21 @@ class DB():
     def get_gene_by_name(self, gene_name):
         query = self.session.query(models.Gene).filter_by(gene_name=gene_name).first()
         return query
+
+    def get_gene_index(self, species_id=None):
+        """Load the gene name -> id lookup in a single query, for resolving whole columns of gene names at once.
+
+        Args:
+            species_id (int, optional): Only include genes of this species. If None, include all genes.
+
+        Returns:
+            pd.DataFrame: Columns "id" and "species_id", indexed by gene_name.
+        """
+        query = self.session.query(models.Gene.gene_name, models.Gene.id, models.Gene.species_id)
+        if species_id is not None:
+            query = query.filter(models.Gene.species_id == species_id)
+        gene_index = self.read_frame(query)
+        return gene_index.set_index("gene_name")
     
     def get_gene_names_from_species(self, species_name= None):
         """Return all gene objects for  a specific species
@@ -324,7 +1049,8 @@ class DB():
                                     target_cluster=None,
                                     directions=None,
                                     species_name=None,
-                                    limit=1000): # Add a limit to prevent overwhelming results
+                                    limit=1000, # Add a limit to prevent overwhelming results
+                                    as_frame=False):
         """
         Retrieves gene regulatory interactions based on specified filters.
 
@@ -336,11 +1062,12 @@ class DB():
             directions (list, optional): Filter by a list of regulation directions (e.g., ['Activation', 'Repression']).
             species_name (str, optional): Filter by species name for the interacting genes.
             limit (int, optional): Maximum number of results to return.
+            as_frame (bool, optional): Return a DataFrame (clusters and direction as categoricals) instead of a list.
 
         Returns:
             list: A list of dictionaries, where each dictionary represents an interaction
-                  with 'regulator_gene_name', 'target_gene_name', 'regulatory_cluster',
-                  'target_cluster', and 'direction'.
+                  with 'Regulator Gene', 'Target Gene', 'Regulatory Cluster',
+                  'Target Cluster', and 'Direction'.
         """
         RegulatorGene = aliased(models.Gene, name="regulator_gene")
         TargetGene = aliased(models.Gene, name="target_gene")
@@ -379,22 +1106,20 @@ class DB():
             else:
                 # Handle case where species name is invalid - perhaps return empty or log warning
                 print(f"Warning: Species '{species_name}' not found for GRN query.")
-                return [] # Or raise an error, or ignore the species filter
-
-        results = query.limit(limit).all()
-
-        # Convert results to a list of dictionaries for easier DataFrame creation
-        output_data = [
-            {
-                "Regulator Gene": r.regulator_gene_name,
-                "Target Gene": r.target_gene_name,
-                "Regulatory Cluster": r.regulatory_cluster,
-                "Target Cluster": r.target_cluster,
-                "Direction": str(r.direction) # Convert Enum to string for display
-            }
-            for r in results
-        ]
-        return output_data
+                query = query.filter(sq.false()) # Or raise an error, or ignore the species filter
+
+        interactions = self.read_frame(query.limit(limit), {
+            "regulatory_cluster": "category", "target_cluster": "category", "direction": "category"
+        }).rename(columns={
+            "regulator_gene_name": "Regulator Gene",
+            "target_gene_name": "Target Gene",
+            "regulatory_cluster": "Regulatory Cluster",
+            "target_cluster": "Target Cluster",
+            "direction": "Direction",
+        })
+        if as_frame:
+            return interactions
+        return interactions.astype(object).where(interactions.notna(), None).to_dict("records")
 
     
     def get_gene_annotation_data(self, gene_list, query_type, species_name= "Any"):
@@ -466,114 +1191,243 @@ class DB():
                     .subqueryload(models.Annotation.interpro_ids),
                 subqueryload(models.Gene.arabidopsis_homologues)
             )
-            .filter(models.Gene.gene_name.in_(gene_list))
         )
 
         if species_id is not None:
             query = query.filter(models.Gene.species_id == species_id)
-        return query.all()     
+        return self._all_in_chunks(query, models.Gene.gene_name, gene_list)
     
     def get_gene_annotation_data_from_a_thaliana_locus_homologue(self, gene_list, species_id=None):
         
+        # lower(a_thaliana_locus) is backed by an expression index, so this is an index lookup per locus
         query = (
             self.session.query(models.Gene)
             .join(models.Gene.arabidopsis_homologues)
-            .filter(
-                func.lower(models.ArabidopsisHomologue.a_thaliana_locus)
-                .in_([locus.lower() for locus in gene_list]))
         )
         if species_id is not None:
             query = query.filter(models.Gene.species_id == species_id)
-        return query.all()        
+        return self._all_in_chunks(query, func.lower(models.ArabidopsisHomologue.a_thaliana_locus),
+                                   {locus.strip().lower() for locus in gene_list})
     
     def get_gene_annotation_data_from_a_thaliana_common_name(self, gene_list, species_id=None):
         """
             Search for genes based on partial matches of the Arabidopsis common names.
             
             Parameters:
-                session (Session): SQLAlchemy session.
-                search_terms (list of str): List of search terms to match against the common names.
+                gene_list (list of str): List of search terms to match against the common names.
+                species_id (int, optional): Only return genes of this species.
             
             Returns:
                 List of Gene objects that match any of the search criteria.
             """
-        filters = [
-                models.ArabidopsisHomologue.a_thaliana_common_name.ilike(f"%{term}%")
-                for term in gene_list
-                ]
-    
-        # Query Genes by joining with the homologues table and filtering with an OR condition
-        query = (
-            self.session.query(models.Gene)
-                .join(models.Gene.arabidopsis_homologues)
-                .filter(or_(*filters))
-                .distinct()
-        )
-        if species_id is not None:
-            query = query.filter(models.Gene.species_id == species_id)
-        return query.all()    
-                
+        return self._genes_from_text_search(gene_list, "a_thaliana_common_name", species_id)
+
     def get_gene_annotation_data_from_go_ids(self, go_list, species_id=None):
-        # Normalize the GO terms provided by the user.
-        normalized_go_list = [self.normalize_go_term(go) for go in go_list]
+        # GO ids are stored with their branch prefix (e.g. "F:GO:0005524"), so expand each normalised
+        # input into the exact keys it can match and look them up through the lower(go_id) index
+        lookup_keys = set()
+        for go in go_list:
+            lookup_keys.update(self.go_id_lookup_keys(go))
 
-        # Use lower for case-insensitive matching
         query = (
             self.session.query(models.Gene)
             .join(models.Gene.annotations)
             .join(models.Annotation.go_ids)
-            .filter(func.lower(models.GO.go_id).like(f"%{normalized_go_list[0].lower()}"))
             .distinct()
         )
         if species_id is not None:
             query = query.filter(models.Gene.species_id == species_id)
-        return query.all()        
+        return self._all_in_chunks(query, func.lower(models.GO.go_id), lookup_keys)
     
     def get_gene_annotation_data_from_go_names(self, go_name_list, species_id=None):
-        filters = [
-            models.GO.go_name.ilike(f"%{name}%") for name in go_name_list
-        ]
-        query = (
-            self.session.query(models.Gene)
-            .join(models.Gene.annotations)
-            .join(models.Annotation.go_ids)
-            .filter(or_(*filters))
-            .distinct()
-        )
-        if species_id is not None:
-            query = query.filter(models.Gene.species_id == species_id)
-        return query.all()    
+        return self._genes_from_text_search(go_name_list, "go_name", species_id)
     
     def get_gene_annotation_data_from_enzyme_codes(self, enzyme_code_list, species_id=None):
         query = (
             self.session.query(models.Gene)
             .join(models.Gene.annotations)
             .join(models.Annotation.enzyme_codes)
-            .filter(func.lower(models.EnzymeCode.enzyme_code)
-            .in_([enzyme_code.lower() for enzyme_code in enzyme_code_list]))
             .distinct()
         )
         if species_id is not None:
             query = query.filter(models.Gene.species_id == species_id)
-        return query.all()
+        return self._all_in_chunks(query, func.lower(models.EnzymeCode.enzyme_code),
+                                   {enzyme_code.strip().lower() for enzyme_code in enzyme_code_list})
+
+    def _all_in_chunks(self, query, column, values):
+        """
+        query.all() filtered on column IN values, one query per DB.LOOKUP_CHUNK_SIZE values. Objects matched by
+        more than one chunk are returned once, in the order they were first found.
+        """
+        values = list(values)
+        results = {}
+        for start in range(0, len(values), self.LOOKUP_CHUNK_SIZE):
+            results.update(dict.fromkeys(query.filter(column.in_(values[start:start + self.LOOKUP_CHUNK_SIZE])).all()))
+        return list(results)
     
     def get_gene_annotation_data_from_enzyme_names(self, enzyme_name_list, species_id=None):
-        
-        filters = [
-            models.EnzymeCode.enzyme_name.ilike(f"%{term}%") 
-            for term in enzyme_name_list 
-            ]
-        query = (
-            self.session.query(models.Gene)
-                .join(models.Gene.annotations)
-                .join(models.Annotation.enzyme_codes)
-                .filter(or_(*filters))
-                .distinct()
+        return self._genes_from_text_search(enzyme_name_list, "enzyme_name", species_id)
+
+    def search_text(self, terms, field, species_id=None):
+        """
+        Case-insensitive substring search of GO names, enzyme names or Arabidopsis common names
+        through their FTS5 trigram indexes (see models.FTS_INDEXES).
+
+        Args:
+            terms (list of str): Search terms, each matched as a substring (like ilike('%term%')).
+            field (str): One of "go_name", "enzyme_name" or "a_thaliana_common_name".
+            species_id (int, optional): Only return genes of this species.
+
+        Returns:
+            list: Rows of (gene_id, gene_name, term), one for every gene and input term that matched it.
+        """
+        if field not in TEXT_SEARCH_FIELDS:
+            raise ValueError(f"Unknown search field '{field}'. Expected one of: {list(TEXT_SEARCH_FIELDS)}")
+
+        terms = list(dict.fromkeys(term.strip() for term in terms if term and term.strip()))
+        results = []
+        # SQLite limits the number of SELECTs in a compound statement, so search in chunks of terms
+        for start in range(0, len(terms), TEXT_SEARCH_CHUNK_SIZE):
+            matches = self._text_search_matches(terms[start:start + TEXT_SEARCH_CHUNK_SIZE], field)
+            query = self._join_text_search_matches_to_genes(matches, field)
+            if species_id is not None:
+                query = query.filter(models.Gene.species_id == species_id)
+            results.extend(query.distinct().all())
+        return results
+
+    def _text_search_matches(self, terms, field):
+        """Subquery of (entity_id, term) for every row of the field's FTS index that contains a term."""
+        fts_table, column = TEXT_SEARCH_FIELDS[field]
+        fts = sq.table(fts_table, sq.column("rowid"), sq.column(column))
+        selects = []
+        for term in terms:
+            # an ESCAPE clause stops FTS5 from using the trigram index, so only add one when needed
+            if any(char in term for char in "%_\\"):
+                escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                condition = fts.c[column].like(f"%{escaped}%", escape="\\")
+            else:
+                condition = fts.c[column].like(f"%{term}%")
+            selects.append(
+                sq.select(fts.c.rowid.label("entity_id"), sq.literal(term).label("term")).where(condition)
+            )
+        return sq.union_all(*selects).subquery("matches")
+
+    def _join_text_search_matches_to_genes(self, matches, field):
+        """Query of (gene_id, gene_name, term) following the association tables from the matched rows to their genes."""
+        query = self.session.query(
+            models.Gene.id.label("gene_id"),
+            models.Gene.gene_name,
+            matches.c.term
+        )
+        if field == "a_thaliana_common_name":
+            association = models.gene_homologue_association
+            return (
+                query.join(association, association.c.gene_id == models.Gene.id)
+                .join(matches, matches.c.entity_id == association.c.homologue_id)
+            )
+
+        if field == "go_name":
+            association, entity_column = models.annotations_go, models.annotations_go.c.go_id
+        else:
+            association, entity_column = models.annotations_enzyme_codes, models.annotations_enzyme_codes.c.enzyme_code_id
+        return (
+            query.join(models.Annotation, models.Annotation.gene_id == models.Gene.id)
+            .join(association, association.c.annotation_id == models.Annotation.id)
+            .join(matches, matches.c.entity_id == entity_column)
+        )
+
+    def _genes_from_text_search(self, terms, field, species_id=None):
+        """Gene objects for every gene matched by search_text."""
+        return self.get_genes_by_ids({row.gene_id for row in self.search_text(terms, field, species_id)})
+
+    def get_genes_by_ids(self, gene_ids):
+        """Gene objects for a collection of gene ids, ordered by id, without loading any relationships."""
+        gene_ids = sorted({int(gene_id) for gene_id in gene_ids})
+        genes = []
+        for start in range(0, len(gene_ids), self.LOOKUP_CHUNK_SIZE):
+            genes.extend(self.session.query(models.Gene)
+                         .filter(models.Gene.id.in_(gene_ids[start:start + self.LOOKUP_CHUNK_SIZE]))
+                         .order_by(models.Gene.id).all())
+        return genes
+
+    def match_terms_to_genes(self, terms, query_type, species_name="Any"):
+        """
+        Find the genes matched by a list of search terms, labelled with the input term that matched each of them,
+        so which terms matched (or did not) is a set operation on the result.
+
+        Every query type of get_gene_annotation_data is supported and matches the same genes. Exact lookups join
+        the genes to a subquery of (term, lookup key) pairs; the free-text fields go through search_text.
+
+        Args:
+            terms (list of str): gene names, Arabidopsis loci or common names, GO ids or names, enzyme codes or names
+            query_type (str): e.g. "xerophyta_gene_name", "a_thaliana_locus", "go_id", "go_name", "enzyme_code"
+            species_name (str, optional): Only return genes of this species, "Any" for all species.
+
+        Returns:
+            pd.DataFrame: columns gene_id, gene_name and term, one row for every gene and input term that matched it
+        """
+        if isinstance(terms, str):
+            terms = [terms]
+        terms = list(dict.fromkeys(term.strip() for term in terms if term and term.strip()))
+        species_id = None if species_name == "Any" else self.get_species_by_name(species_name).id
+        columns = ["gene_id", "gene_name", "term"]
+
+        if query_type in TEXT_SEARCH_FIELDS:
+            return pd.DataFrame(self.search_text(terms, query_type, species_id), columns=columns)
+        if query_type == "xerophyta_gene_name":
+            keys = [(term, term) for term in terms]
+        elif query_type == "go_id":
+            keys = [(term, key) for term in terms for key in self.go_id_lookup_keys(term)]
+        elif query_type in ("a_thaliana_locus", "enzyme_code"):
+            keys = [(term, term.lower()) for term in terms]
+        else:
+            raise ValueError(f"Unknown query type '{query_type}'")
+
+        frames = [pd.DataFrame(columns=columns)]
+        # SQLite limits the number of SELECTs in a compound statement, so look up the keys in chunks
+        for start in range(0, len(keys), TEXT_SEARCH_CHUNK_SIZE):
+            lookup = self._term_lookup_keys(keys[start:start + TEXT_SEARCH_CHUNK_SIZE])
+            query = self._join_term_lookup_keys_to_genes(lookup, query_type)
+            if species_id is not None:
+                query = query.filter(models.Gene.species_id == species_id)
+            frames.append(self.read_frame(query.distinct()))
+        return pd.concat(frames, ignore_index=True).drop_duplicates(ignore_index=True)
+
+    def _term_lookup_keys(self, keys):
+        """Subquery of the (term, key) pairs of a term lookup, the key being the value to look up for the term."""
+        return sq.union_all(*[
+            sq.select(sq.literal(term).label("term"), sq.literal(key).label("key")) for term, key in keys
+        ]).subquery("lookup")
+
+    def _join_term_lookup_keys_to_genes(self, lookup, query_type):
+        """Query of (gene_id, gene_name, term) joining the lookup keys to the column the query type searches."""
+        query = self.session.query(
+            models.Gene.id.label("gene_id"),
+            models.Gene.gene_name,
+            lookup.c.term
+        ).select_from(lookup)
+        if query_type == "xerophyta_gene_name":
+            return query.join(models.Gene, models.Gene.gene_name == lookup.c.key)
+        if query_type == "a_thaliana_locus":
+            association = models.gene_homologue_association
+            return (
+                query.join(models.ArabidopsisHomologue, func.lower(models.ArabidopsisHomologue.a_thaliana_locus) == lookup.c.key)
+                .join(association, association.c.homologue_id == models.ArabidopsisHomologue.id)
+                .join(models.Gene, models.Gene.id == association.c.gene_id)
+            )
+        if query_type == "go_id":
+            term_match = func.lower(models.GO.go_id) == lookup.c.key
+            association, term_model, entity_column = models.annotations_go, models.GO, models.annotations_go.c.go_id
+        else:
+            term_match = func.lower(models.EnzymeCode.enzyme_code) == lookup.c.key
+            association, term_model = models.annotations_enzyme_codes, models.EnzymeCode
+            entity_column = models.annotations_enzyme_codes.c.enzyme_code_id
+        return (
+            query.join(term_model, term_match)
+            .join(association, entity_column == term_model.id)
+            .join(models.Annotation, models.Annotation.id == association.c.annotation_id)
+            .join(models.Gene, models.Gene.id == models.Annotation.gene_id)
         )
-        if species_id is not None:
-            query = query.filter(models.Gene.species_id == species_id)
-        
-        return query.all()
 
     def normalize_go_term(self, go_term):
         """
@@ -586,14 +1440,28 @@ class DB():
         if match:
             return match.group(1).upper()
         return go_term.upper()
+
+    def go_id_lookup_keys(self, go_term):
+        """
+        Returns the lower-cased GO ids a user term can match in the GO table.
+        GO ids are stored with or without their branch prefix, so "GO:0005524" (or just "0005524")
+        expands to "go:0005524", "p:go:0005524", "f:go:0005524" and "c:go:0005524".
+        """
+        go_id = self.normalize_go_term(go_term.strip())
+        if go_id.isdigit():
+            go_id = f"GO:{go_id}"
+        go_id = go_id.lower()
+        return [go_id] + [f"{branch}:{go_id}" for branch in ("p", "f", "c")]
       
     def flatten_gene_annotation_data(self, gene_annotations):
         data = []
+        # Gene.coding_sequence is deferred, fetch the sequences of all genes at once rather than one query per gene
+        coding_sequences = self.get_coding_sequences([gene.gene_name for gene in gene_annotations])
 
         for gene in gene_annotations: 
             species = gene.species.name 
             gene_name=gene.gene_name
-            coding_sequence = gene.coding_sequence
+            coding_sequence = coding_sequences.get(gene_name)
             
             a_thaliana_locus = None
             a_thaliana_common_name = None
@@ -649,6 +1517,130 @@ class DB():
             })
                
         return data
+
+    # Columns of flatten_gene_annotation_data and get_gene_annotation_report
+    ANNOTATION_REPORT_COLUMNS = [
+        "species", "gene_name", "a_thaliana_locus", "a_thaliana_common_name", "description", "coding_sequence",
+        "e_value", "bit_score", "similarity", "alignment_length", "positives",
+        "go_ids", "go_names", "enzyme_codes", "enzyme_names", "interpro_ids",
+    ]
+
+    def get_coding_sequences(self, gene_list, species_id=None):
+        """
+        Bulk fetch the coding sequences of a list of genes, e.g. for a FASTA export.
+
+        Args:
+            gene_list (list): Xerophyta gene names
+            species_id (int, optional): Only include genes of this species.
+
+        Returns:
+            dict: gene name -> coding sequence (None if the gene has no sequence), for the genes found
+        """
+        return dict(self.iter_coding_sequences(gene_list, species_id))
+
+    def iter_coding_sequences(self, gene_list, species_id=None):
+        """
+        Lazily yield (gene name, coding sequence) for a list of genes, in the order given.
+
+        Sequences are fetched and decompressed DB.SEQUENCE_CHUNK_SIZE genes at a time, so streaming an export
+        of any number of genes only holds one chunk in memory. Genes that are not found are left out, genes
+        without a sequence are yielded with None.
+
+        Args:
+            gene_list (list): Xerophyta gene names
+            species_id (int, optional): Only include genes of this species.
+        """
+        gene_list = list(dict.fromkeys(gene_list))
+        for start in range(0, len(gene_list), self.SEQUENCE_CHUNK_SIZE):
+            chunk = gene_list[start:start + self.SEQUENCE_CHUNK_SIZE]
+            query = self.session.query(models.Gene.gene_name, models.Gene.coding_sequence).filter(
+                models.Gene.gene_name.in_(chunk))
+            if species_id is not None:
+                query = query.filter(models.Gene.species_id == species_id)
+            sequences = dict(query.all())
+            for gene_name in chunk:
+                if gene_name in sequences:
+                    yield gene_name, sequences[gene_name]
+
+    def get_gene_annotation_report(self, gene_list, species_id=None, sequences=True):
+        """
+        The table of flatten_gene_annotation_data, built by a single SQL query instead of loading and walking ORM objects.
+
+        As in flatten_gene_annotation_data each gene gets one row, holding its last homologue and last annotation,
+        i.e. the ones with the highest id (the most recently loaded), with the GO terms, enzyme codes and InterPro
+        ids of that annotation joined with group_concat in the order of their ids (the order of the model
+        relationships, so both tables are the same and stable between runs).
+
+        Args:
+            gene_list (list): Xerophyta gene names
+            species_id (int, optional): Only include genes of this species.
+            sequences (bool, optional): Include the coding sequences, if False the coding_sequence column is empty.
+
+        Returns:
+            pd.DataFrame: one row per gene found, with the columns in DB.ANNOTATION_REPORT_COLUMNS
+        """
+        annotation, homologue = models.Annotation, models.ArabidopsisHomologue
+        gene_homologues = models.gene_homologue_association
+
+        last_annotation = (
+            sq.select(func.max(models.Annotation.id)).where(models.Annotation.gene_id == models.Gene.id)
+            .correlate(models.Gene).scalar_subquery()
+        )
+        last_homologue = (
+            sq.select(func.max(gene_homologues.c.homologue_id)).where(gene_homologues.c.gene_id == models.Gene.id)
+            .correlate(models.Gene).scalar_subquery()
+        )
+
+        def term_list(association, term_model, term_key, column, label):
+            # group_concat has no ORDER BY in the SQLite versions we support, it concatenates in the order of an
+            # ordered subselect
+            ordered_terms = (
+                sq.select(column.label("term"))
+                .select_from(association.join(term_model, term_model.id == association.c[term_key]))
+                .where(association.c.annotation_id == annotation.id)
+                .order_by(term_model.id)
+                .correlate(annotation).subquery()
+            )
+            # an annotation without terms gets an empty string, as ", ".join([]) does
+            terms = sq.select(func.group_concat(ordered_terms.c.term, ", ")).correlate(annotation).scalar_subquery()
+            return sq.case((annotation.id.isnot(None), func.coalesce(terms, ""))).label(label)
+
+        query = (
+            sq.select(
+                models.Species.name.label("species"),
+                models.Gene.gene_name,
+                homologue.a_thaliana_locus,
+                homologue.a_thaliana_common_name,
+                annotation.description,
+                models.Gene.coding_sequence if sequences else sq.null().label("coding_sequence"),
+                annotation.e_value,
+                annotation.bit_score,
+                annotation.similarity,
+                annotation.alignment_length,
+                annotation.positives,
+                term_list(models.annotations_go, models.GO, "go_id", models.GO.go_id, "go_ids"),
+                term_list(models.annotations_go, models.GO, "go_id", models.GO.go_name, "go_names"),
+                term_list(models.annotations_enzyme_codes, models.EnzymeCode, "enzyme_code_id", models.EnzymeCode.enzyme_code, "enzyme_codes"),
+                term_list(models.annotations_enzyme_codes, models.EnzymeCode, "enzyme_code_id", models.EnzymeCode.enzyme_name, "enzyme_names"),
+                term_list(models.annotations_interpro, models.InterPro, "interpro_id", models.InterPro.interpro_id, "interpro_ids"),
+            )
+            .select_from(models.Gene)
+            .join(models.Species, models.Gene.species_id == models.Species.id)
+            .outerjoin(homologue, homologue.id == last_homologue)
+            .outerjoin(annotation, annotation.id == last_annotation)
+            .order_by(models.Gene.id)
+        )
+        if species_id is not None:
+            query = query.where(models.Gene.species_id == species_id)
+
+        gene_list = list(dict.fromkeys(gene_list))
+        frames = [
+            self.read_frame(query.where(models.Gene.gene_name.in_(gene_list[start:start + self.LOOKUP_CHUNK_SIZE])))
+            for start in range(0, len(gene_list), self.LOOKUP_CHUNK_SIZE)
+        ]
+        if not frames:
+            return pd.DataFrame(columns=self.ANNOTATION_REPORT_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
        
     
     def get_species_by_name(self, species_name):  
@@ -726,47 +1718,84 @@ class DB():
         print(f"Experiment '{experiment_name}' is now linked to species '{species_name}'.")
         self.session.commit()
 
+    def get_gene_ids_by_name(self, gene_list, species_id=None):
+        """
+        Batched existence check of gene names: one IN query per DB.LOOKUP_CHUNK_SIZE names.
+
+        Parameters:
+            gene_list (list): Xerophyta gene names, matched exactly
+            species_id (int, optional): Only match genes of this species.
+
+        Returns:
+            dict: gene name -> gene id, or None if the gene is not in the database, in the order given
+        """
+        gene_list = list(dict.fromkeys(gene_list))
+        found = {}
+        for start in range(0, len(gene_list), self.LOOKUP_CHUNK_SIZE):
+            query = self.session.query(models.Gene.gene_name, models.Gene.id).filter(
+                models.Gene.gene_name.in_(gene_list[start:start + self.LOOKUP_CHUNK_SIZE]))
+            if species_id is not None:
+                query = query.filter(models.Gene.species_id == species_id)
+            found.update(query.all())
+        return {gene_name: found.get(gene_name) for gene_name in gene_list}
+
+    def get_go_term_ids(self, go_terms):
+        """
+        Batched existence check of GO terms, matched either as a GO id (case-insensitive, with or without the
+        branch prefix, see go_id_lookup_keys) or as an exact GO name. One IN query per chunk for each.
+
+        Parameters:
+            go_terms (list): GO ids or names, e.g. "GO:0003677", "F:GO:0003677" or "DNA binding"
+
+        Returns:
+            dict: term -> id of a matching row of the GO table, or None if the term is not in the database,
+                  in the order given
+        """
+        go_terms = list(dict.fromkeys(go_terms))
+        found = {}
+        # every term expands to four GO id keys (see go_id_lookup_keys), keep the parameters per query within
+        # DB.LOOKUP_CHUNK_SIZE
+        chunk_size = self.LOOKUP_CHUNK_SIZE // 4
+        for start in range(0, len(go_terms), chunk_size):
+            chunk = go_terms[start:start + chunk_size]
+            terms_by_key = {}
+            for term in chunk:
+                for key in self.go_id_lookup_keys(term):
+                    terms_by_key.setdefault(key, []).append(term)
+
+            lower_go_id = func.lower(models.GO.go_id)
+            for go_id, key in self.session.query(models.GO.id, lower_go_id).filter(lower_go_id.in_(list(terms_by_key))):
+                for term in terms_by_key[key]:
+                    found.setdefault(term, go_id)
+            for go_id, go_name in self.session.query(models.GO.id, models.GO.go_name).filter(models.GO.go_name.in_(chunk)):
+                found.setdefault(go_name, go_id)
+        return {term: found.get(term) for term in go_terms}
+
     def check_if_gene_in_database(self, gene_list):
         """
-        Check if a gene is in the database.
+        Check if a gene is in the database, see get_gene_ids_by_name.
 
         Parameters:
             gene_list (list): A list of gene names to check.
 
         Returns:
-            List[str]: A boolean list if gene is in the database.
+            List[bool]: A boolean list if gene is in the database.
         """
-        in_db = []
-        for gene in gene_list:
-            query = self.session.query(models.Gene).filter(models.Gene.gene_name == gene).first()
-            if query:
-                in_db.append(True)
-            else:
-                in_db.append(False)
-        return in_db
+        gene_ids = self.get_gene_ids_by_name(gene_list)
+        return [gene_ids[gene] is not None for gene in gene_list]
     
     def check_if_go_term_in_database(self, go_terms):
         """
-        Check if a GO term is in the database.
+        Check if a GO term is in the database, see get_go_term_ids.
 
         Parameters:
             go_terms (list): A list of GO terms to check.
 
         Returns:
-            List[str]: A boolean list if GO term is in the database.
-        """
-        in_db = []
-        for term in go_terms:
-            query = self.session.query(models.GO).filter(
-                or_
-                (models.GO.go_id.in_(term),models.GO.go_name.in_(term))
-                ).first()
-       
-            if query:
-                in_db.append(True)
-            else:
-                in_db.append(False)
-        return in_db
+            List[bool]: A boolean list if GO term is in the database.
+        """
+        go_term_ids = self.get_go_term_ids(go_terms)
+        return [go_term_ids[term] is not None for term in go_terms]
 
 
     def get_genes_by_go_term_or_description(self, go_inputs, species_name= None):
@@ -779,28 +1808,12 @@ class DB():
         Returns:
             List[Gene]: List of Gene objects associated with the GO terms.
         """
-        # Preprocess each GO term to handle missing prefixes
-        processed_inputs = []
-        for term in go_inputs:
-            if ":" not in term:
-                # Generate possible matches by prepending the valid prefixes
-                processed_inputs.extend([f"P:{term}", f"F:{term}", f"C:{term}"])
-            else:
-                # Directly add the user-provided term
-                processed_inputs.append(term)
-
         # Build query
         query = (
             self.session.query(models.Gene)
             .join(models.Annotation, models.Annotation.gene_id == models.Gene.id)
             .join(models.annotations_go, models.annotations_go.c.annotation_id ==models.Annotation.id)
             .join(models.GO, models.GO.id == models.annotations_go.c.go_id)
-            .filter(
-                or_(
-                    models.GO.go_id.in_(processed_inputs),  # Match any of the possible GO IDs
-                    *[models.GO.go_name.ilike(f"%{term}%") for term in go_inputs]  # Match GO names (case-insensitive)
-                )
-            )
         )
         # Add an optional species filter
         if species_name:
@@ -808,8 +1821,31 @@ class DB():
             models.Species.name.ilike(f"%{species_name}%")
         )
 
-        results = query.all()
-        return results
+        # every term binds up to three GO ids and a name pattern, keep the parameters per query within
+        # DB.LOOKUP_CHUNK_SIZE
+        go_inputs = list(go_inputs)
+        chunk_size = self.LOOKUP_CHUNK_SIZE // 4
+        results = {}
+        for start in range(0, len(go_inputs), chunk_size):
+            chunk = go_inputs[start:start + chunk_size]
+            # Preprocess each GO term to handle missing prefixes
+            processed_inputs = []
+            for term in chunk:
+                if ":" not in term:
+                    # Generate possible matches by prepending the valid prefixes
+                    processed_inputs.extend([f"P:{term}", f"F:{term}", f"C:{term}"])
+                else:
+                    # Directly add the user-provided term
+                    processed_inputs.append(term)
+
+            matches = query.filter(
+                or_(
+                    models.GO.go_id.in_(processed_inputs),  # Match any of the possible GO IDs
+                    *[models.GO.go_name.ilike(f"%{term}%") for term in chunk]  # Match GO names (case-insensitive)
+                )
+            )
+            results.update(dict.fromkeys(matches.all()))
+        return list(results)
     
     
     def delete_genes_by_names(self, gene_names, dry_run=False):
@@ -912,6 +1948,8 @@ class DB():
            
             # Commit the transaction
             self.session.commit()
+            # the expression values of the deleted genes are gone from every experiment
+            self.touch_expression_data()
             deletion_summary['success'] = True
             
             print(f"Successfully deleted {deletion_summary['genes_deleted']} genes and all associated data")
@@ -925,3 +1963,23 @@ class DB():
         
         return deletion_summary
     
+
+
+def summarise_replicates(df):
+    """
+    Aggregate long format expression values over their replicates.
+
+    Args:
+        df (pd.DataFrame): columns gene_id, treatment, time, normalised_expression and log2_expression
+
+    Returns:
+        pd.DataFrame: one row per gene_id, treatment and time with n and the mean, SD (sample standard
+                      deviation, NaN for a single replicate) and SEM of both expression values
+    """
+    grouped = df.groupby(["gene_id", "treatment", "time"], sort=True)
+    summary = grouped.size().rename("n").to_frame()
+    for value in ["normalised_expression", "log2_expression"]:
+        summary[value] = grouped[value].mean()
+        summary[f"{value}_sd"] = grouped[value].std()
+        summary[f"{value}_sem"] = summary[f"{value}_sd"] / np.sqrt(summary["n"])
+    return summary.reset_index()
@@ -1,16 +1,30 @@
 import re
+import argparse
+import contextlib
+import functools
+import gzip
+import hashlib
+import json
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
 from Bio import SeqIO
 import database.models as models
 import os
 import sqlalchemy as sq
 import database.db as db
+import database.expression_matrix as expression_matrix
+import utils.data_tidier as dt
 import pandas as pd
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import SQLAlchemyError
-import tqdm as tqdm
 
 # DATABASE_NAME = "xerophyta_db.sqlite"
 # DATABASE_NAME = "test_db.sqlite"
 DATABASE_NAME = "database/data/all_xerophyta_species_db.sqlite"
+# ingestion writes to the database, so it uses the read-write connection profile (WAL journal)
+DB_PROFILE = "read_write"
 
 
 ####################
@@ -21,30 +35,75 @@ def create_new_db():
     Deletes and recreates the SQLITE database. Is required when the model structure changes
     """
 
+    # close any pooled connections to the old file before deleting it
+    db.dispose_engines(DATABASE_NAME)
     if os.path.exists(DATABASE_NAME):
         print("Deleting old database file...")
         os.remove(DATABASE_NAME)
         
     print("Creating new db")
-    engine = sq.create_engine(f"sqlite:///{DATABASE_NAME}", echo=False)
-    connection = engine.connect()
+    engine = db.get_engine(DATABASE_NAME, profile=DB_PROFILE)
 
     print("Creating tables")
     models.Base.metadata.create_all(engine)
 
     print("DONE")
 
-def add_gene_sequence_from_fasta(filename, species_id):
-    database = db.DB()
+def open_fasta(filename):
+    """Open a FASTA file for reading as text, decompressing it on the fly if it is gzipped."""
+    with open(filename, "rb") as f:
+        gzipped = f.read(2) == b"\x1f\x8b"
+    return gzip.open(filename, "rt") if gzipped else open(filename, "r")
+
+def iter_chunks(records, chunk_size):
+    """Yield lists of up to chunk_size items from an iterable, without reading ahead of the current chunk."""
+    records = iter(records)
+    while chunk := list(itertools.islice(records, chunk_size)):
+        yield chunk
+
+def add_gene_sequence_from_fasta(filename, species_id, chunk_size=None, resume=False):
+    """
+    Streams gene sequences from a (optionally gzipped) FASTA file into the genes table.
+
+    Records are read lazily and upserted in chunks, each committed on its own, so memory use is bounded
+    by the chunk size rather than the size of the transcriptome.
+
+    Args:
+        filename (str): path to the FASTA file, plain or gzipped
+        species_id (int): species the genes belong to
+        chunk_size (int, optional): records written per transaction, defaults to DB.BULK_CHUNK_SIZE
+        resume (bool): skip genes of this species that already have a sequence, to continue an interrupted load
+    """
+    database = db.DB(profile=DB_PROFILE)
     species_name = database.session.query(models.Species).filter_by(id=species_id).first().name
     print(f"Adding gene sequences for {species_name} from {filename}")
-    with open(filename, "r") as f:
-        records = [{  "gene_name": seq_record.id, 
-                      "species_id": species_id,
-                      "coding_sequence": str(seq_record.seq)} 
-                      for seq_record in SeqIO.parse(f, "fasta")]
-    database.create_or_update(models.Gene, records, ["gene_name"])
-    print("Done")
+
+    loaded = set()
+    if resume:
+        loaded = {name for (name,) in database.session.query(models.Gene.gene_name).filter(
+            models.Gene.species_id == species_id, models.Gene.coding_sequence.isnot(None))}
+        print(f"Resuming: skipping {len(loaded)} genes that are already loaded")
+
+    written = load_gene_sequences(read_fasta_records(filename, species_id, skip=loaded), chunk_size)
+    print(f"Done: {written} sequences written")
+
+def read_fasta_records(filename, species_id, skip=frozenset()):
+    """Lazily yield the genes table records of a (optionally gzipped) FASTA file, leaving out the gene names in skip."""
+    with open_fasta(filename) as f:
+        for seq_record in SeqIO.parse(f, "fasta"):
+            if seq_record.id not in skip:
+                yield {"gene_name": seq_record.id,
+                       "species_id": species_id,
+                       "coding_sequence": str(seq_record.seq)}
+
+def load_gene_sequences(records, chunk_size=None):
+    """Upsert gene records into the genes table in chunks, each committed on its own. Returns the number written."""
+    database = db.DB(profile=DB_PROFILE)
+    written = 0
+    for chunk in iter_chunks(records, chunk_size or database.BULK_CHUNK_SIZE):
+        database.bulk_upsert(models.Gene, chunk, ["gene_name"])
+        written += len(chunk)
+    return written
 
 def parse_annotations(filename, sep=","):
     df = pd.read_csv(filename, sep=sep)
@@ -57,85 +116,214 @@ def parse_annotations(filename, sep=","):
     df["Enzyme Names"] = df["Enzyme Names"].str.split("; ").apply(lambda x: x if isinstance(x, list) else [])
     df["InterPro IDs"] = df["InterPro IDs"].str.split("; ").apply(lambda x: x if isinstance(x, list) else [])
 
-    df.to_csv("output.csv", index=False)
-
     return df 
 
 def map_genes_to_ids(species_id):
     # used for retrieving associated gene ids in the database from gene names (eg gene name Xe10001.1 is gene ID 1 in database)
-    database = db.DB()
-    gene_dict = {}
-    genes = database.session.query(models.Gene).filter_by(species_id=species_id).all()
-    
-    for gene in genes:
-        gene_dict[gene.gene_name] = gene.id
-    return gene_dict
+    database = db.DB(profile=DB_PROFILE)
+    return database.get_gene_index(species_id)["id"].to_dict()
+
+def resolve_gene_ids(gene_names, gene_index, label="gene"):
+    """
+    Map a whole column of gene names to database gene ids.
+
+    Args:
+        gene_names (pd.Series): gene names to resolve
+        gene_index (pd.DataFrame): lookup from DB.get_gene_index, indexed by gene_name
+        label (str): what the names are, used in the report of unresolved names (e.g. "regulator")
+
+    Returns:
+        (pd.Series, list): the gene ids (nullable Int64, <NA> where unresolved) aligned with gene_names,
+                           and the unique names that were not found
+    """
+    gene_ids = gene_names.map(gene_index["id"]).astype("Int64")
+    unresolved = sorted(gene_names[gene_ids.isna()].dropna().unique().tolist())
+    if unresolved:
+        preview = ", ".join(unresolved[:10]) + (", ..." if len(unresolved) > 10 else "")
+        print(f"{len(unresolved)} {label} name(s) not found in the database: {preview}")
+    return gene_ids, unresolved
+
+def explode_terms(df, columns):
+    """
+    Explode list columns of the annotation file into one row per term.
+
+    Lists in the same row are paired up position by position (e.g. each GO ID with its GO name),
+    missing lists are treated as empty.
+
+    Args:
+        df (pd.DataFrame): parsed annotations with a gene_id column
+        columns (list): the list columns to pair up, e.g. ["GO IDs", "GO Names"]
+
+    Returns:
+        pd.DataFrame: columns gene_id and the requested columns, one row per (gene, term)
+    """
+    lists = [df[column].apply(lambda x: x if isinstance(x, list) else []) for column in columns]
+    terms = pd.DataFrame({"gene_id": df["gene_id"], "terms": [list(zip(*row)) for row in zip(*lists)]})
+    terms = terms.explode("terms").dropna(subset=["terms"])
+    exploded = pd.DataFrame(terms["terms"].tolist(), columns=columns, index=terms.index)
+    exploded.insert(0, "gene_id", terms["gene_id"])
+    return exploded.reset_index(drop=True)
+
+def load_term_table(database, model, key_field, records):
+    """
+    Insert the new rows and update the existing rows of a term table (GO, enzyme codes, InterPro)
+    in the current transaction, without committing.
+
+    Args:
+        database (DB): database to write to
+        model: the term model, e.g. models.GO
+        key_field (str): column identifying a term, e.g. "go_id"
+        records (pd.DataFrame): one row per unique term, columns named after the model's columns
+
+    Returns:
+        dict: {key value: id} for every term in the table
+    """
+    term_ids = database.get_id_map(model, key_field)
+    exists = records[key_field].isin(list(term_ids))
+
+    new_terms = records[~exists]
+    if not new_terms.empty:
+        database.session.execute(sq.insert(model), new_terms.to_dict("records"))
+
+    updated_terms = records[exists]
+    if not updated_terms.empty and len(records.columns) > 1:
+        updated_terms = updated_terms.assign(id=updated_terms[key_field].map(term_ids))
+        database.session.execute(sq.update(model), updated_terms.to_dict("records"))
+
+    print(f"{model.__tablename__}: inserted {len(new_terms)}, updated {len(updated_terms)} records")
+    return database.get_id_map(model, key_field)
+
+def link_terms(database, table, term_column, links, annotation_ids, term_ids):
+    """
+    Insert the association rows between annotations and terms, skipping links that already exist.
+
+    Args:
+        database (DB): database to write to
+        table: the association table, e.g. models.annotations_go
+        term_column (str): the term foreign key column in the association table, e.g. "go_id"
+        links (pd.DataFrame): columns gene_id and key, one row per (gene, term)
+        annotation_ids (dict): {gene_id: annotation id}
+        term_ids (dict): {term key: term id}
+
+    Returns:
+        int: number of association rows sent to the database
+    """
+    rows = pd.DataFrame({
+        "annotation_id": links["gene_id"].map(annotation_ids),
+        term_column: links["key"].map(term_ids),
+    }).dropna().astype(int).drop_duplicates()
+    if not rows.empty:
+        database.session.execute(sqlite_insert(table).on_conflict_do_nothing(), rows.to_dict("records"))
+    print(f"{table.name}: linked {len(rows)} terms")
+    return len(rows)
 
 def add_gene_annotations(filename, species_id, sep=","):
-    database = db.DB()
-    annotations_df = parse_annotations(filename, sep=sep)
-     # map gene names to gene ids
-    gene_dict = map_genes_to_ids(species_id)
+    """Load a gene annotation file, see load_gene_annotations."""
+    return load_gene_annotations(parse_annotations(filename, sep=sep), species_id)
 
-    for _, row in annotations_df.iterrows():
-        
-        # map SeqName to gene_id
-        gene_id = gene_dict.get(row["SeqName"])
-        if not gene_id:
-            print(f"Gene {row['SeqName']} not found in database")
-            continue
-
-        annotation_data = {
-            "gene_id": gene_id,
-            "description": row["Description"],
-            "e_value": row["e-Value"],
-        }
-        # populate the annotation table
-        # TODO this is slow, consider batching
-        annotation_instance = database.create_or_update(models.Annotation, [annotation_data], lookup_fields= ["gene_id"])
-
-        go_terms = zip(row["GO IDs"], row["GO Names"])
-        for go_id, go_name in go_terms:
-            go_data = {
-                "go_id": go_id,
-                "go_branch": go_id.split(":")[0],  # Extract branch (P, F, or C)
-                "go_name": go_name
-            }
-            go_instance = database.create_or_update(models.GO, [go_data], lookup_fields=["go_id"])
-            if go_instance not in annotation_instance.go_ids:
-                annotation_instance.go_ids.append(go_instance)
-
-        # Add Enzyme Codes
-        enzyme_codes = zip(row["Enzyme Codes"], row["Enzyme Names"])
-        for enzyme_code, enzyme_name in enzyme_codes:
-            enzyme_data = {
-                "enzyme_code": enzyme_code,
-                "enzyme_name": enzyme_name
-            }
-            enzyme_instance = database.create_or_update(models.EnzymeCode, [enzyme_data], lookup_fields=["enzyme_code"])
-            if enzyme_instance not in annotation_instance.enzyme_codes:
-                annotation_instance.enzyme_codes.append(enzyme_instance)
-
-        # Add InterPro IDs
-        for interpro_id in row["InterPro IDs"]:
-            interpro_data = {
-                "interpro_id": interpro_id
-            }
-            interpro_instance = database.create_or_update(models.InterPro, [interpro_data], lookup_fields=["interpro_id"])
-            if interpro_instance not in annotation_instance.interpro_ids:
-                annotation_instance.interpro_ids.append(interpro_instance)
-
-    # Commit all changes at the end
-    database.session.commit()
-
-def add_experiment(experiment_name, description= None):
-    database = db.DB()
-    experiment = database.create_or_update(models.Experiments, [{"experiment_name": experiment_name, "description": description}], ["experiment_name"])
-    return experiment
-
-def add_rna_seq_data(df, species, experiment_name):
-    database = db.DB()
-    lookup_field = ["gene_id","treatment","time","replicate"]
+def load_gene_annotations(annotations_df, species_id):
+    """
+    Load parsed gene annotations (see parse_annotations) in bulk: one annotation per gene, plus its GO terms,
+    enzyme codes and InterPro IDs.
+
+    The list columns are exploded with pandas, the term tables are deduplicated and written with
+    executemany, and all rows (annotations, terms and association rows) are committed in a single transaction.
+    An existing annotation for a gene is updated rather than duplicated.
+    """
+    database = db.DB(profile=DB_PROFILE)
+    session = database.session
+    start = time.perf_counter()
+
+    gene_ids, _ = resolve_gene_ids(annotations_df["SeqName"], database.get_gene_index(species_id))
+    annotations_df = annotations_df.assign(gene_id=gene_ids).dropna(subset=["gene_id"])
+    annotations_df["gene_id"] = annotations_df["gene_id"].astype(int)
+
+    # a later row for the same gene overwrites the description of an earlier one
+    annotation_records = (
+        annotations_df[["gene_id", "Description", "e-Value"]]
+        .drop_duplicates("gene_id", keep="last")
+        .rename(columns={"Description": "description", "e-Value": "e_value"})
+    )
+    annotation_records = annotation_records.astype(object).where(annotation_records.notna(), None)
+
+    go_links = explode_terms(annotations_df, ["GO IDs", "GO Names"])
+    go_records = (
+        go_links.drop_duplicates("GO IDs", keep="last")
+        .rename(columns={"GO IDs": "go_id", "GO Names": "go_name"})[["go_id", "go_name"]]
+        .assign(go_branch=lambda df: df["go_id"].str.split(":").str[0])  # Extract branch (P, F, or C)
+    )
+    enzyme_links = explode_terms(annotations_df, ["Enzyme Codes", "Enzyme Names"])
+    enzyme_records = (
+        enzyme_links.drop_duplicates("Enzyme Codes", keep="last")
+        .rename(columns={"Enzyme Codes": "enzyme_code", "Enzyme Names": "enzyme_name"})[["enzyme_code", "enzyme_name"]]
+    )
+    interpro_links = explode_terms(annotations_df, ["InterPro IDs"])
+    interpro_records = interpro_links[["InterPro IDs"]].drop_duplicates().rename(columns={"InterPro IDs": "interpro_id"})
+
+    try:
+        annotation_ids = database.get_id_map(models.Annotation, "gene_id")
+        exists = annotation_records["gene_id"].isin(list(annotation_ids))
+        if (~exists).any():
+            session.execute(sq.insert(models.Annotation), annotation_records[~exists].to_dict("records"))
+        if exists.any():
+            updated = annotation_records[exists].assign(id=annotation_records.loc[exists, "gene_id"].map(annotation_ids))
+            session.execute(sq.update(models.Annotation), updated.to_dict("records"))
+        print(f"annotations: inserted {(~exists).sum()}, updated {exists.sum()} records")
+        annotation_ids = database.get_id_map(models.Annotation, "gene_id")
+
+        go_ids = load_term_table(database, models.GO, "go_id", go_records)
+        enzyme_ids = load_term_table(database, models.EnzymeCode, "enzyme_code", enzyme_records)
+        interpro_ids = load_term_table(database, models.InterPro, "interpro_id", interpro_records)
+
+        links = link_terms(database, models.annotations_go, "go_id",
+                           go_links.rename(columns={"GO IDs": "key"}), annotation_ids, go_ids)
+        links += link_terms(database, models.annotations_enzyme_codes, "enzyme_code_id",
+                            enzyme_links.rename(columns={"Enzyme Codes": "key"}), annotation_ids, enzyme_ids)
+        links += link_terms(database, models.annotations_interpro, "interpro_id",
+                            interpro_links.rename(columns={"InterPro IDs": "key"}), annotation_ids, interpro_ids)
+
+        session.commit()
+    except SQLAlchemyError as e:
+        session.rollback()
+        print(e)
+        raise e
+
+    elapsed = time.perf_counter() - start
+    print(f"Loaded {len(annotation_records)} annotations and {links} term links in {elapsed:.1f}s "
+          f"({len(annotations_df) / max(elapsed, 1e-9):.0f} rows/s)")
+    return {"annotations": len(annotation_records), "links": links}
+
+def add_experiment(experiment_name, description= None, species_id=None):
+    database = db.DB(profile=DB_PROFILE)
+    record = {"experiment_name": experiment_name, "description": description}
+    if species_id is not None:
+        record["species_id"] = species_id
+    database.bulk_upsert(models.Experiments, [record], ["experiment_name"])
+    return database.get_experiment_by_name(experiment_name)
+
+def add_rna_seq_data(df, species, experiment_name, incremental=False, dry_run=False):
+    """
+    Upsert long format expression values (gene_name, treatment, time, replicate, normalised_expression,
+    log2_expression) of an experiment.
+
+    With incremental=True only the samples that changed since the last incremental load of the experiment
+    are written, and samples no longer in df are deleted (see incremental_load). dry_run only reports the delta.
+    """
+    if incremental:
+        def load(changed):
+            # genes that are not in the database raise rather than being skipped, so every row is written
+            add_rna_seq_data(changed, species, experiment_name)
+            return changed.index
+
+        return incremental_load(
+            f"expression:{experiment_name}", df, ["gene_name", "treatment", "time", "replicate"],
+            load=load,
+            delete=lambda keys: delete_rna_seq_data(keys, species, experiment_name),
+            dry_run=dry_run,
+        )
+    database = db.DB(profile=DB_PROFILE)
+    # matches the uq_gene_expressions_sample unique index
+    lookup_field = ["experiment_id", "gene_id","treatment","time","replicate"]
 
     species_id = database.session.query(models.Species.id).filter( models.Species.name == species ).scalar()
     experiment_id = database.session.query(models.Experiments.id).filter( models.Experiments.experiment_name == experiment_name ).scalar()
@@ -146,32 +334,66 @@ def add_rna_seq_data(df, species, experiment_name):
         raise ValueError(f"Experiment '{experiment_name}' not found in the database")
     
     
-    records = []
-    for _, row in df.iterrows():
-        gene_id = database.session.query(models.Gene.id).filter(models.Gene.gene_name == row["gene_name"]).scalar()
-        if gene_id:
-            record = {
-                "treatment": row["treatment"],
-                "time": int(row["time"]),
-                "replicate": (row["replicate"]),
-                "normalised_expression": float(row["normalised_expression"]),
-                "log2_expression": float(row["log2_expression"]),
-                "meta_data": None,
-                "experiment_id": experiment_id,
-                "species_id": species_id,
-                "gene_id": gene_id
-            }
-            records.append(record)
-        else:
-            raise ValueError(f"Gene {row['gene_name']} not found in database")
-    
-        
-    database.create_or_update(models.Gene_expressions, records, lookup_fields= lookup_field)
+    gene_ids, unresolved = resolve_gene_ids(df["gene_name"], database.get_gene_index(species_id))
+    if unresolved:
+        raise ValueError(f"{len(unresolved)} genes not found in database for species '{species}': {unresolved[:10]}")
+
+    records = pd.DataFrame({
+        "treatment": df["treatment"],
+        "time": df["time"].astype(int),
+        "replicate": df["replicate"],
+        "normalised_expression": df["normalised_expression"].astype(float),
+        "log2_expression": df["log2_expression"].astype(float),
+        "meta_data": None,
+        "experiment_id": experiment_id,
+        "species_id": species_id,
+        "gene_id": gene_ids.astype(int),
+    }).to_dict("records")
+
+    summary = database.bulk_upsert(models.Gene_expressions, records, conflict_fields=lookup_field)
+    database.touch_expression_data([experiment_id])
+    database.refresh_expression_summary(experiment_name, gene_ids.unique())
+    return summary
+
+def add_rna_seq_matrix(df, species, experiment_name, genes_per_chunk=5000):
+    """
+    Load a wide expression matrix (gene column followed by "Species_Treatment_Replicate_Time" sample columns)
+    by reshaping and upserting it a block of genes at a time, instead of building the whole long table first.
+
+    Returns:
+        dict: total counts of "inserted", "updated" and "skipped" records
+    """
+    totals = {"inserted": 0, "updated": 0, "skipped": 0}
+    for long_df in dt.iter_long_chunks(df, genes_per_chunk=genes_per_chunk, log2=True, time_as_int=True):
+        summary = add_rna_seq_data(long_df.rename(columns={"expression": "normalised_expression"}), species, experiment_name)
+        totals = {key: totals[key] + summary[key] for key in totals}
+    print(f"Loaded {len(df)} genes: inserted {totals['inserted']}, updated {totals['updated']} records")
+    return totals
+
+def add_DEG_data(file_name, experiment_name, incremental=False, dry_run=False):
+    """
+    Load a DEG file of an experiment. With incremental=True only the genes whose rows changed since the last
+    incremental load of the experiment are written, and genes no longer in the file are deleted
+    (see incremental_load). dry_run only reports the delta.
+    """
+    if incremental:
+        return incremental_load(
+            f"deg:{experiment_name}", lambda: pd.read_csv(file_name), ["Genes"],
+            load=lambda changed: load_DEG_data(changed, experiment_name),
+            delete=lambda keys: delete_DEG_data(keys, experiment_name),
+            file_name=file_name, dry_run=dry_run,
+        )
+    return load_DEG_data(pd.read_csv(file_name), experiment_name)
+
+def load_DEG_data(data, experiment_name):
+    """
+    Upsert the rows of a DEG file of an experiment. Rows whose gene is not in the database are skipped.
+
+    Returns:
+        pd.Index: the index labels of the rows of data that were written
+    """
+    database = db.DB(profile=DB_PROFILE)
 
-def add_DEG_data(file_name, experiment_name):
-    database = db.DB()
-    data = pd.read_csv(file_name)
-    
     # Ensure columns exist
     required_columns = ["Genes", "Re_Set", "Re_direction", "De_Set", "De_direction"]
     if not all(col in data.columns for col in required_columns):
@@ -183,39 +405,38 @@ def add_DEG_data(file_name, experiment_name):
         raise ValueError(f"Experiment '{experiment_name}' not found in the database.")
     experiment_id = experiment.id
 
-    records = []  
-
-    for _, row in data.iterrows():
-        gene_name = row["Genes"]
-
-        # Fetch the gene ID
-        gene = database.get_gene_by_name(gene_name)
-        if gene is None:
-            print(f"Gene '{gene_name}' not found in the database. Skipping...")
-            continue
-        gene_id = gene.id
-
-        # Prepare record
-        record = {
-            "gene_id": gene_id,
-            "experiment_id": experiment_id,
-            "re_set": row["Re_Set"] if row["Re_Set"] != "None" else None,
-            "re_direction": row["Re_direction"] if row["Re_direction"] != "None" else None,
-            "de_set": row["De_Set"] if row["De_Set"] != "None" else None,
-            "de_direction": row["De_direction"] if row["De_direction"] != "None" else None,
-        }
-        records.append(record)
+    gene_ids, _ = resolve_gene_ids(data["Genes"], database.get_gene_index(experiment.species_id))
+    found = gene_ids.notna()
+    if not found.all():
+        print(f"Skipping {(~found).sum()} rows with genes not in the database.")
+
+    # DEG files use the string "None" (read as NaN by pandas) for genes without a set/direction
+    def none_if_missing(column):
+        values = data.loc[found, column].astype(object)
+        return values.where(values.notna() & (values != "None"), None)
+
+    records = pd.DataFrame({
+        "gene_id": gene_ids[found].astype(int),
+        "experiment_id": experiment_id,
+        "re_set": none_if_missing("Re_Set"),
+        "re_direction": none_if_missing("Re_direction"),
+        "de_set": none_if_missing("De_Set"),
+        "de_direction": none_if_missing("De_direction"),
+    }).to_dict("records")
 
     # Use the create_or_update function to add or update records
     if records:
-        database.create_or_update(models.DifferentialExpression, records, lookup_fields=["gene_id", "experiment_id"])
+        database.bulk_upsert(models.DifferentialExpression, records, conflict_fields=["gene_id", "experiment_id"])
         print(f"Processed {len(records)} records.")
     else:
         print("No records to process.")
+    return data.index[found.to_numpy()]
     
 def add_a_thaliana_gene_mapping(mapping_file):
-    database = db.DB()
-    
+    database = db.DB(profile=DB_PROFILE)
+    database.add_a_thaliana_gene_mappings(read_a_thaliana_gene_mapping(mapping_file))
+
+def read_a_thaliana_gene_mapping(mapping_file):
     data = pd.read_csv(mapping_file)
     
     # Ensure columns exist
@@ -224,10 +445,9 @@ def add_a_thaliana_gene_mapping(mapping_file):
         raise ValueError(f"CSV is missing one or more required columns: {required_columns}")
 
     data.sort_values("At Locus ID", inplace=True, ascending=False)
+    return data
 
-    database.add_a_thaliana_gene_mappings(data)
-
-def add_regulatory_interactions(grn_data_df, species_name=None):
+def add_regulatory_interactions(grn_data_df, species_name=None, update_existing=False):
     """
     Adds gene regulatory network interactions to the database.
 
@@ -240,8 +460,13 @@ def add_regulatory_interactions(grn_data_df, species_name=None):
                                         This can be useful if gene names are not globally unique
                                         across species in your `genes` table (though your current
                                         `gene_name` is unique).
+        update_existing (bool): If True, interactions that already exist get their clusters and direction
+                                updated from the file; otherwise they are skipped.
+
+    Returns:
+        dict: the summary counters (added, updated and skipped interactions, genes not found)
     """
-    database = db.DB()
+    database = db.DB(profile=DB_PROFILE)
 
     required_columns = [
         "Regulatory cluster", "Predicted regulators",
@@ -251,11 +476,8 @@ def add_regulatory_interactions(grn_data_df, species_name=None):
         missing_cols = [col for col in required_columns if col not in grn_data_df.columns]
         raise ValueError(f"GRN DataFrame is missing required columns: {missing_cols}")
 
-    interactions_added = 0
-    interactions_skipped_gene_not_found = 0
     genes_not_found = set()  # To track unique genes not found
     interactions_skipped_species_mismatch = 0
-    interactions_skipped_already_exists = 0
     
     target_species_id = None
     if species_name:
@@ -265,132 +487,556 @@ def add_regulatory_interactions(grn_data_df, species_name=None):
         else:
             target_species_id = species_obj.id
 
-    for index, row in tqdm.tqdm(grn_data_df.iterrows(), total=len(grn_data_df), desc="Processing GRN interactions"):
-        regulator_gene_name = row["Predicted regulators"]
-        target_gene_name = row["Predicted targets"]
-        regulatory_cluster = row["Regulatory cluster"]
-        target_cluster = row["Target cluster"]
-        direction = row["Direction of regulation"] # e.g., "Activation"
-
-        # 1. Find the regulator Gene object
-        regulator_gene = database.session.query(models.Gene).filter_by(gene_name=regulator_gene_name).first()
-        if not regulator_gene:
-            print(f"Warning: Regulator gene '{regulator_gene_name}' not found. Skipping interaction row {index+1}.")
-            interactions_skipped_gene_not_found += 1
-            genes_not_found.add(regulator_gene_name)  # Track unique gene not found
-            continue
-
-        # 2. Find the target Gene object
-        target_gene = database.session.query(models.Gene).filter_by(gene_name=target_gene_name).first()
-        if not target_gene:
-            print(f"Warning: Target gene '{target_gene_name}' not found. Skipping interaction row {index+1}.")
-            interactions_skipped_gene_not_found += 1
-            genes_not_found.add(target_gene_name)  # Track unique gene not found
-            continue
-        
-        # 3. (Optional) Check if genes belong to the specified species
-        if target_species_id is not None:
-            if getattr(regulator_gene, "species_id", None) != target_species_id or \
-                getattr(target_gene, "species_id", None) != target_species_id:
-                print(f"Warning: Regulator '{regulator_gene_name}' (species {regulator_gene.species_id}) or "
-                        f"target '{target_gene_name}' (species {target_gene.species_id}) "
-                        f"does not belong to target species {target_species_id}. Skipping interaction row {index+1}.")
-                interactions_skipped_species_mismatch += 1
-                continue
-
-        # 4. Check if this interaction already exists (using the UniqueConstraint)
-        existing_interaction = (
-            database.session.query(models.RegulatoryInteraction)
-            .filter_by(
-                regulator_gene_id=regulator_gene.id,
-                target_gene_id=target_gene.id
-                # You might add other fields here if your UniqueConstraint is more complex
-                # e.g., experiment_id if you add that to RegulatoryInteraction
-            )
-            .first()
-        )
+    # 1./2. Resolve regulator and target names to gene ids for the whole dataframe at once
+    gene_index = database.get_gene_index()
+    regulator_ids, _ = resolve_gene_ids(grn_data_df["Predicted regulators"], gene_index, label="regulator gene")
+    target_ids, _ = resolve_gene_ids(grn_data_df["Predicted targets"], gene_index, label="target gene")
+
+    # rows are checked regulator first, so a row with both genes missing only reports the regulator
+    regulator_missing = regulator_ids.isna()
+    target_missing = target_ids.isna() & ~regulator_missing
+    genes_not_found.update(grn_data_df.loc[regulator_missing, "Predicted regulators"])
+    genes_not_found.update(grn_data_df.loc[target_missing, "Predicted targets"])
+    interactions_skipped_gene_not_found = int(regulator_missing.sum() + target_missing.sum())
+    resolved = ~(regulator_missing | target_missing)
+
+    # 3. (Optional) Check if genes belong to the specified species
+    species_mismatch = pd.Series(False, index=grn_data_df.index)
+    if target_species_id is not None:
+        regulator_species = grn_data_df["Predicted regulators"].map(gene_index["species_id"])
+        target_species = grn_data_df["Predicted targets"].map(gene_index["species_id"])
+        species_mismatch = resolved & ((regulator_species != target_species_id) | (target_species != target_species_id))
+        interactions_skipped_species_mismatch = int(species_mismatch.sum())
+        if interactions_skipped_species_mismatch:
+            print(f"Warning: {interactions_skipped_species_mismatch} interactions have a regulator or target "
+                  f"that does not belong to target species {target_species_id}. Skipping them.")
+
+    # 4. Check the direction against the enum of the direction column
+    direction = grn_data_df["Direction of regulation"]  # e.g., "Activation"
+    invalid_direction = resolved & ~species_mismatch & ~direction.isin(models.RegulationDirectionEnum.enums)
+    interactions_skipped_invalid_direction = int(invalid_direction.sum())
+    if interactions_skipped_invalid_direction:
+        print(f"Warning: {interactions_skipped_invalid_direction} interactions have an invalid direction "
+              f"{sorted(direction[invalid_direction].astype(str).unique().tolist())}, "
+              f"expected one of {models.RegulationDirectionEnum.enums}. Skipping them.")
+
+    rows_to_add = pd.DataFrame({
+        "regulator_gene_id": regulator_ids,
+        "target_gene_id": target_ids,
+        "regulatory_cluster": grn_data_df["Regulatory cluster"],
+        "target_cluster": grn_data_df["Target cluster"],
+        "direction": direction,
+    })[resolved & ~species_mismatch & ~invalid_direction]
+
+    # a pair repeated in the file counts as already existing, the first occurrence is loaded
+    duplicated = rows_to_add.duplicated(["regulator_gene_id", "target_gene_id"])
+    rows_to_add = rows_to_add[~duplicated].astype({"regulator_gene_id": int, "target_gene_id": int})
+    records = rows_to_add.astype(object).where(rows_to_add.notna(), None).to_dict("records")
+
+    # 5. Insert the new interactions, deduplicated against uq_regulator_target_pair by the database
+    update_fields = ["regulatory_cluster", "target_cluster", "direction"] if update_existing else []
+    summary = {"inserted": 0, "updated": 0, "skipped": 0}
+    if records:
+        summary = database.bulk_upsert(models.RegulatoryInteraction, records,
+                                       conflict_fields=["regulator_gene_id", "target_gene_id"],
+                                       update_fields=update_fields)
+    interactions_added = summary["inserted"]
+    interactions_updated = summary["updated"]
+    interactions_skipped_already_exists = int(duplicated.sum()) + summary["skipped"]
 
-        if existing_interaction:
-            # Optionally update if direction or clusters changed, or just skip
-            # For now, we'll skip if it exists to avoid duplicates.
-            # You could add logic here to update `direction`, `regulatory_cluster`, `target_cluster`
-            # if `existing_interaction.direction != direction` etc.
-            # print(f"Interaction between {regulator_gene_name} and {target_gene_name} already exists. Skipping row {index+1}.")
-            interactions_skipped_already_exists += 1
-            continue
-
-        # 5. Create and add the new RegulatoryInteraction
-        try:
-            new_interaction = models.RegulatoryInteraction(
-                regulator_gene_id=regulator_gene.id,  # or regulator_gene=regulator_gene
-                target_gene_id=target_gene.id,        # or target_gene=target_gene
-                regulatory_cluster=regulatory_cluster,
-                target_cluster=target_cluster,
-                direction=direction  # This must match one of your Enum values ('Activation', 'Repression', 'Unknown')
-            )
-            database.session.add(new_interaction)
-            interactions_added += 1
-        except ValueError as ve: # Catches issues if `direction` is not in Enum
-            print(f"Error creating interaction for row {index+1}: {ve}. Invalid direction value: '{direction}'. Skipping.")
-            database.session.rollback() # Rollback the add attempt for this interaction
-            continue
-
-
-        # Commit in batches for performance
-        if (index + 1) % 1000 == 0:
-            try:
-                database.session.commit()
-                # print(f"Committed {interactions_added} new interactions so far (processed {index + 1} rows).")
-            except SQLAlchemyError as e:
-                database.session.rollback()
-                print(f"Error committing batch: {e}")
-                # Potentially stop or handle more gracefully
-                raise
-
-    # Final commit for any remaining interactions
-    try:
-        database.session.commit()
-    except SQLAlchemyError as e:
-        database.session.rollback()
-        print(f"Error during final commit: {e}")
-        raise
-        
     print(f"\n--- GRN Population Summary ---")
     print(f"Successfully added: {interactions_added} interactions.")
+    if update_existing:
+        print(f"Updated (already exists): {interactions_updated} interactions.")
     print(f"Skipped (gene not found): {interactions_skipped_gene_not_found} interactions.")
     if species_name:
         print(f"Skipped (species mismatch): {interactions_skipped_species_mismatch} interactions.")
+    print(f"Skipped (invalid direction): {interactions_skipped_invalid_direction} interactions.")
     print(f"Skipped (already exists): {interactions_skipped_already_exists} interactions.")
     print(f"Total rows processed: {len(grn_data_df)}")
 
     print(f"Unique genes not found in DB: {len(genes_not_found)}")
 
+    return {
+        "added": interactions_added,
+        "updated": interactions_updated,
+        "skipped_gene_not_found": interactions_skipped_gene_not_found,
+        "skipped_species_mismatch": interactions_skipped_species_mismatch,
+        "skipped_invalid_direction": interactions_skipped_invalid_direction,
+        "skipped_already_exists": interactions_skipped_already_exists,
+        "genes_not_found": len(genes_not_found),
+    }
+
 
+####################
+# Incremental ingestion
+####################
+# Loaders called with incremental=True compare their input with the ingestion ledger (models.IngestionFile and
+# models.IngestionRow) and only write the rows that were added, changed or removed since the last load of the
+# same source. With dry_run=True the delta is reported without touching the data.
 
-def main(species_name, fasta_file, annotation_file, homologue_file):
-    database = db.DB()
-    species = database.add_species(species_name) # add species to database
-    species_id = species.id
-    add_gene_sequence_from_fasta(fasta_file, species_id) # add gene sequences to database from fasta file
-    add_gene_annotations( annotation_file, species_id) # add gene annotations to database
+def hash_file(filename):
+    """Return the sha256 hex digest of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
-if __name__ == "__main__":
-    # replace  the following with the appropriate file paths and values
-    # species_name = "X. elegans"
-    # experiment_name = "xe_seedlings_time_course"
-    # fasta_file = "all_data/Xschlechteri_Nov2024/Xsch_CDS_annot150424.fasta"
-    # annotation_file = "all_data/Xschlechteri_Nov2024/20241108_Xschlechteri_annotation_23009_export_table_Oliver.csv"
-    # homologue_file = "data/uniprot/arab_idmapping_2024_09_22.csv"
-    # # main(species_name, fasta_file, annotation_file, homologue_file)
+def normalise_column(values):
+    """
+    Text form of a column's values that does not depend on the dtype pandas inferred for it: numbers (including
+    numeric text) are written as floats, e.g. 3, 3.0 and "3" all give "3.0", and missing values as "".
+    """
+    if not pd.api.types.is_bool_dtype(values):
+        numbers = pd.to_numeric(values, errors="coerce")
+        if numbers.notna().sum() == values.notna().sum():
+            return numbers.astype(float).map(repr).where(numbers.notna(), "")
+    return values.astype(object).where(values.notna(), "").astype(str)
+
+def hash_rows(df, key_columns):
+    """
+    Key and hash every row of a dataframe.
+
+    The hash is the sha1 of the row's normalised values (see normalise_column), tab separated in column name order,
+    so the same file gives the same hashes whatever dtypes were inferred when reading it, or the pandas version.
+
+    Returns:
+        (pd.Series, pd.Series): the row keys (key column values, tab separated) and the row content hashes,
+                                aligned with df
+    """
+    keys = functools.reduce(lambda left, right: left + "\t" + right, [df[column].astype(str) for column in key_columns])
+    columns = [normalise_column(df[column]) for column in sorted(df.columns)]
+    hashes = pd.Series([hashlib.sha1("\t".join(values).encode()).hexdigest() for values in zip(*columns)],
+                       index=df.index, dtype=object)
+    return keys, hashes
+
+def incremental_load(source, data, key_columns, load, delete, file_name=None, dry_run=False):
+    """
+    Apply only the rows of an input that changed since it was last loaded, and record the new state in the ledger.
+
+    Args:
+        source (str): loader and scope, e.g. "deg:xe_seedlings_time_course"
+        data (pd.DataFrame or callable): the input rows, or a function reading them (not called if the file is unchanged)
+        key_columns (list): the columns identifying a row, e.g. ["Genes"]
+        load (callable): writes a dataframe of new and changed rows, and returns the index labels of the rows it
+                         wrote. Rows it skipped are not recorded in the ledger, so they are retried on the next load.
+        delete (callable): removes the rows given as a dataframe of key columns (values as strings)
+        file_name (str, optional): the input file, if its hash matches the last load nothing is read
+        dry_run (bool): only report the delta
 
-    # # rna_seq_data = pd.read_csv("all_data/Michael_RNAseq/Xe_seedlings (updated)/Xe_seedlings_DESeq2_normalised_counts_table_tidy_for_db.csv")
-    # # add_rna_seq_data(rna_seq_data, species_name, experiment_name) # add rna seq data to database
+    Returns:
+        dict: counts of "inserted", "updated", "deleted" and "unchanged" rows
+    """
+    database = db.DB(profile=DB_PROFILE)
+    ledger_file_hash, ledger_rows = database.get_ingestion_ledger(source)
+
+    file_hash = hash_file(file_name) if file_name else None
+    if file_hash is not None and file_hash == ledger_file_hash:
+        print(f"{source}: {file_name} is unchanged since the last load, nothing to do.")
+        return {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": len(ledger_rows)}
+
+    df = data() if callable(data) else data
+    df = df.drop_duplicates(key_columns, keep="last")
+    keys, hashes = hash_rows(df, key_columns)
+    previous = keys.map(ledger_rows)
+    inserted = previous.isna()
+    updated = ~inserted & (previous != hashes)
+    deleted_keys = sorted(set(ledger_rows) - set(keys))
 
-    # DEG_data = "all_data/Michael_RNAseq/Xe_seedlings (updated)/All genes with earliest onset of DE with direction.csv"
-    # experiment_name = "xe_seedlings_time_course"
+    delta = {
+        "inserted": int(inserted.sum()),
+        "updated": int(updated.sum()),
+        "deleted": len(deleted_keys),
+        "unchanged": int((~inserted & ~updated).sum()),
+    }
+    print(f"\n--- Delta for {source}{' (dry run)' if dry_run else ''} ---")
+    for change, count in delta.items():
+        print(f"{change.capitalize()}: {count} rows")
+    if deleted_keys:
+        print(f"Deleted keys: {deleted_keys[:10]}{' ...' if len(deleted_keys) > 10 else ''}")
+    if dry_run:
+        return delta
+
+    changed = inserted | updated
+    written = changed.copy()
+    if changed.any():
+        written[:] = False
+        written[load(df[changed])] = True
+    if deleted_keys:
+        delete(pd.DataFrame([key.split("\t") for key in deleted_keys], columns=key_columns))
+    skipped = int((changed & ~written).sum())
+    if skipped:
+        print(f"{source}: {skipped} rows were not written and will be retried on the next load.")
+        # an unchanged file must not short-circuit that retry
+        file_hash = None
+    database.record_ingestion(source, str(file_name) if file_name else None, file_hash, dict(zip(keys[written], hashes[written])),
+                              deleted_keys, row_count=len(df))
+    return delta
+
+def delete_rna_seq_data(keys, species, experiment_name):
+    """Delete the expression values of an experiment given by gene_name, treatment, time and replicate."""
+    database = db.DB(profile=DB_PROFILE)
+    species_id = database.get_species_by_name(species).id
+    experiment_id = database.get_experiment_by_name(experiment_name).id
+    gene_ids = keys["gene_name"].map(database.get_gene_index(species_id)["id"])
+    samples = [(int(gene_id), treatment, int(time), replicate)
+               for gene_id, treatment, time, replicate in zip(gene_ids, keys["treatment"], keys["time"], keys["replicate"])
+               if pd.notna(gene_id)]
+    expression = models.Gene_expressions
+    sample_key = sq.tuple_(expression.gene_id, expression.treatment, expression.time, expression.replicate)
+    try:
+        for chunk in iter_chunks(samples, database.LOOKUP_CHUNK_SIZE // 4):
+            database.session.query(expression).filter(
+                expression.experiment_id == experiment_id, sample_key.in_(chunk)
+            ).delete(synchronize_session=False)
+        database.session.commit()
+    except SQLAlchemyError as e:
+        database.session.rollback()
+        print(e)
+        raise e
+    database.touch_expression_data([experiment_id])
+    database.refresh_expression_summary(experiment_name, {gene_id for gene_id, *_ in samples})
+    print(f"Deleted {len(samples)} expression values from {experiment_name}")
 
-    # add_DEG_data(DEG_data, experiment_name) # add DEG data to database
+def delete_DEG_data(keys, experiment_name):
+    """Delete the DEG records of an experiment for the genes given in the Genes column."""
+    database = db.DB(profile=DB_PROFILE)
+    experiment = database.get_experiment_by_name(experiment_name)
+    gene_ids = keys["Genes"].map(database.get_gene_index(experiment.species_id)["id"]).dropna().astype(int).tolist()
+    try:
+        for chunk in iter_chunks(gene_ids, database.LOOKUP_CHUNK_SIZE):
+            database.session.query(models.DifferentialExpression).filter(
+                models.DifferentialExpression.experiment_id == experiment.id,
+                models.DifferentialExpression.gene_id.in_(chunk)
+            ).delete(synchronize_session=False)
+        database.session.commit()
+    except SQLAlchemyError as e:
+        database.session.rollback()
+        print(e)
+        raise e
+    print(f"Deleted {len(gene_ids)} DEG records from {experiment_name}")
+
+
+####################
+# Manifest-driven ingestion pipeline
+####################
+# Input files are read and transformed for each species in a process pool, but SQLite allows only one writer,
+# so every write happens in this process, one species at a time, as soon as its inputs are ready.
+#
+# Manifest (JSON, paths relative to the manifest file):
+# {
+#     "species": [
+#         {
+#             "name": "X. elegans",
+#             "fasta": "Xele_CDS.fasta.gz",
+#             "annotations": "Xele_annotation_export_table.csv",
+#             "homologues": "arab_idmapping.csv",
+#             "experiments": [
+#                 {"name": "xe_seedlings_time_course", "description": "time course of X. elegans seedlings",
+#                  "expression": "Xe_seedlings_DESeq2_normalised_counts_table.csv",
+#                  "deg": "All genes with earliest onset of DE with direction.csv"}
+#             ],
+#             "grn": "xe_grn.csv"
+#         }
+#     ]
+# }
+# An experiment can give "expression_tidy" (long format, as loaded by add_rna_seq_data) instead of the
+# "expression" count matrix. Every file is optional.
+MANIFEST_FILE_KEYS = {"fasta", "annotations", "homologues", "grn", "expression", "expression_tidy", "deg"}
+
+def load_manifest(manifest_file):
+    """Read an ingestion manifest and resolve its file paths relative to the manifest's directory."""
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(manifest_file))
+
+    def resolve(entry):
+        return {key: os.path.join(base_dir, value) if key in MANIFEST_FILE_KEYS else value
+                for key, value in entry.items()}
+
+    species_entries = []
+    for entry in manifest["species"]:
+        entry = resolve(entry)
+        entry["experiments"] = [resolve(experiment) for experiment in entry.get("experiments", [])]
+        species_entries.append(entry)
+    return species_entries
+
+def parse_species_inputs(entry, species_id):
+    """
+    Read and transform all input files of one species of the manifest. Runs in a worker process,
+    so it never touches the database. The FASTA file is only passed on by path: the writer streams it
+    (see load_gene_sequences), so the sequences are never held in memory in full or pickled between processes.
 
-    file = "all_data/test_grn.csv"
-    df = pd.read_csv(file)
-    add_regulatory_interactions(df, species_name="X. elegans")
+    Returns:
+        (dict, list): the parsed inputs, and a timing record for each file
+    """
+    parsed = {"name": entry["name"], "species_id": species_id, "experiments": []}
+    timings = []
+
+    def timed(stage, parse, *args):
+        start = time.perf_counter()
+        result = parse(*args)
+        timings.append({"species": entry["name"], "stage": stage, "step": "parse",
+                        "rows": len(result), "seconds": time.perf_counter() - start})
+        return result
+
+    if "fasta" in entry:
+        parsed["fasta"] = entry["fasta"]
+    if "annotations" in entry:
+        parsed["annotations"] = timed("annotations", parse_annotations, entry["annotations"], entry.get("annotations_sep", ","))
+    if "homologues" in entry:
+        parsed["homologues"] = timed("homologues", read_a_thaliana_gene_mapping, entry["homologues"])
+    for experiment in entry["experiments"]:
+        parsed_experiment = {"name": experiment["name"], "description": experiment.get("description")}
+        if "expression" in experiment:
+            parsed_experiment["expression"] = timed(
+                f"expression {experiment['name']}",
+                lambda f: dt.transform_to_long(pd.read_csv(f), log2=True, time_as_int=True)
+                            .rename(columns={"expression": "normalised_expression"}),
+                experiment["expression"])
+        elif "expression_tidy" in experiment:
+            parsed_experiment["expression"] = timed(f"expression {experiment['name']}", pd.read_csv, experiment["expression_tidy"])
+        if "deg" in experiment:
+            parsed_experiment["deg"] = timed(f"DEGs {experiment['name']}", pd.read_csv, experiment["deg"])
+        parsed["experiments"].append(parsed_experiment)
+    if "grn" in entry:
+        parsed["grn"] = timed("GRN", pd.read_csv, entry["grn"])
+    return parsed, timings
+
+def write_species_inputs(parsed):
+    """
+    Write the parsed inputs of one species to the database, in dependency order (genes first).
+    Must only be called from the single writer process.
+
+    Returns:
+        list: a timing record for each stage
+    """
+    timings = []
+
+    def timed(stage, rows, write, *args):
+        # rows=None takes the number of rows from the writer's return value
+        start = time.perf_counter()
+        written = write(*args)
+        timings.append({"species": parsed["name"], "stage": stage, "step": "write",
+                        "rows": written if rows is None else rows, "seconds": time.perf_counter() - start})
+
+    species_id = parsed["species_id"]
+    if "fasta" in parsed:
+        timed("sequences", None, load_gene_sequences, read_fasta_records(parsed["fasta"], species_id))
+    if "annotations" in parsed:
+        timed("annotations", len(parsed["annotations"]), load_gene_annotations, parsed["annotations"], species_id)
+    if "homologues" in parsed:
+        database = db.DB(profile=DB_PROFILE)
+        timed("homologues", len(parsed["homologues"]), database.add_a_thaliana_gene_mappings, parsed["homologues"])
+    for experiment in parsed["experiments"]:
+        add_experiment(experiment["name"], experiment["description"], species_id=species_id)
+        if "expression" in experiment:
+            timed(f"expression {experiment['name']}", len(experiment["expression"]),
+                  add_rna_seq_data, experiment["expression"], parsed["name"], experiment["name"])
+        if "deg" in experiment:
+            timed(f"DEGs {experiment['name']}", len(experiment["deg"]), load_DEG_data, experiment["deg"], experiment["name"])
+    if "grn" in parsed:
+        timed("GRN", len(parsed["grn"]), add_regulatory_interactions, parsed["grn"], parsed["name"])
+    return timings
+
+def run_manifest(manifest_file, workers=None, create=False):
+    """
+    Load every species of an ingestion manifest: inputs are parsed in parallel (one process per species),
+    and written by this process as each species becomes ready.
+
+    Args:
+        manifest_file (str): path to the JSON manifest
+        workers (int, optional): number of parser processes, defaults to one per species (capped at the CPU count)
+        create (bool): delete and recreate the database first
+
+    Returns:
+        pd.DataFrame: the rows, seconds and throughput of every parse and write stage
+    """
+    species_entries = load_manifest(manifest_file)
+    if create:
+        create_new_db()
+
+    database = db.DB(profile=DB_PROFILE)
+    species_ids = {entry["name"]: database.add_species(entry["name"]).id for entry in species_entries}
+    workers = workers or min(len(species_entries), os.cpu_count() or 1)
+
+    timings = []
+    with ProcessPoolExecutor(max_workers=max(workers, 1)) as pool:
+        futures = [pool.submit(parse_species_inputs, entry, species_ids[entry["name"]]) for entry in species_entries]
+        for future in as_completed(futures):
+            parsed, parse_timings = future.result()
+            print(f"\n=== Writing {parsed['name']} ===")
+            timings.extend(parse_timings)
+            timings.extend(write_species_inputs(parsed))
+
+    report = pd.DataFrame(timings, columns=["species", "stage", "step", "rows", "seconds"])
+    report["rows_per_second"] = (report["rows"] / report["seconds"].clip(lower=1e-9)).round().astype(int)
+    print("\n--- Ingestion Summary ---")
+    print(report.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+    return report
+
+def refresh_expression_summaries():
+    """Recompute the replicate summary of every experiment, e.g. after upgrading a database that was loaded without it."""
+    database = db.DB(profile=DB_PROFILE)
+    experiments = database.session.query(models.Experiments.experiment_name).all()
+    return {experiment_name: database.refresh_expression_summary(experiment_name) for (experiment_name,) in experiments}
+
+def export_expression_store(store_dir):
+    """Write every experiment's expression values to the Parquet expression store in store_dir (see DB.export_expression_store)."""
+    database = db.DB(profile=DB_PROFILE)
+    experiments = database.session.query(models.Experiments.experiment_name).all()
+    return [database.export_expression_store(experiment_name, store_dir) for (experiment_name,) in experiments]
+
+def export_expression_matrices(directory):
+    """Write every experiment's expression values as memory-mapped matrices in directory (see database.expression_matrix)."""
+    database = db.DB(profile=DB_PROFILE)
+    experiments = database.session.query(models.Experiments.experiment_name).all()
+    return [expression_matrix.export_expression_matrix(database, experiment_name, directory)
+            for (experiment_name,) in experiments]
+
+####################
+# Offline builds
+####################
+# build_database loads everything into a throwaway staging file with the bulk_load connection profile and only
+# the unique indexes the upserts need, then adds the remaining indexes and the FTS indexes in one pass, runs
+# ANALYZE and writes a compact, defragmented copy with VACUUM INTO. The copy is served read-only
+# (profile "immutable") and can be published to a running app through a release pointer file.
+
+@contextlib.contextmanager
+def use_database(database_name, profile):
+    """Point every DB() made by the loaders at another database file and connection profile for the duration of the block."""
+    global DB_PROFILE
+    previous = db.DB.DATABASE_NAME, db.DB.RELEASE_POINTER, DB_PROFILE
+    db.DB.DATABASE_NAME, db.DB.RELEASE_POINTER, DB_PROFILE = database_name, None, profile
+    try:
+        yield
+    finally:
+        db.dispose_engines(database_name)
+        db.DB.DATABASE_NAME, db.DB.RELEASE_POINTER, DB_PROFILE = previous
+
+def create_staging_schema(engine):
+    """Create all tables with only their unique keys, the other indexes are created after loading by create_deferred_indexes."""
+    with engine.begin() as conn:
+        for table in models.Base.metadata.sorted_tables:
+            conn.execute(sq.schema.CreateTable(table))
+            for index in table.indexes:
+                if index.unique:
+                    index.create(conn)
+
+def create_deferred_indexes(engine):
+    """Create the non-unique and FTS indexes of a staging database, then gather the query planner statistics."""
+    with engine.begin() as conn:
+        for table in models.Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if not index.unique:
+                    index.create(conn)
+        for fts_table, (source_table, column) in models.FTS_INDEXES.items():
+            for statement in models.fts_index_ddl(fts_table, source_table, column):
+                conn.exec_driver_sql(statement)
+            # index the rows that were loaded before the index existed
+            conn.exec_driver_sql(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+        conn.exec_driver_sql("ANALYZE")
+
+def publish_release(artifact, pointer):
+    """Atomically point the release pointer file at a built artifact, running apps pick it up on their next DB()."""
+    pointer_dir = os.path.dirname(os.path.abspath(pointer))
+    temp_pointer = f"{pointer}.tmp"
+    with open(temp_pointer, "w") as f:
+        f.write(os.path.relpath(os.path.abspath(artifact), pointer_dir))
+    os.replace(temp_pointer, pointer)
+    print(f"Published {artifact} to {pointer}")
+
+def build_database(manifest_file, output_dir, version=None, workers=None, publish=None, expression_store=None,
+                   expression_matrices=None):
+    """
+    Build an optimised, versioned, read-only database artifact from an ingestion manifest.
+
+    Args:
+        manifest_file (str): path to the JSON manifest (see run_manifest)
+        output_dir (str): directory the artifact is written to, as xerophyta_db_<version>.sqlite
+        version (str, optional): version stamp recorded in the database_builds table, defaults to the build time
+        workers (int, optional): number of parser processes
+        publish (str, optional): release pointer file to point at the new artifact (see db.resolve_database_name)
+        expression_store (str, optional): also export the expression values to a Parquet store in this directory
+        expression_matrices (str, optional): also export the expression values as memory-mapped matrices in this directory
+
+    Returns:
+        str: path to the artifact
+    """
+    version = version or datetime.now().strftime("%Y%m%d%H%M%S")
+    os.makedirs(output_dir, exist_ok=True)
+    artifact = os.path.join(output_dir, f"xerophyta_db_{version}.sqlite")
+    staging = os.path.join(output_dir, f"staging_{version}.sqlite")
+    if os.path.exists(artifact):
+        raise FileExistsError(f"Database version {version} was already built: {artifact}")
+    if os.path.exists(staging):
+        os.remove(staging)
+
+    timings = {}
+    start = time.perf_counter()
+    engine = db.get_engine(staging, profile="bulk_load")
+    create_staging_schema(engine)
+    try:
+        with use_database(staging, "bulk_load"):
+            run_manifest(manifest_file, workers=workers)
+            timings["load"] = time.perf_counter() - start
+
+            stage_start = time.perf_counter()
+            engine = db.get_engine(staging, profile="bulk_load")
+            create_deferred_indexes(engine)
+            with engine.begin() as conn:
+                conn.execute(sq.insert(models.DatabaseBuild).values(version=version, manifest_hash=hash_file(manifest_file)))
+            timings["index"] = time.perf_counter() - stage_start
+
+            if expression_store:
+                stage_start = time.perf_counter()
+                export_expression_store(expression_store)
+                timings["expression store"] = time.perf_counter() - stage_start
+            if expression_matrices:
+                stage_start = time.perf_counter()
+                export_expression_matrices(expression_matrices)
+                timings["expression matrices"] = time.perf_counter() - stage_start
+
+            stage_start = time.perf_counter()
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.exec_driver_sql("VACUUM INTO ?", (artifact,))
+            timings["vacuum"] = time.perf_counter() - stage_start
+    finally:
+        db.dispose_engines(staging)
+        if os.path.exists(staging):
+            os.remove(staging)
+
+    os.chmod(artifact, 0o444)
+    print(f"Built {artifact} ({os.path.getsize(artifact) / 1024 ** 2:.1f} MiB) in {time.perf_counter() - start:.1f}s: "
+          + ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in timings.items()))
+    if publish:
+        publish_release(artifact, publish)
+    return artifact
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load Xerophyta data files into the database from a manifest.")
+    parser.add_argument("manifest", help="JSON manifest listing the input files of each species")
+    parser.add_argument("--workers", type=int, default=None, help="number of parser processes (default: one per species)")
+    parser.add_argument("--create", action="store_true", help="delete and recreate the database before loading")
+    parser.add_argument("--build", metavar="OUTPUT_DIR",
+                        help="build a new read-only database artifact in OUTPUT_DIR instead of loading into the current database")
+    parser.add_argument("--version", help="version stamp of the built artifact (default: the build time)")
+    parser.add_argument("--publish", metavar="POINTER", help="release pointer file to point at the built artifact")
+    parser.add_argument("--expression-store", metavar="STORE_DIR",
+                        help="also write the expression values to a Parquet store (see DB.EXPRESSION_STORE)")
+    parser.add_argument("--expression-matrices", metavar="MATRIX_DIR",
+                        help="also write the expression values as memory-mapped matrices (see database.expression_matrix)")
+    args = parser.parse_args(argv)
+    if args.build:
+        build_database(args.manifest, args.build, version=args.version, workers=args.workers, publish=args.publish,
+                       expression_store=args.expression_store, expression_matrices=args.expression_matrices)
+    else:
+        run_manifest(args.manifest, workers=args.workers, create=args.create)
+        if args.expression_store:
+            export_expression_store(args.expression_store)
+        if args.expression_matrices:
+            export_expression_matrices(args.expression_matrices)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Dense, memory-mapped expression matrices: one genes x samples float32 grid per experiment and value column.
+
+The matrices are .npy files opened with numpy.memmap in read-only mode, so slicing the rows of a gene list only
+touches the pages holding those rows, and the pages are shared through the OS page cache by every process
+serving the same files (e.g. all Streamlit workers). A sidecar index.json holds the gene names and ids of the
+rows and the treatment, time and replicate of the columns.
+
+Layout of an experiment directory:
+    <directory>/<experiment_name>/index.json
+    <directory>/<experiment_name>/normalised_expression.npy
+    <directory>/<experiment_name>/log2_expression.npy
+"""
+import json
+import os
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+import database.models as models
+from database.db import DB
+
+VALUE_COLUMNS = ["normalised_expression", "log2_expression"]
+SAMPLE_COLUMNS = ["treatment", "time", "replicate"]
+
+
+def export_expression_matrix(database, experiment_name, directory):
+    """
+    Write the expression values of an experiment as dense genes x samples matrices.
+
+    Samples a gene has no value for are stored as NaN. The experiment directory is written next to the
+    existing one and swapped in, so readers never see a partial export.
+
+    Args:
+        database (DB): database to read the expression values from
+        experiment_name (str): Name of the experiment.
+        directory (str): Directory holding one sub-directory per experiment.
+
+    Returns:
+        str: path of the experiment directory
+    """
+    query = (
+        database.session.query(
+            models.Gene.gene_name,
+            models.Gene_expressions.gene_id,
+            models.Gene_expressions.treatment,
+            models.Gene_expressions.time,
+            models.Gene_expressions.replicate,
+            models.Gene_expressions.normalised_expression,
+            models.Gene_expressions.log2_expression,
+        )
+        .join(models.Gene, models.Gene_expressions.gene_id == models.Gene.id)
+        .join(models.Experiments, models.Gene_expressions.experiment_id == models.Experiments.id)
+        .filter(models.Experiments.experiment_name == experiment_name)
+    )
+    df = database.read_frame(query)
+    if df.empty:
+        raise ValueError(f"Experiment '{experiment_name}' has no expression values to export")
+
+    genes = df[["gene_name", "gene_id"]].drop_duplicates("gene_name").sort_values("gene_name").reset_index(drop=True)
+    samples = df[SAMPLE_COLUMNS].drop_duplicates().sort_values(SAMPLE_COLUMNS).reset_index(drop=True)
+    rows = pd.Index(genes["gene_name"]).get_indexer(df["gene_name"])
+    columns = pd.MultiIndex.from_frame(samples).get_indexer(pd.MultiIndex.from_frame(df[SAMPLE_COLUMNS]))
+
+    path = os.path.join(directory, experiment_name)
+    temp_path = f"{path}.tmp"
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+    for value in VALUE_COLUMNS:
+        matrix = np.lib.format.open_memmap(os.path.join(temp_path, f"{value}.npy"), mode="w+",
+                                           dtype=np.float32, shape=(len(genes), len(samples)))
+        matrix[:] = np.nan
+        matrix[rows, columns] = df[value].to_numpy(dtype=np.float32)
+        matrix.flush()
+        del matrix
+    with open(os.path.join(temp_path, "index.json"), "w") as f:
+        json.dump({
+            "experiment_name": experiment_name,
+            "gene_names": genes["gene_name"].tolist(),
+            "gene_ids": genes["gene_id"].astype(int).tolist(),
+            "samples": samples.astype({"time": int}).to_dict("list"),
+        }, f)
+
+    # swap the new export in, processes that still map the old files keep reading them until they reopen
+    old_path = f"{path}.old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(temp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    print(f"Exported {len(genes)} genes x {len(samples)} samples of {experiment_name} to {path}")
+    return path
+
+
+class ExpressionMatrix():
+    """Read-only access to the exported expression matrices of one experiment."""
+
+    def __init__(self, path) -> None:
+        """
+        Args:
+            path (str): the experiment directory written by export_expression_matrix
+        """
+        self.path = path
+        with open(os.path.join(path, "index.json")) as f:
+            index = json.load(f)
+        self.experiment_name = index["experiment_name"]
+        self.gene_names = index["gene_names"]
+        self.gene_ids = np.asarray(index["gene_ids"], dtype=np.int64)
+        self.samples = pd.DataFrame(index["samples"], columns=SAMPLE_COLUMNS)
+        self._rows = {gene_name: row for row, gene_name in enumerate(self.gene_names)}
+        self._matrices = {
+            value: np.load(os.path.join(path, f"{value}.npy"), mmap_mode="r") for value in VALUE_COLUMNS
+        }
+
+    def rows(self, gene_names):
+        """Return the matrix rows of the genes that are in the experiment, in the order given, and their names."""
+        found = [gene_name for gene_name in dict.fromkeys(gene_names) if gene_name in self._rows]
+        return np.array([self._rows[gene_name] for gene_name in found], dtype=np.int64), found
+
+    def slice(self, gene_names, value="normalised_expression"):
+        """
+        Return the gene x sample grid of a gene list.
+
+        Args:
+            gene_names (list): genes to read, genes that are not in the experiment are left out
+            value (str): "normalised_expression" or "log2_expression"
+
+        Returns:
+            pd.DataFrame: one row per gene (indexed by gene_name) and one column per (treatment, time, replicate)
+        """
+        rows, found = self.rows(gene_names)
+        return pd.DataFrame(self._matrices[value][rows], index=pd.Index(found, name="gene_name"),
+                            columns=pd.MultiIndex.from_frame(self.samples))
+
+    def to_long(self, gene_names, treatments=None):
+        """
+        Return the values of a gene list in the long format of DB.get_gene_expression_data, leaving out missing samples.
+
+        Args:
+            gene_names (list): genes to read
+            treatments (list, optional): only return these treatments, e.g. ["De"]
+        """
+        rows, found = self.rows(gene_names)
+        sample_columns = np.arange(len(self.samples))
+        if treatments is not None:
+            sample_columns = sample_columns[self.samples["treatment"].isin(treatments).to_numpy()]
+        values = {value: self._matrices[value][np.ix_(rows, sample_columns)].ravel() for value in VALUE_COLUMNS}
+
+        samples = self.samples.iloc[sample_columns]
+        long_df = pd.DataFrame({
+            "gene_id": np.repeat(self.gene_ids[rows], len(sample_columns)),
+            "normalised_expression": values["normalised_expression"].astype(np.float64),
+            "log2_expression": values["log2_expression"].astype(np.float64),
+            "treatment": np.tile(samples["treatment"].to_numpy(), len(rows)),
+            "time": np.tile(samples["time"].to_numpy(), len(rows)),
+            "replicate": np.tile(samples["replicate"].to_numpy(), len(rows)),
+            "gene_name": np.repeat(np.asarray(found, dtype=object), len(sample_columns)),
+        })
+        long_df = long_df[long_df["normalised_expression"].notna()].reset_index(drop=True)
+        return long_df.astype(DB.EXPRESSION_DTYPES)
+
+
+# opened matrices, shared by all threads of the process: experiment directory -> (index.json mtime, ExpressionMatrix)
+_OPEN_MATRICES = {}
+_OPEN_MATRICES_LOCK = threading.Lock()
+
+
+def open_expression_matrix(directory, experiment_name):
+    """
+    Return the ExpressionMatrix of an experiment, opened once per process and reopened after a new export.
+
+    Returns:
+        ExpressionMatrix or None: None if the experiment has not been exported to directory
+    """
+    path = os.path.join(directory, experiment_name)
+    try:
+        mtime = os.stat(os.path.join(path, "index.json")).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _OPEN_MATRICES.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with _OPEN_MATRICES_LOCK:
+        matrix = ExpressionMatrix(path)
+        _OPEN_MATRICES[path] = (mtime, matrix)
+    return matrix
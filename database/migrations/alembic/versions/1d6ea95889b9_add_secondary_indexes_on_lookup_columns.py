@@ -0,0 +1,51 @@
+"""add secondary indexes on foreign key and lookup columns
+
+Revision ID: 1d6ea95889b9
+Revises: aded5eaefd2d
+Create Date: 2026-10-17 09:12:31.482113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1d6ea95889b9'
+down_revision: Union[str, None] = 'aded5eaefd2d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (index name, table, columns)
+# differential_expression indexes already exist from 8e6fd2f185fe
+INDEXES = [
+    ('ix_genes_species_id', 'genes', ['species_id']),
+    ('ix_gene_expressions_experiment_gene_treatment_time', 'gene_expressions', ['experiment_id', 'gene_id', 'treatment', 'time']),
+    ('ix_gene_expressions_gene_id', 'gene_expressions', ['gene_id']),
+    ('ix_experiments_experiment_name', 'experiments', ['experiment_name']),
+    ('ix_annotations_gene_id', 'annotations', ['gene_id']),
+    ('ix_regulatory_interactions_target_gene_id', 'regulatory_interactions', ['target_gene_id']),
+    ('ix_regulatory_interactions_regulatory_cluster', 'regulatory_interactions', ['regulatory_cluster']),
+    ('ix_regulatory_interactions_target_cluster', 'regulatory_interactions', ['target_cluster']),
+    ('ix_GO_go_id', 'GO', ['go_id']),
+    ('ix_enzyme_codes_enzyme_code', 'enzyme_codes', ['enzyme_code']),
+    ('ix_interpro_interpro_id', 'interpro', ['interpro_id']),
+    ('ix_annotations_go_go_id', 'annotations_go', ['go_id']),
+    ('ix_annotations_enzyme_codes_enzyme_code_id', 'annotations_enzyme_codes', ['enzyme_code_id']),
+    ('ix_annotations_interpro_interpro_id', 'annotations_interpro', ['interpro_id']),
+    ('ix_gene_homologue_association_homologue_id', 'gene_homologue_association', ['homologue_id']),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+    # refresh planner statistics so the new indexes are picked up
+    op.execute("ANALYZE")
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
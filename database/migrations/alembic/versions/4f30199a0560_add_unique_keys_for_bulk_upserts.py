@@ -0,0 +1,91 @@
+"""add unique keys used as conflict targets by bulk upserts
+
+Revision ID: 4f30199a0560
+Revises: 5cbbbc0841ee
+Create Date: 2026-10-17 16:22:47.038174
+
+The unique indexes cannot be created while the tables hold duplicate keys. By default the upgrade counts the
+duplicates and aborts with a report, leaving the data untouched. To keep the most recently written row of each
+key and delete the others, opt in with:
+
+    alembic -x dedupe=true upgrade head
+
+Rows of gene_expressions and differential_expression that belong to a deleted duplicate experiment are first
+moved to the experiment that is kept, so no row is left pointing at a missing experiment.
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f30199a0560'
+down_revision: Union[str, None] = '5cbbbc0841ee'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (unique index name, table, key columns), experiments first so their child rows are re-pointed before those are checked
+UNIQUE_KEYS = [
+    ('uq_experiments_experiment_name', 'experiments', ['experiment_name']),
+    ('uq_gene_expressions_sample', 'gene_expressions', ['experiment_id', 'gene_id', 'treatment', 'time', 'replicate']),
+    ('uq_differential_expression_gene_experiment', 'differential_expression', ['gene_id', 'experiment_id']),
+]
+# tables referencing experiments.id
+EXPERIMENT_CHILD_TABLES = ['gene_expressions', 'differential_expression']
+
+
+def count_duplicates(connection, table, columns):
+    """Number of rows that share their key with a more recently written row."""
+    key = ", ".join(columns)
+    return connection.exec_driver_sql(
+        f"SELECT COUNT(*) - (SELECT COUNT(*) FROM (SELECT 1 FROM {table} GROUP BY {key})) FROM {table}"
+    ).scalar()
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    dedupe = context.get_x_argument(as_dictionary=True).get('dedupe', '').lower() in ('1', 'true', 'yes')
+
+    duplicates = {table: count_duplicates(connection, table, columns) for _, table, columns in UNIQUE_KEYS}
+    if any(duplicates.values()) and not dedupe:
+        report = ", ".join(f"{table}: {count}" for table, count in duplicates.items() if count)
+        raise RuntimeError(
+            f"Cannot add unique keys, duplicate rows found ({report}). Remove them by hand, or re-run with "
+            "'alembic -x dedupe=true upgrade head' to keep the most recently written row of each key."
+        )
+
+    for name, table, columns in UNIQUE_KEYS:
+        key = ", ".join(columns)
+        if duplicates[table] and table == 'experiments':
+            # move the rows of duplicate experiments to the one that is kept before deleting them
+            for child_table in EXPERIMENT_CHILD_TABLES:
+                op.execute(
+                    f"UPDATE {child_table} SET experiment_id = ("
+                    f"SELECT MAX(kept.id) FROM experiments AS kept JOIN experiments AS duplicate "
+                    f"ON kept.experiment_name = duplicate.experiment_name WHERE duplicate.id = {child_table}.experiment_id) "
+                    f"WHERE experiment_id NOT IN (SELECT MAX(id) FROM experiments GROUP BY experiment_name)"
+                )
+            # re-pointed rows can duplicate the kept experiment's rows
+            for _, child_table, child_columns in UNIQUE_KEYS:
+                if child_table in EXPERIMENT_CHILD_TABLES:
+                    duplicates[child_table] = count_duplicates(connection, child_table, child_columns)
+        if duplicates[table]:
+            print(f"Deleting {duplicates[table]} duplicate rows of {table}")
+            op.execute(f"DELETE FROM {table} WHERE id NOT IN (SELECT MAX(id) FROM {table} GROUP BY {key})")
+        op.create_index(name, table, columns, unique=True, if_not_exists=True)
+
+    # superseded by the unique indexes above, which cover the same leading columns
+    op.drop_index('ix_gene_expressions_experiment_gene_treatment_time', table_name='gene_expressions', if_exists=True)
+    op.drop_index('ix_experiments_experiment_name', table_name='experiments', if_exists=True)
+    op.execute("ANALYZE")
+
+
+def downgrade() -> None:
+    op.create_index('ix_experiments_experiment_name', 'experiments', ['experiment_name'], if_not_exists=True)
+    op.create_index('ix_gene_expressions_experiment_gene_treatment_time', 'gene_expressions',
+                    ['experiment_id', 'gene_id', 'treatment', 'time'], if_not_exists=True)
+    for name, table, _ in reversed(UNIQUE_KEYS):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,56 @@
+"""add FTS5 trigram search indexes for GO names, enzyme names and Arabidopsis common names
+
+Revision ID: 5cbbbc0841ee
+Revises: 603c39462fc6
+Create Date: 2026-10-17 14:05:52.906217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5cbbbc0841ee'
+down_revision: Union[str, None] = '603c39462fc6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# fts table: (source table, indexed column)
+FTS_INDEXES = {
+    "go_name_fts": ("GO", "go_name"),
+    "enzyme_name_fts": ("enzyme_codes", "enzyme_name"),
+    "a_thaliana_common_name_fts": ("arabidopsis_homologues", "a_thaliana_common_name"),
+}
+
+
+def upgrade() -> None:
+    for fts_table, (source_table, column) in FTS_INDEXES.items():
+        op.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+            f"{column}, content='{source_table}', content_rowid='id', tokenize='trigram')"
+        )
+        op.execute(
+            f'CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON "{source_table}" BEGIN '
+            f"INSERT INTO {fts_table}(rowid, {column}) VALUES (new.id, new.{column}); END"
+        )
+        op.execute(
+            f'CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON "{source_table}" BEGIN '
+            f"INSERT INTO {fts_table}({fts_table}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END"
+        )
+        op.execute(
+            f'CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {column} ON "{source_table}" BEGIN '
+            f"INSERT INTO {fts_table}({fts_table}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+            f"INSERT INTO {fts_table}(rowid, {column}) VALUES (new.id, new.{column}); END"
+        )
+        # index the rows that already exist in the source table
+        op.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    for fts_table in FTS_INDEXES:
+        for suffix in ("ai", "ad", "au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {fts_table}_{suffix}")
+        op.execute(f"DROP TABLE IF EXISTS {fts_table}")
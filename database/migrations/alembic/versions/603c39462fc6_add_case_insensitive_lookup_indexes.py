@@ -0,0 +1,38 @@
+"""add case-insensitive lookup indexes for locus, GO and enzyme searches
+
+Revision ID: 603c39462fc6
+Revises: 1d6ea95889b9
+Create Date: 2026-10-17 11:40:05.271893
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '603c39462fc6'
+down_revision: Union[str, None] = '1d6ea95889b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (index name, table, indexed expression)
+# the queries in database/db.py filter on lower(column) IN (...), so the index must be on the same expression
+INDEXES = [
+    ('ix_arabidopsis_homologues_lower_a_thaliana_locus', 'arabidopsis_homologues', 'lower(a_thaliana_locus)'),
+    ('ix_GO_lower_go_id', 'GO', 'lower(go_id)'),
+    ('ix_enzyme_codes_lower_enzyme_code', 'enzyme_codes', 'lower(enzyme_code)'),
+]
+
+
+def upgrade() -> None:
+    for name, table, expression in INDEXES:
+        op.create_index(name, table, [sa.text(expression)], if_not_exists=True)
+    op.execute("ANALYZE")
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
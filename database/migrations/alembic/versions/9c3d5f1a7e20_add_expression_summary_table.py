@@ -0,0 +1,47 @@
+"""add expression_summary table holding the replicate mean, SD and SEM of each time point
+
+Revision ID: 9c3d5f1a7e20
+Revises: e41a8c07d5b2
+Create Date: 2026-10-17 21:42:09.517302
+
+The table is derived data: fill it for an existing database with db_manager.refresh_expression_summaries().
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c3d5f1a7e20'
+down_revision: Union[str, None] = 'e41a8c07d5b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('expression_summary',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('experiment_id', sa.Integer(), nullable=False),
+    sa.Column('gene_id', sa.Integer(), nullable=False),
+    sa.Column('treatment', sa.String(), nullable=False),
+    sa.Column('time', sa.Integer(), nullable=False),
+    sa.Column('n', sa.Integer(), nullable=False),
+    sa.Column('normalised_expression', sa.Float(), nullable=False),
+    sa.Column('normalised_expression_sd', sa.Float(), nullable=True),
+    sa.Column('normalised_expression_sem', sa.Float(), nullable=True),
+    sa.Column('log2_expression', sa.Float(), nullable=False),
+    sa.Column('log2_expression_sd', sa.Float(), nullable=True),
+    sa.Column('log2_expression_sem', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['experiment_id'], ['experiments.id'], ),
+    sa.ForeignKeyConstraint(['gene_id'], ['genes.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('uq_expression_summary_time_point', 'expression_summary',
+                    ['experiment_id', 'gene_id', 'treatment', 'time'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_expression_summary_time_point', table_name='expression_summary')
+    op.drop_table('expression_summary')
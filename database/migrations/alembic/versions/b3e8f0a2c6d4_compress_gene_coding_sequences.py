@@ -0,0 +1,58 @@
+"""store gene coding sequences 2-bit packed or zlib-compressed
+
+Revision ID: b3e8f0a2c6d4
+Revises: 9c3d5f1a7e20
+Create Date: 2026-10-17 23:05:31.284610
+
+The sequences are rewritten in place with database.sequence_codec. SQLite keeps BLOB values in a TEXT column
+as they are, so the column type is left unchanged. Run VACUUM afterwards to reclaim the freed pages.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from database.sequence_codec import encode_sequence, decode_sequence
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e8f0a2c6d4'
+down_revision: Union[str, None] = '9c3d5f1a7e20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BATCH_SIZE = 10000
+
+genes = sa.table('genes', sa.column('id', sa.Integer), sa.column('coding_sequence'))
+
+
+def _rewrite_sequences(convert):
+    """Apply convert to every stored sequence, BATCH_SIZE genes at a time."""
+    connection = op.get_bind()
+    update = (
+        genes.update()
+        .where(genes.c.id == sa.bindparam('gene_id'))
+        .values(coding_sequence=sa.bindparam('sequence'))
+    )
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(genes.c.id, genes.c.coding_sequence)
+            .where(genes.c.id > last_id, genes.c.coding_sequence.isnot(None))
+            .order_by(genes.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(update, [{'gene_id': gene_id, 'sequence': convert(value)} for gene_id, value in rows])
+        last_id = rows[-1][0]
+
+
+def upgrade() -> None:
+    _rewrite_sequences(lambda value: encode_sequence(value) if isinstance(value, str) else value)
+
+
+def downgrade() -> None:
+    _rewrite_sequences(decode_sequence)
@@ -0,0 +1,45 @@
+"""add ingestion ledger tables for incremental loads
+
+Revision ID: b7c2e9d41f3a
+Revises: 4f30199a0560
+Create Date: 2026-10-17 19:03:12.512734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7c2e9d41f3a'
+down_revision: Union[str, None] = '4f30199a0560'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('ingestion_files',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('file_name', sa.String(), nullable=True),
+    sa.Column('file_hash', sa.String(), nullable=True),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('loaded_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('source')
+    )
+    op.create_table('ingestion_rows',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('row_key', sa.String(), nullable=False),
+    sa.Column('row_hash', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('uq_ingestion_rows_source_row_key', 'ingestion_rows', ['source', 'row_key'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_ingestion_rows_source_row_key', table_name='ingestion_rows')
+    op.drop_table('ingestion_rows')
+    op.drop_table('ingestion_files')
@@ -0,0 +1,27 @@
+"""add an index on GO.go_name for batched GO term existence checks
+
+Revision ID: d5a1c9e7b3f2
+Revises: b3e8f0a2c6d4
+Create Date: 2026-10-17 23:48:12.906431
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a1c9e7b3f2'
+down_revision: Union[str, None] = 'b3e8f0a2c6d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_GO_go_name', 'GO', ['go_name'], if_not_exists=True)
+    op.execute("ANALYZE")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_GO_go_name', table_name='GO', if_exists=True)
@@ -0,0 +1,33 @@
+"""add database_builds table holding the version stamp of built artifacts
+
+Revision ID: e41a8c07d5b2
+Revises: b7c2e9d41f3a
+Create Date: 2026-10-17 20:15:38.204811
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e41a8c07d5b2'
+down_revision: Union[str, None] = 'b7c2e9d41f3a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('database_builds',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.String(), nullable=False),
+    sa.Column('built_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.Column('manifest_hash', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('version')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('database_builds')
@@ -0,0 +1,29 @@
+"""add experiments.data_version, recording which expression values a Parquet expression store file was exported from
+
+Revision ID: f2b6d8a4c1e9
+Revises: d5a1c9e7b3f2
+Create Date: 2026-10-18 10:14:52.663018
+
+Existing store files carry no data version, so they are not used until they are exported again
+(db_manager.export_expression_store).
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b6d8a4c1e9'
+down_revision: Union[str, None] = 'd5a1c9e7b3f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('experiments', sa.Column('data_version', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('experiments', 'data_version')
@@ -1,9 +1,11 @@
 """
 Defines all the data models used in the database
 """
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, Table, Boolean, Float, CHAR, UniqueConstraint, Enum
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy import func, Column, Integer, String, Text, ForeignKey, Table, Boolean, Float, CHAR, DateTime, UniqueConstraint, Enum, Index
+from sqlalchemy import event, DDL
+from sqlalchemy.orm import relationship, backref, deferred
 from sqlalchemy.ext.declarative import declarative_base
+from database.sequence_codec import CompressedSequence
 
 
 Base = declarative_base()
@@ -14,7 +16,9 @@ Association table for many to many relationship between annotations and GO ID te
 annotations_go = Table(
     'annotations_go', Base.metadata,
     Column('annotation_id', Integer, ForeignKey('annotations.id'), primary_key=True),
-    Column('go_id', Integer, ForeignKey('GO.id'), primary_key=True)
+    Column('go_id', Integer, ForeignKey('GO.id'), primary_key=True),
+    # the primary key only covers lookups by annotation_id, this covers GO term -> annotations
+    Index('ix_annotations_go_go_id', 'go_id')
 )
 
 '''
@@ -23,7 +27,8 @@ Association table for many to many relationship between annotations and enzyme c
 annotations_enzyme_codes = Table(
     'annotations_enzyme_codes', Base.metadata,
     Column('annotation_id', Integer, ForeignKey('annotations.id'), primary_key=True),
-    Column('enzyme_code_id', Integer, ForeignKey('enzyme_codes.id'), primary_key=True)
+    Column('enzyme_code_id', Integer, ForeignKey('enzyme_codes.id'), primary_key=True),
+    Index('ix_annotations_enzyme_codes_enzyme_code_id', 'enzyme_code_id')
 )
 
 '''
@@ -32,7 +37,8 @@ Association table for many to many relationship between annotations and interpro
 annotations_interpro = Table(
     'annotations_interpro', Base.metadata,
     Column('annotation_id', Integer, ForeignKey('annotations.id'), primary_key=True),
-    Column('interpro_id', Integer, ForeignKey('interpro.id'), primary_key=True)
+    Column('interpro_id', Integer, ForeignKey('interpro.id'), primary_key=True),
+    Index('ix_annotations_interpro_interpro_id', 'interpro_id')
 )
 
 '''
@@ -42,7 +48,8 @@ Table for storing each of the different species (X. elegans, X. humilis, X. schl
 gene_homologue_association = Table(
      'gene_homologue_association', Base.metadata,
     Column('gene_id', Integer, ForeignKey('genes.id'), primary_key=True),
-    Column('homologue_id', Integer, ForeignKey('arabidopsis_homologues.id'), primary_key=True)
+    Column('homologue_id', Integer, ForeignKey('arabidopsis_homologues.id'), primary_key=True),
+    Index('ix_gene_homologue_association_homologue_id', 'homologue_id')
 )
 
 class Species(Base):
@@ -59,15 +66,23 @@ class Gene(Base):
     id  = Column(Integer, primary_key=True)
     gene_name = Column(String, nullable=False, unique=True)
     species_id = Column(Integer, ForeignKey('species.id'), nullable=False)
-    coding_sequence = Column(Text, nullable=True)
+    # only the FASTA export needs the sequences, so they are not loaded with the gene (see DB.get_coding_sequences).
+    # Stored 2-bit packed or zlib-compressed, decompressed when read (see database/sequence_codec.py)
+    coding_sequence = deferred(Column(CompressedSequence, nullable=True))
 
     species = relationship("Species", back_populates="genes")
-    annotations = relationship("Annotation", back_populates="gene", cascade="all, delete-orphan")
+    # ordered by id, so the last annotation and homologue are the most recently loaded (see DB.get_gene_annotation_report)
+    annotations = relationship("Annotation", back_populates="gene", cascade="all, delete-orphan", order_by="Annotation.id")
     arabidopsis_homologues = relationship('ArabidopsisHomologue',
                               secondary=gene_homologue_association,
-                            back_populates='genes')
+                            back_populates='genes', order_by="ArabidopsisHomologue.id")
     gene_expressions = relationship("Gene_expressions", back_populates="genes", cascade="all, delete-orphan")
     differential_expression = relationship("DifferentialExpression", back_populates="gene", cascade="all, delete-orphan") 
+    expression_summary = relationship("ExpressionSummary", back_populates="gene", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index('ix_genes_species_id', 'species_id'),
+    )
 
 
    # Interactions where this gene is the REGULATOR
@@ -118,6 +133,10 @@ class RegulatoryInteraction(Base):
     __table_args__ = (
         # Ensures that a specific regulator-target pair is unique (per analysis/experiment if those fields are added)
         UniqueConstraint('regulator_gene_id', 'target_gene_id', name='uq_regulator_target_pair'),
+        # the unique constraint above already indexes lookups by regulator_gene_id
+        Index('ix_regulatory_interactions_target_gene_id', 'target_gene_id'),
+        Index('ix_regulatory_interactions_regulatory_cluster', 'regulatory_cluster'),
+        Index('ix_regulatory_interactions_target_cluster', 'target_cluster'),
         # If you add experiment_id, you might want:
         # UniqueConstraint('regulator_gene_id', 'target_gene_id', 'experiment_id', name='uq_regulator_target_experiment_pair'),
     )
@@ -141,9 +160,14 @@ class Annotation(Base):
     # create many to many relationships with GO, EnzymeCode and InterPro tables
     # an (gene) annotation can be linked to many multiple GO terms, enzyme codes and InterPro IDs
     # and each GO term, enzyme code and InterPro ID can be linked to multiple annotations
-    go_ids = relationship("GO", secondary=annotations_go, back_populates="annotations") 
-    enzyme_codes = relationship("EnzymeCode", secondary=annotations_enzyme_codes, back_populates="annotations")
-    interpro_ids = relationship("InterPro", secondary=annotations_interpro, back_populates="annotations")
+    # ordered by id, the order of the term lists of DB.get_gene_annotation_report
+    go_ids = relationship("GO", secondary=annotations_go, back_populates="annotations", order_by="GO.id")
+    enzyme_codes = relationship("EnzymeCode", secondary=annotations_enzyme_codes, back_populates="annotations", order_by="EnzymeCode.id")
+    interpro_ids = relationship("InterPro", secondary=annotations_interpro, back_populates="annotations", order_by="InterPro.id")
+
+    __table_args__ = (
+        Index('ix_annotations_gene_id', 'gene_id'),
+    )
 
 class ArabidopsisHomologue(Base):
     __tablename__ = "arabidopsis_homologues"
@@ -157,6 +181,11 @@ class ArabidopsisHomologue(Base):
                          secondary=gene_homologue_association,
                         back_populates='arabidopsis_homologues')
 
+    __table_args__ = (
+        # expression index for case-insensitive locus searches, e.g. lower(a_thaliana_locus) IN (...)
+        Index('ix_arabidopsis_homologues_lower_a_thaliana_locus', func.lower(a_thaliana_locus)),
+    )
+
 
 # GO Table
 class GO(Base):
@@ -168,6 +197,12 @@ class GO(Base):
 
     annotations = relationship("Annotation", secondary=annotations_go, back_populates="go_ids")
 
+    __table_args__ = (
+        Index('ix_GO_go_id', 'go_id'),
+        Index('ix_GO_lower_go_id', func.lower(go_id)),
+        Index('ix_GO_go_name', 'go_name'),
+    )
+
 # Enzyme Codes Table
 class EnzymeCode(Base):
     __tablename__ = 'enzyme_codes'
@@ -177,6 +212,11 @@ class EnzymeCode(Base):
 
     annotations = relationship("Annotation", secondary=annotations_enzyme_codes, back_populates="enzyme_codes")
 
+    __table_args__ = (
+        Index('ix_enzyme_codes_enzyme_code', 'enzyme_code'),
+        Index('ix_enzyme_codes_lower_enzyme_code', func.lower(enzyme_code)),
+    )
+
 # InterPro Table
 class InterPro(Base):
     __tablename__ = 'interpro'
@@ -187,6 +227,10 @@ class InterPro(Base):
 
     annotations = relationship("Annotation", secondary=annotations_interpro, back_populates="interpro_ids")
 
+    __table_args__ = (
+        Index('ix_interpro_interpro_id', 'interpro_id'),
+    )
+
 class Gene_expressions(Base):
     __tablename__ = "gene_expressions"
 
@@ -206,6 +250,14 @@ class Gene_expressions(Base):
     species = relationship("Species", back_populates="gene_expressions")
     genes = relationship("Gene", back_populates="gene_expressions")
 
+    __table_args__ = (
+        # one measurement per sample, used as the conflict target by DB.bulk_upsert.
+        # expression page lookups filter on experiment and gene, and plots order by treatment and time,
+        # so this also serves as the composite lookup index (including lookups by experiment_id alone)
+        Index('uq_gene_expressions_sample', 'experiment_id', 'gene_id', 'treatment', 'time', 'replicate', unique=True),
+        Index('ix_gene_expressions_gene_id', 'gene_id'),
+    )
+
 class Experiments(Base):
     __tablename__ = "experiments"
 
@@ -213,11 +265,17 @@ class Experiments(Base):
     experiment_name = Column("experiment_name", String)
     description = Column("description", Text, nullable=True)
     species_id = Column(Integer, ForeignKey("species.id"), nullable=True)  # Foreign key linking to Species
+    # changes whenever the expression values are written, see DB.touch_expression_data
+    data_version = Column(String, nullable=True)
 
     gene_expressions = relationship("Gene_expressions", back_populates="experiment")
     species = relationship("Species", back_populates="experiment")
     differential_expression = relationship("DifferentialExpression", back_populates="experiment")
 
+    __table_args__ = (
+        Index('uq_experiments_experiment_name', 'experiment_name', unique=True),
+    )
+
 class DifferentialExpression(Base):
     __tablename__ = "differential_expression"
 
@@ -231,4 +289,109 @@ class DifferentialExpression(Base):
 
     # Relationships
     gene = relationship("Gene", back_populates="differential_expression")
-    experiment = relationship("Experiments", back_populates="differential_expression")
\ No newline at end of file
+    experiment = relationship("Experiments", back_populates="differential_expression")
+
+    __table_args__ = (
+        Index('ix_differential_expression_gene_id', 'gene_id'),
+        Index('ix_differential_expression_experiment_id', 'experiment_id'),
+        Index('uq_differential_expression_gene_experiment', 'gene_id', 'experiment_id', unique=True),
+    )
+
+'''
+Replicate summary of the gene_expressions table: mean, standard deviation, standard error and number of
+replicates of each gene, experiment, treatment and time point. Derived data, rebuilt by
+DB.refresh_expression_summary whenever expression values are loaded or deleted.
+'''
+class ExpressionSummary(Base):
+    __tablename__ = "expression_summary"
+
+    id = Column(Integer, primary_key=True)
+    experiment_id = Column(Integer, ForeignKey("experiments.id"), nullable=False)
+    gene_id = Column(Integer, ForeignKey("genes.id"), nullable=False)
+    treatment = Column(String, nullable=False)
+    time = Column(Integer, nullable=False)
+    n = Column(Integer, nullable=False)  # number of replicates
+    normalised_expression = Column(Float, nullable=False)  # mean over the replicates
+    normalised_expression_sd = Column(Float, nullable=True)  # None for a single replicate
+    normalised_expression_sem = Column(Float, nullable=True)
+    log2_expression = Column(Float, nullable=False)
+    log2_expression_sd = Column(Float, nullable=True)
+    log2_expression_sem = Column(Float, nullable=True)
+
+    gene = relationship("Gene", back_populates="expression_summary")
+
+    __table_args__ = (
+        Index('uq_expression_summary_time_point', 'experiment_id', 'gene_id', 'treatment', 'time', unique=True),
+    )
+
+
+'''
+Ingestion ledger: what each loader last loaded from an input, so that re-running a loader only
+applies the rows that changed (see db_manager.incremental_load).
+A source names a loader and its scope, e.g. "deg:xe_seedlings_time_course".
+'''
+class IngestionFile(Base):
+    __tablename__ = "ingestion_files"
+
+    id = Column(Integer, primary_key=True)
+    source = Column(String, nullable=False, unique=True)
+    file_name = Column(String, nullable=True)
+    file_hash = Column(String, nullable=True)  # sha256 of the input file, None for in-memory inputs
+    row_count = Column(Integer, nullable=False)
+    loaded_at = Column(DateTime, nullable=False, server_default=func.current_timestamp())
+
+class IngestionRow(Base):
+    __tablename__ = "ingestion_rows"
+
+    id = Column(Integer, primary_key=True)
+    source = Column(String, nullable=False)
+    row_key = Column(String, nullable=False)  # the loader's key columns of the row, tab separated
+    row_hash = Column(String, nullable=False)  # hash of the row's contents
+
+    __table_args__ = (
+        Index('uq_ingestion_rows_source_row_key', 'source', 'row_key', unique=True),
+    )
+
+
+'''
+Version stamp of a database built with db_manager.build_database, one row per build
+'''
+class DatabaseBuild(Base):
+    __tablename__ = "database_builds"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(String, nullable=False, unique=True)
+    built_at = Column(DateTime, nullable=False, server_default=func.current_timestamp())
+    manifest_hash = Column(String, nullable=True)  # sha256 of the manifest the build was loaded from
+
+
+'''
+Full-text search indexes (SQLite FTS5 with the trigram tokenizer) over the free-text name columns.
+The trigram tokenizer lets LIKE '%term%' substring searches use the index instead of scanning the table.
+They are external-content tables: the text lives in the source table and triggers keep the index in sync.
+'''
+FTS_INDEXES = {
+    # fts table: (source table, indexed column)
+    "go_name_fts": ("GO", "go_name"),
+    "enzyme_name_fts": ("enzyme_codes", "enzyme_name"),
+    "a_thaliana_common_name_fts": ("arabidopsis_homologues", "a_thaliana_common_name"),
+}
+
+def fts_index_ddl(fts_table, source_table, column):
+    """Returns the SQL statements that create an FTS5 index and the triggers that keep it in sync with its source table."""
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+        f"{column}, content='{source_table}', content_rowid='id', tokenize='trigram')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON "{source_table}" BEGIN '
+        f"INSERT INTO {fts_table}(rowid, {column}) VALUES (new.id, new.{column}); END",
+        f'CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON "{source_table}" BEGIN '
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END",
+        f'CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {column} ON "{source_table}" BEGIN '
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+        f"INSERT INTO {fts_table}(rowid, {column}) VALUES (new.id, new.{column}); END",
+    ]
+
+# create the FTS indexes whenever the schema is created with Base.metadata.create_all
+for _fts_table, (_source_table, _column) in FTS_INDEXES.items():
+    for _statement in fts_index_ddl(_fts_table, _source_table, _column):
+        event.listen(Base.metadata, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
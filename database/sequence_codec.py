@@ -0,0 +1,74 @@
+"""
+Compact storage of coding sequences.
+
+Sequences made up only of A, C, G and T are packed at 2 bits per base (4 bases per byte); any other sequence
+(IUPAC ambiguity codes, soft-masked lower case, ...) is zlib-compressed. The first byte of the stored value
+records the format, so both kinds can live in the same column:
+
+    PACKED_2BIT + <uint32 little-endian sequence length> + <packed bases>
+    ZLIB        + <zlib stream of the ASCII sequence>
+
+Values written before sequences were compressed are plain text, and are returned as they are.
+"""
+import struct
+import zlib
+import numpy as np
+from sqlalchemy.types import TypeDecorator, LargeBinary
+
+PACKED_2BIT = b"\x02"
+ZLIB = b"\x01"
+BASES = b"ACGT"
+ZLIB_LEVEL = 6
+
+# byte value -> 2-bit code, 255 for anything that is not A, C, G or T
+_BASE_CODES = np.full(256, 255, dtype=np.uint8)
+_BASE_CODES[np.frombuffer(BASES, dtype=np.uint8)] = np.arange(4, dtype=np.uint8)
+_CODE_BASES = np.frombuffer(BASES, dtype=np.uint8)
+_SHIFTS = np.array([6, 4, 2, 0], dtype=np.uint8)
+
+
+def encode_sequence(sequence):
+    """Return the stored form of a sequence (None stays None)."""
+    if sequence is None:
+        return None
+    raw = sequence.encode("ascii")
+    codes = _BASE_CODES[np.frombuffer(raw, dtype=np.uint8)]
+    if len(raw) == 0 or (codes == 255).any():
+        return ZLIB + zlib.compress(raw, ZLIB_LEVEL)
+
+    padded = np.zeros(-(-len(codes) // 4) * 4, dtype=np.uint8)
+    padded[:len(codes)] = codes
+    packed = np.bitwise_or.reduce(padded.reshape(-1, 4) << _SHIFTS, axis=1).astype(np.uint8)
+    return PACKED_2BIT + struct.pack("<I", len(codes)) + packed.tobytes()
+
+
+def decode_sequence(value):
+    """Return the sequence of a stored value (None stays None)."""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    kind, payload = value[:1], value[1:]
+    if kind == PACKED_2BIT:
+        (length,) = struct.unpack("<I", payload[:4])
+        packed = np.frombuffer(payload[4:], dtype=np.uint8)
+        codes = ((packed[:, None] >> _SHIFTS) & 3).ravel()[:length]
+        return _CODE_BASES[codes].tobytes().decode("ascii")
+    if kind == ZLIB:
+        return zlib.decompress(payload).decode("ascii")
+    # plain text written before compression was introduced
+    return value.decode("ascii")
+
+
+class CompressedSequence(TypeDecorator):
+    """Column type holding a sequence as encode_sequence bytes; reads and writes plain strings."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, str):
+            return encode_sequence(value)
+        return value
+
+    def process_result_value(self, value, dialect):
+        return decode_sequence(value)
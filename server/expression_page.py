@@ -5,7 +5,7 @@ import matplotlib.pyplot as plt
 import  database.db as db
 import utils.plots as plots
 from utils.constants import DEGFilter, GENE_SELECTION_OPTIONS, DEG_FILTER_OPTIONS
-from utils.helper_functions import parse_input, retreive_query_data
+from utils.helper_functions import parse_input, resolve_query_genes
 from datetime import datetime
 import io, zipfile
 from PIL import Image
@@ -19,6 +19,7 @@ st.divider()
 database = db.DB()
 EXPRESSION_PLOT_OPTIONS = ["log2_expression", "normalised_expression"]
 PLOT_DISPLAY_OPTIONS = ["Genes on single plot", "Genes on separate plot"]
+REPLICATE_OPTIONS = ["Replicates and mean", "Mean only"]
 MAX_GENES_FOR_PLOTTING = 50  # Limit to prevent server overload and long processing times
 
 
@@ -66,13 +67,17 @@ def setup_sidebar():
         key="filter_deg"
         )
     st.sidebar.radio("Plot display style:", PLOT_DISPLAY_OPTIONS, key="plot_type")
+    st.sidebar.radio("Data points to show:", REPLICATE_OPTIONS, key="replicates")
     
 
 
 
 @st.cache_data
 def show_raw_data(data):
-    df = data[[  "gene_name", "log2_expression", "normalised_expression", "treatment", "time",  "replicate"]]
+    if "replicate" in data.columns:
+        df = data[[  "gene_name", "log2_expression", "normalised_expression", "treatment", "time",  "replicate"]]
+    else:
+        df = data.drop(columns=["gene_id"])
     st.dataframe(df)
 
 
@@ -89,10 +94,11 @@ def map_gene_selection():
 
 def generate_plots(data):
     st.subheader("Plots")
+    replicates = st.session_state.replicates != "Mean only"
 
     if st.session_state.plot_type == "Genes on single plot":
     # Create one combined figure with two side-by-side panels and a shared legend
-        fig = plots.dual_panel_gene_expression(data, st.session_state.expression_values)
+        fig = plots.dual_panel_gene_expression(data, st.session_state.expression_values, replicates=replicates)
         st.pyplot(fig)
 
     # Save the figure to a bytes buffer in PNG format.
@@ -111,7 +117,7 @@ def generate_plots(data):
     # plot on separate panels
     else:
         # Generate figures
-        figures = plots.multi_panel_gene_expression(data, st.session_state.expression_values)
+        figures = plots.multi_panel_gene_expression(data, st.session_state.expression_values, replicates=replicates)
         
         # Group the figures by gene_name
         grouped_figures = {}
@@ -202,16 +208,19 @@ def main():
             input_genes = parse_input(input_genes)
             rna_seq_data = []
 
-            gene_data, matched_input, missing_input = retreive_query_data(input_genes, selected_species, st.session_state.gene_input_type)
-            
-            xerophyta_genes = [gene.gene_name for gene in gene_data]           
+            # only the gene ids are needed, so the genes themselves (sequences, annotations) are never loaded
+            gene_ids, matched_input, missing_input = resolve_query_genes(input_genes, selected_species, st.session_state.gene_input_type)
 
             # Fetch RNA-seq data and apply DEG filtering
             selected_filter = DEG_FILTER_OPTIONS[st.session_state.filter_deg]
-            rna_seq_data = database.get_gene_expression_data(
-                xerophyta_genes, 
+            # for mean lines only, read the precomputed replicate summary instead of every replicate
+            get_expression_data = (database.get_expression_summary if st.session_state.replicates == "Mean only"
+                                   else database.get_gene_expression_data)
+            rna_seq_data = get_expression_data(
+                None, 
                 st.session_state.experiment, 
-                filter_deg=selected_filter
+                filter_deg=selected_filter,
+                gene_ids=gene_ids
             )
 
             show_missing_genes(missing_input)
@@ -292,6 +301,7 @@ def show_instructions():
         - **Expression value to plot:** Choose between log2 expression and normalised expression
         - **Filter genes based on differential expression:** Choose to show all genes, all differentially expressed genes, only up-regulated or down-regulated genes
         - **Plot display style:** Choose to show all genes on a single plot or on separate plots
+        - **Data points to show:** Choose to plot every replicate with the mean line, or only the mean line (the downloaded data then holds the mean, SD and SEM of each time point)
        #### **Step 4: Generate plots**
         - Click the "Generate" button to retrieve the gene expression information based on the input provided.
         - The plots will be displayed below the input fields.
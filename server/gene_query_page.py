@@ -4,6 +4,7 @@ from datetime import datetime
 import database.db as db  # Your custom db module
 from utils.constants import GENE_SELECTION_OPTIONS
 from utils.helper_functions import parse_input, retreive_query_data
+from utils.fasta import write_fasta
 
 st.title("Xerophyta Database Explorer")
 st.divider()
@@ -105,15 +106,16 @@ def main():
 
             annotation_data, matched_input, missing_input = retreive_query_data(input_genes, selected_species, st.session_state.gene_input_type)
 
-            results= database.flatten_gene_annotation_data(annotation_data)
-            df = pd.DataFrame(results)
+            # one row per gene, flattened in SQL rather than from the ORM objects
+            gene_names = [gene.gene_name for gene in annotation_data]
+            selected_columns = st.session_state.selected_columns
+            df = database.get_gene_annotation_report(gene_names, sequences="coding_sequence" in selected_columns)
 
 
             st.subheader("Search Results")
-            st.write(f"Found {len(results)} gene(s).")
+            st.write(f"Found {len(df)} gene(s).")
             if missing_input:
                 st.warning(f"Input genes not found: {', '.join([i for i in missing_input])}")
-            selected_columns = st.session_state.selected_columns
 
             if not df.empty:
                 st.dataframe(df[selected_columns],use_container_width=True)        
@@ -142,30 +144,31 @@ def main():
                 )
 
             # DOWNLOAD FASTA BUTTON
-            fasta_entries = []
-            for gene in results:
-                seq = gene["coding_sequence"] or ""
-                
-                # FASTA header: >GeneName description
-                header = f">{gene['gene_name']} {gene['description']}"
-
-                # Build the FASTA entry (header + sequence)
-                fasta_entries.append(header)
-                fasta_entries.append(seq)  # on the next line
+            # FASTA header: >GeneName description
+            headers = {gene.gene_name: f"{gene.gene_name} {gene.description}" for gene in df.itertuples()}
 
-            # Join everything with newlines
-            fasta_str = "\n".join(fasta_entries)
+            with col2:
+                compress_fasta = st.checkbox("Gzip FASTA file", value=False)
+
+            def build_fasta():
+                # only run when the button is clicked, streaming the sequences from the database a chunk at a time
+                # (this runs outside the script run, so it uses and releases its own session)
+                fasta_database = db.DB()
+                try:
+                    records = ((headers[gene_name], seq) for gene_name, seq in fasta_database.iter_coding_sequences(headers))
+                    return write_fasta(records, compress=compress_fasta)
+                finally:
+                    db.release_session()
 
-            
             timestamp_str = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            fasta_filename = f"Xerophyta_genes_{timestamp_str}.fasta"
+            fasta_filename = f"Xerophyta_genes_{timestamp_str}.fasta" + (".gz" if compress_fasta else "")
 
             with col2:
                 st.download_button(
                     label="Download FASTA with coding sequences",
-                    data=fasta_str,
+                    data=build_fasta,
                     file_name=fasta_filename,
-                    mime="text/plain",  # or "text/fasta"
+                    mime="application/gzip" if compress_fasta else "text/plain",  # or "text/fasta"
                 )
 
 
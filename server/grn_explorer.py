@@ -52,47 +52,43 @@ def get_clusters(tf, verbose=False):
             ).filter(RegulatoryInteraction.regulatory_cluster==tf)
             .distinct() 
         )
-    return query.all()
+    return database.read_frame(query)
 
 @st.cache_data
 def get_gene_groups(genes):
-    
+    """One row per gene with the TF groups it belongs to and the target clusters it is in, as comma separated lists."""
     if not genes:
-        return {}
+        return pd.DataFrame(columns=["Gene ID", "Regulatory Clusters", "Target Clusters"])
   
+    genes = list(dict.fromkeys(genes))
     RegulatorGene = aliased(Gene)
     TargetGene = aliased(Gene)
 
-    target_results =(
-            database.session.query(
-                TargetGene.gene_name,
-                RegulatoryInteraction.target_cluster
-                )
-                .join(TargetGene, RegulatoryInteraction.target_gene_id == TargetGene.id)
-                .filter(
-                    TargetGene.gene_name.in_(genes)
-                ).distinct()
-                ).all()
-
-    regulator_results =  ( 
-                database.session.query(
-                RegulatorGene.gene_name,
-                RegulatoryInteraction.regulatory_cluster,
-                )
-                .join(RegulatorGene, RegulatoryInteraction.regulator_gene_id == RegulatorGene.id)
-                .filter(
-                    RegulatorGene.gene_name.in_(genes) 
-                ).distinct()
-            ).all()
-
-    results = {gene: {'target_clusters':[],"regulatory_clusters":[]} for gene in genes}
-    for gene_name, target_cluster in target_results:
-        results[gene_name]["target_clusters"].append((target_cluster,))
-    
-    for gene_name, reg_cluster in regulator_results:
-        results[gene_name]["regulatory_clusters"].append((reg_cluster,))
-    
-    return results
+    def read_clusters(gene, cluster, gene_id_column):
+        # one query per DB.LOOKUP_CHUNK_SIZE genes, so long gene lists stay within SQLite's bound parameter limit
+        query = (
+            database.session.query(gene.gene_name, cluster.label("cluster"))
+            .join(gene, gene_id_column == gene.id)
+            .distinct()
+        )
+        return pd.concat([
+            database.read_frame(query.filter(gene.gene_name.in_(genes[start:start + database.LOOKUP_CHUNK_SIZE])))
+            for start in range(0, len(genes), database.LOOKUP_CHUNK_SIZE)
+        ], ignore_index=True)
+
+    target_results = read_clusters(TargetGene, RegulatoryInteraction.target_cluster, RegulatoryInteraction.target_gene_id)
+    regulator_results = read_clusters(RegulatorGene, RegulatoryInteraction.regulatory_cluster,
+                                      RegulatoryInteraction.regulator_gene_id)
+
+    def join_clusters(results):
+        clusters = results.dropna().groupby("gene_name")["cluster"].agg(", ".join)
+        return clusters.reindex(genes).fillna("None").to_numpy()
+
+    return pd.DataFrame({
+        "Gene ID": genes,
+        "Regulatory Clusters": join_clusters(regulator_results),
+        "Target Clusters": join_clusters(target_results),
+    })
 
 @st.cache_data
 def get_tf_groups():
@@ -149,17 +145,10 @@ if gene_info.open:
             submit_button = st.form_submit_button("Search Genes")
 
         if submit_button and selected_genes:
-            gene_groups = get_gene_groups(selected_genes)
-            
-            # Transform results into a single DataFrame
-            display_data = []
-            for gene in gene_groups:
-                display_data.append({
-                    "Gene ID": gene,
-                    "Regulatory Clusters": ", ".join([cluster[0] for cluster in gene_groups[gene]['regulatory_clusters']]) if gene_groups[gene]['regulatory_clusters'] else "None",
-                    "Target Clusters": ", ".join([cluster[0] for cluster in gene_groups[gene]['target_clusters']]) if gene_groups[gene]['target_clusters'] else "None"
-                })
-            
-            df = pd.DataFrame(display_data)
+            gene_ids = database.get_gene_ids_by_name(selected_genes)
+            missing_genes = [gene for gene, gene_id in gene_ids.items() if gene_id is None]
+            if missing_genes:
+                st.warning(f"The following gene(s) are not in the database: {', '.join(missing_genes)}")
+            df = get_gene_groups(selected_genes)
             st.dataframe(df, hide_index=True, use_container_width=True)
             st.caption("💡 Tip: Data can be downloaded as CSV using button in top-right corner of the table")
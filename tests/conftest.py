@@ -3,8 +3,8 @@ import tempfile
 import os
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from database.models import Base
-from database.db import DB
+from database.models import Base, Gene, Experiments, Gene_expressions, DifferentialExpression
+from database.db import DB, dispose_engines
 
 @pytest.fixture
 def temp_db():
@@ -23,7 +23,49 @@ def temp_db():
 def db_instance(temp_db, monkeypatch):
     """Create a DB instance with a temporary database."""
     monkeypatch.setattr(DB, 'DATABASE_NAME', temp_db)
-    return DB()
+    # tests write fixtures through DB, so use the ingestion profile rather than the read-only serving one
+    monkeypatch.setattr(DB, 'PROFILE', 'read_write')
+    yield DB()
+    dispose_engines()
+
+@pytest.fixture
+def seed_expression_db(db_instance):
+    """
+    Factory seeding db_instance with X. elegans genes and their expression values, returning db_instance.
+
+    seed_expression_db(n_genes, values=(), differential_expression=None)
+        n_genes: number of genes, named Xele.ptg000001l.1 to Xele.ptg000001l.<n_genes>
+        values: (gene number, treatment, time, replicate, normalised_expression, log2_expression) tuples of the
+            xe_seedlings_time_course experiment
+        differential_expression: {gene number: DifferentialExpression fields} of the same experiment
+    """
+    def seed(n_genes, values=(), differential_expression=None):
+        species = db_instance.add_species("X. elegans")
+        db_instance.bulk_upsert(Gene, [{"gene_name": f"Xele.ptg000001l.{i}", "species_id": species.id}
+                                       for i in range(1, n_genes + 1)], ["gene_name"])
+        values = list(values)
+        if not values and not differential_expression:
+            return db_instance
+
+        db_instance.bulk_upsert(Experiments, [{"experiment_name": "xe_seedlings_time_course", "species_id": species.id}],
+                                ["experiment_name"])
+        experiment = db_instance.get_experiment_by_name("xe_seedlings_time_course")
+        genes = db_instance.get_gene_index(species.id)["id"]
+        gene_ids = {i: int(genes[f"Xele.ptg000001l.{i}"]) for i in range(1, n_genes + 1)}
+        if values:
+            db_instance.bulk_upsert(Gene_expressions, [
+                {"gene_id": gene_ids[i], "experiment_id": experiment.id, "species_id": species.id, "treatment": treatment,
+                 "time": time, "replicate": replicate, "normalised_expression": normalised, "log2_expression": log2}
+                for i, treatment, time, replicate, normalised, log2 in values
+            ], ["experiment_id", "gene_id", "treatment", "time", "replicate"])
+        if differential_expression:
+            db_instance.bulk_upsert(DifferentialExpression, [
+                {"gene_id": gene_ids[i], "experiment_id": experiment.id, **fields}
+                for i, fields in differential_expression.items()
+            ], ["gene_id", "experiment_id"])
+        return db_instance
+
+    return seed
 
 @pytest.fixture
 def sample_gene_data():
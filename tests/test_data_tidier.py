@@ -0,0 +1,45 @@
+import pytest
+import pandas as pd
+from utils.data_tidier import transform_to_long, iter_long_chunks, calculate_experiment_time
+
+
+@pytest.fixture
+def expression_matrix():
+    return pd.DataFrame({
+        "Genes": ["Xele.ptg000001l.1", "Xele.ptg000001l.2"],
+        "Xe_De_R1_T00": [0.0, 1.0],
+        "Xe_De_R2_T03": [3.0, 7.0],
+        "Xe_Re_R1_T03": [15.0, 31.0],
+    })
+
+
+class TestTransformToLong:
+    """Test reshaping expression matrices to one row per (gene, sample)."""
+
+    def test_one_row_per_gene_and_sample(self, expression_matrix):
+        long_df = transform_to_long(expression_matrix)
+
+        assert list(long_df.columns) == ["gene_name", "species", "treatment", "replicate", "time", "expression"]
+        assert len(long_df) == 6
+        row = long_df[(long_df["gene_name"] == "Xele.ptg000001l.2") & (long_df["treatment"] == "Re")].iloc[0]
+        assert (row["species"], row["replicate"], row["time"], row["expression"]) == ("X. elegans", "R1", "T03", 31.0)
+        assert isinstance(long_df["treatment"].dtype, pd.CategoricalDtype)
+
+    def test_unknown_species(self, expression_matrix):
+        with pytest.raises(ValueError, match="Unknown species"):
+            transform_to_long(expression_matrix.rename(columns={"Xe_De_R1_T00": "Xx_De_R1_T00"}))
+
+    def test_log2_and_time_steps(self, expression_matrix):
+        long_df = transform_to_long(expression_matrix, log2=True, experiment_time=True)
+
+        expected_time = [calculate_experiment_time(row) for _, row in transform_to_long(expression_matrix, time_as_int=True).iterrows()]
+        assert long_df["time"].tolist() == expected_time
+        assert long_df["log2_expression"].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0]
+
+    def test_chunks_cover_all_rows(self, expression_matrix):
+        chunks = list(iter_long_chunks(expression_matrix, genes_per_chunk=1, time_as_int=True))
+
+        assert len(chunks) == 2
+        combined = pd.concat(chunks)
+        assert sorted(combined["time"].unique().tolist()) == [0, 3]
+        assert len(combined) == 6
@@ -1,8 +1,16 @@
 import pytest
+import sqlite3
+import threading
 from unittest.mock import patch, MagicMock
 import pandas as pd
-from database.db import DB
-from database.models import Species, Gene, Annotation, GO, ArabidopsisHomologue
+import pyarrow.parquet as pq
+from sqlalchemy import text
+from database.db import DB, release_session, CONNECTION_PROFILES
+from database.models import (
+    RegulatoryInteraction, Species, Gene, Annotation, GO, EnzymeCode, InterPro, ArabidopsisHomologue, Gene_expressions,
+    ExpressionSummary
+)
+from utils.constants import DEGFilter
 
 
 class TestDB:
@@ -112,4 +120,589 @@ class TestDB:
         """Test that database sessions can be properly closed."""
         db_instance.session.close()
         db_instance.conn.close()
-        # Should not raise an exception
\ No newline at end of file
+        # Should not raise an exception
+
+class TestEngineRegistry:
+    """Test the shared engine and thread-scoped session registry."""
+
+    def test_db_instances_share_engine(self, db_instance):
+        """Constructing another DB reuses the same engine and session registry."""
+        other = DB()
+        assert other.engine is db_instance.engine
+        assert other.session is db_instance.session
+
+    def test_sessions_are_thread_scoped(self, db_instance):
+        """Each thread gets its own session from the registry."""
+        main_session = db_instance.session()
+        other_sessions = []
+        thread = threading.Thread(target=lambda: other_sessions.append(DB().session()))
+        thread.start()
+        thread.join()
+
+        assert other_sessions[0] is not main_session
+
+    def test_release_session(self, db_instance):
+        """Releasing the session discards its state, the next access gets a fresh session."""
+        species = db_instance.add_species("X. elegans")
+        first_session = db_instance.session()
+        assert species in first_session
+
+        release_session(db_instance.DATABASE_NAME)
+
+        assert db_instance.session() is not first_session
+        assert db_instance.session.query(Species).filter_by(name="X. elegans").count() == 1
+
+
+class TestConnectionProfiles:
+    """Test the read-only serving and read-write ingestion connection profiles."""
+
+    def test_read_only_profile_rejects_writes(self, db_instance):
+        """The read-only profile can read data written by the ingestion profile but cannot write."""
+        db_instance.add_species("X. elegans")
+
+        reader = DB(profile="read_only")
+        assert reader.session.query(Species).count() == 1
+
+        reader.session.add(Species(name="X. humilis"))
+        with pytest.raises(Exception):
+            reader.session.commit()
+        reader.session.rollback()
+
+    def test_read_only_profile_pragmas(self, db_instance):
+        """Connect-time pragmas from the profile are applied to each connection."""
+        reader = DB(profile="read_only")
+        pragmas = CONNECTION_PROFILES["read_only"]["pragmas"]
+        assert reader.conn.execute(text("PRAGMA query_only")).scalar() == 1
+        assert reader.conn.execute(text("PRAGMA temp_store")).scalar() == 2  # MEMORY
+        assert reader.conn.execute(text("PRAGMA cache_size")).scalar() == pragmas["cache_size"]
+
+    def test_read_write_profile_uses_wal(self, db_instance):
+        """The ingestion profile switches the database file to WAL journaling."""
+        assert db_instance.conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+
+    def test_unknown_profile(self, db_instance):
+        """An unknown profile name raises a ValueError."""
+        with pytest.raises(ValueError):
+            DB(profile="not_a_profile")
+
+
+class TestCaseInsensitiveLookups:
+    """Test locus, GO id and enzyme code lookups that go through the lower(...) expression indexes."""
+
+    @pytest.fixture
+    def annotated_gene(self, db_instance):
+        species = db_instance.add_species("X. elegans")
+        gene = db_instance.add_genes_from_fasta(species.id, "Xele.ptg000001l.104", "ATG")
+        annotation = Annotation(gene_id=gene.id, description="test")
+        annotation.go_ids.append(GO(go_id="F:GO:0003677", go_branch="F", go_name="DNA binding"))
+        annotation.enzyme_codes.append(EnzymeCode(enzyme_code="EC:3.2.2.5", enzyme_name="NAD(+) glycohydrolase"))
+        db_instance.session.add(annotation)
+        gene.arabidopsis_homologues.append(ArabidopsisHomologue(a_thaliana_locus="AT1G01010"))
+        db_instance.session.commit()
+        return gene
+
+    def test_locus_lookup_ignores_case(self, db_instance, annotated_gene):
+        genes = db_instance.get_gene_annotation_data_from_a_thaliana_locus_homologue(["at1g01010"])
+        assert [g.gene_name for g in genes] == [annotated_gene.gene_name]
+
+    @pytest.mark.parametrize("term", ["GO:0003677", "go:0003677", "F:GO:0003677", "0003677"])
+    def test_go_id_lookup_matches_branch_prefixed_ids(self, db_instance, annotated_gene, term):
+        genes = db_instance.get_gene_annotation_data_from_go_ids([term])
+        assert [g.gene_name for g in genes] == [annotated_gene.gene_name]
+
+    def test_go_id_lookup_uses_every_term(self, db_instance, annotated_gene):
+        genes = db_instance.get_gene_annotation_data_from_go_ids(["GO:9999999", "GO:0003677"])
+        assert [g.gene_name for g in genes] == [annotated_gene.gene_name]
+
+    def test_enzyme_code_lookup_ignores_case(self, db_instance, annotated_gene):
+        genes = db_instance.get_gene_annotation_data_from_enzyme_codes(["ec:3.2.2.5"])
+        assert [g.gene_name for g in genes] == [annotated_gene.gene_name]
+
+
+class TestTextSearch:
+    """Test the FTS5 backed search of GO names, enzyme names and Arabidopsis common names."""
+
+    @pytest.fixture
+    def annotated_genes(self, db_instance):
+        species = db_instance.add_species("X. elegans")
+        other_species = db_instance.add_species("X. humilis")
+        first = db_instance.add_genes_from_fasta(species.id, "Xele.ptg000001l.104", "ATG")
+        second = db_instance.add_genes_from_fasta(other_species.id, "Xhu.ptg000002l.205", "ATG")
+
+        annotation = Annotation(gene_id=first.id, description="test")
+        annotation.go_ids.append(GO(go_id="F:GO:0003677", go_branch="F", go_name="DNA binding"))
+        annotation.enzyme_codes.append(EnzymeCode(enzyme_code="EC:3.2.2.5", enzyme_name="NAD(+) glycohydrolase"))
+        db_instance.session.add(annotation)
+        annotation = Annotation(gene_id=second.id, description="test")
+        annotation.go_ids.append(GO(go_id="P:GO:0010150", go_branch="P", go_name="leaf_senescence 100%"))
+        db_instance.session.add(annotation)
+        first.arabidopsis_homologues.append(
+            ArabidopsisHomologue(a_thaliana_locus="AT1G01010", a_thaliana_common_name="NAC domain protein")
+        )
+        db_instance.session.commit()
+        return first, second
+
+    def test_search_reports_matching_term(self, db_instance, annotated_genes):
+        first, second = annotated_genes
+        results = db_instance.search_text(["dna BIND", "senescence", "no match"], "go_name")
+
+        assert {(r.gene_name, r.term) for r in results} == {
+            (first.gene_name, "dna BIND"),
+            (second.gene_name, "senescence"),
+        }
+
+    def test_search_filters_by_species(self, db_instance, annotated_genes):
+        first, second = annotated_genes
+        results = db_instance.search_text(["binding", "senescence"], "go_name", species_id=first.species_id)
+        assert [r.gene_name for r in results] == [first.gene_name]
+
+    def test_search_treats_wildcards_literally(self, db_instance, annotated_genes):
+        _, second = annotated_genes
+        assert [r.gene_name for r in db_instance.search_text(["leaf_senescence"], "go_name")] == [second.gene_name]
+        assert [r.gene_name for r in db_instance.search_text(["100%"], "go_name")] == [second.gene_name]
+        assert db_instance.search_text(["leaf%senescence"], "go_name") == []
+
+    def test_search_enzyme_and_common_names(self, db_instance, annotated_genes):
+        first, _ = annotated_genes
+        assert [r.gene_name for r in db_instance.search_text(["glycohydrolase"], "enzyme_name")] == [first.gene_name]
+        assert [r.gene_name for r in db_instance.search_text(["nac dom"], "a_thaliana_common_name")] == [first.gene_name]
+
+    def test_search_index_follows_updates(self, db_instance, annotated_genes):
+        first, _ = annotated_genes
+        go_term = db_instance.session.query(GO).filter_by(go_id="F:GO:0003677").one()
+        go_term.go_name = "RNA binding"
+        db_instance.session.commit()
+
+        assert db_instance.search_text(["DNA binding"], "go_name") == []
+        assert [r.gene_name for r in db_instance.search_text(["RNA binding"], "go_name")] == [first.gene_name]
+
+    def test_search_unknown_field(self, db_instance):
+        with pytest.raises(ValueError):
+            db_instance.search_text(["binding"], "description")
+
+
+class TestMatchTermsToGenes:
+    """Test labelling the genes a search finds with the input terms that matched them."""
+
+    @pytest.fixture
+    def annotated_gene(self, db_instance):
+        species = db_instance.add_species("X. elegans")
+        gene = db_instance.add_genes_from_fasta(species.id, "Xele.ptg000001l.104", "ATG")
+        annotation = Annotation(gene_id=gene.id, description="test")
+        annotation.go_ids.append(GO(go_id="F:GO:0003677", go_branch="F", go_name="DNA binding"))
+        annotation.enzyme_codes.append(EnzymeCode(enzyme_code="EC:3.2.2.5", enzyme_name="NAD(+) glycohydrolase"))
+        db_instance.session.add(annotation)
+        gene.arabidopsis_homologues.append(ArabidopsisHomologue(a_thaliana_locus="AT1G01010", a_thaliana_common_name="NAC001"))
+        db_instance.session.commit()
+        return gene
+
+    @pytest.mark.parametrize("query_type, terms, matched", [
+        ("xerophyta_gene_name", ["Xele.ptg000001l.104", "Xele.ptg000001l.1"], {"Xele.ptg000001l.104"}),
+        ("a_thaliana_locus", ["at1g01010", "AT1G01020"], {"at1g01010"}),
+        ("a_thaliana_common_name", ["nac", "expansin"], {"nac"}),
+        ("go_id", ["GO:0003677", "0003677", "f:go:0003677", "GO:0006355"], {"GO:0003677", "0003677", "f:go:0003677"}),
+        ("go_name", ["dna", "binding", "rna"], {"dna", "binding"}),
+        ("enzyme_code", ["ec:3.2.2.5", "EC:2.7.1.94"], {"ec:3.2.2.5"}),
+        ("enzyme_name", ["glycohydrolase", "oxidase"], {"glycohydrolase"}),
+    ])
+    def test_labels_genes_with_matching_terms(self, db_instance, annotated_gene, query_type, terms, matched):
+        matches = db_instance.match_terms_to_genes(terms, query_type, "X. elegans")
+
+        assert matches.columns.tolist() == ["gene_id", "gene_name", "term"]
+        assert set(matches["term"]) == matched
+        assert set(matches["gene_name"]) == {annotated_gene.gene_name}
+        # the same genes as get_gene_annotation_data
+        assert {gene.gene_name for gene in db_instance.get_gene_annotation_data(terms, query_type)} == {annotated_gene.gene_name}
+
+    def test_no_terms_and_unknown_query_type(self, db_instance, annotated_gene):
+        assert db_instance.match_terms_to_genes([], "go_id").empty
+        with pytest.raises(ValueError):
+            db_instance.match_terms_to_genes(["binding"], "description")
+
+
+class TestBulkUpsert:
+    """Test the set-based INSERT ... ON CONFLICT loader."""
+
+    def test_insert_then_update(self, db_instance):
+        species = db_instance.add_species("X. elegans")
+        records = [
+            {"gene_name": f"Xele.ptg000001l.{i}", "species_id": species.id, "coding_sequence": "ATG"}
+            for i in range(5)
+        ]
+        assert db_instance.bulk_upsert(Gene, records, ["gene_name"], chunk_size=2) == {"inserted": 5, "updated": 0, "skipped": 0}
+
+        records[0]["coding_sequence"] = "ATGC"
+        records.append({"gene_name": "Xele.ptg000001l.5", "species_id": species.id, "coding_sequence": "ATG"})
+        assert db_instance.bulk_upsert(Gene, records, ["gene_name"], chunk_size=2) == {"inserted": 1, "updated": 5, "skipped": 0}
+
+        gene = db_instance.get_gene_by_name("Xele.ptg000001l.0")
+        db_instance.session.refresh(gene)
+        assert gene.coding_sequence == "ATGC"
+        assert db_instance.session.query(Gene).count() == 6
+
+    def test_existing_rows_left_unchanged_without_update_fields(self, db_instance):
+        species = db_instance.add_species("X. elegans")
+        record = {"gene_name": "Xele.ptg000001l.1", "species_id": species.id, "coding_sequence": "ATG"}
+        db_instance.bulk_upsert(Gene, [record], ["gene_name"])
+
+        record["coding_sequence"] = "ATGC"
+        new_record = {"gene_name": "Xele.ptg000001l.2", "species_id": species.id, "coding_sequence": "ATG"}
+        summary = db_instance.bulk_upsert(Gene, [record, new_record], ["gene_name"], update_fields=[])
+
+        assert summary == {"inserted": 1, "updated": 0, "skipped": 1}
+
+        assert db_instance.get_coding_sequences(["Xele.ptg000001l.1"]) == {"Xele.ptg000001l.1": "ATG"}
+
+    def test_accepts_generators(self, db_instance):
+        species = db_instance.add_species("X. elegans")
+        records = ({"gene_name": f"gene{i}", "species_id": species.id} for i in range(3))
+        assert db_instance.bulk_upsert(Gene, records, ["gene_name"]) == {"inserted": 3, "updated": 0, "skipped": 0}
+
+
+class TestAThalianaGeneMappings:
+    """Test the set-based Arabidopsis homologue loader."""
+
+    def test_adds_homologues_and_links_once(self, db_instance):
+        species = db_instance.add_species("X. elegans")
+        db_instance.bulk_upsert(Gene, [{"gene_name": f"Xele.ptg000001l.{i}", "species_id": species.id} for i in (1, 2)],
+                                ["gene_name"])
+        mapping = pd.DataFrame({
+            "Gene name": ["Xele.ptg000001l.1", "Xele.ptg000001l.2", "Xele.ptg000001l.2", "missing_gene"],
+            "At Locus ID": ["AT5G47390", "AT5G47390", "AT1G01010", "AT1G01020"],
+            "Wiki gene description": ["myb-like protein", "MYB", "NAC domain protein", "ARV1"],
+        })
+
+        assert db_instance.add_a_thaliana_gene_mappings(mapping) == {"homologues": 2, "links": 3}
+        assert db_instance.add_a_thaliana_gene_mappings(mapping) == {"homologues": 0, "links": 0}
+
+        gene = db_instance.get_gene_by_name("Xele.ptg000001l.2")
+        assert sorted(h.a_thaliana_locus for h in gene.arabidopsis_homologues) == ["AT1G01010", "AT5G47390"]
+        homologue = db_instance.session.query(ArabidopsisHomologue).filter_by(a_thaliana_locus="AT5G47390").one()
+        assert homologue.a_thaliana_common_name == "myb-like protein"
+
+
+class TestExpressionStore:
+    """Test reading expression values from the Parquet expression store."""
+
+    @pytest.fixture
+    def expression_db(self, seed_expression_db):
+        return seed_expression_db(3, [
+            (i, treatment, time, "R1", float(i * time), 1.0) for i in range(1, 4) for treatment in ("De", "Re") for time in (0, 3)
+        ], differential_expression={2: {"re_direction": "Up-regulated"}})
+
+    @pytest.mark.parametrize("filter_deg, treatments", [
+        (DEGFilter.SHOW_ALL, None),
+        (DEGFilter.SHOW_UP, None),
+        (DEGFilter.SHOW_DOWN, None),
+        (DEGFilter.SHOW_ALL, ["Re"]),
+    ])
+    def test_store_matches_sqlite(self, expression_db, tmp_path, monkeypatch, filter_deg, treatments):
+        gene_names = ["Xele.ptg000001l.2", "Xele.ptg000001l.3", "missing_gene"]
+        from_sqlite = expression_db.get_gene_expression_data(gene_names, "xe_seedlings_time_course", filter_deg, treatments)
+
+        path = expression_db.export_expression_store("xe_seedlings_time_course", str(tmp_path))
+        monkeypatch.setattr(DB, "EXPRESSION_STORE", str(tmp_path))
+        from_store = expression_db.get_gene_expression_data(gene_names, "xe_seedlings_time_course", filter_deg, treatments)
+
+        assert path == str(tmp_path / "xe_seedlings_time_course.parquet")
+        sort_by = ["gene_name", "treatment", "time"]
+        pd.testing.assert_frame_equal(
+            from_store.sort_values(sort_by).reset_index(drop=True),
+            from_sqlite.sort_values(sort_by).reset_index(drop=True),
+            check_dtype=not from_sqlite.empty,  # an empty result from SQLite has object columns
+        )
+
+    @pytest.mark.parametrize("filter_deg", [DEGFilter.SHOW_ALL, DEGFilter.SHOW_UP])
+    def test_gene_ids_select_the_same_rows_as_gene_names(self, expression_db, tmp_path, monkeypatch, filter_deg):
+        gene_names = ["Xele.ptg000001l.2", "Xele.ptg000001l.3"]
+        gene_ids = expression_db.get_gene_index().loc[gene_names, "id"].tolist()
+        sort_by = ["gene_name", "treatment", "time"]
+        by_name = expression_db.get_gene_expression_data(gene_names, "xe_seedlings_time_course", filter_deg)
+
+        by_id = expression_db.get_gene_expression_data(None, "xe_seedlings_time_course", filter_deg, gene_ids=gene_ids)
+        expression_db.export_expression_store("xe_seedlings_time_course", str(tmp_path))
+        monkeypatch.setattr(DB, "EXPRESSION_STORE", str(tmp_path))
+        by_id_from_store = expression_db.get_gene_expression_data(None, "xe_seedlings_time_course", filter_deg, gene_ids=gene_ids)
+
+        expected = by_name.sort_values(sort_by).reset_index(drop=True)
+        pd.testing.assert_frame_equal(by_id.sort_values(sort_by).reset_index(drop=True), expected)
+        pd.testing.assert_frame_equal(by_id_from_store.sort_values(sort_by).reset_index(drop=True), expected)
+
+    def test_stale_store_files_are_not_used(self, expression_db, tmp_path, capsys):
+        path = expression_db.export_expression_store("xe_seedlings_time_course", str(tmp_path))
+        assert expression_db._expression_store_is_current(path, "xe_seedlings_time_course")
+
+        # e.g. the expression values were reloaded without exporting the store again
+        expression_db.touch_expression_data()
+
+        assert not expression_db._expression_store_is_current(path, "xe_seedlings_time_course")
+        assert "Re-export the expression store" in capsys.readouterr().out
+
+    def test_store_files_without_a_data_version_are_not_used(self, expression_db, tmp_path):
+        path = expression_db.export_expression_store("xe_seedlings_time_course", str(tmp_path))
+        pq.write_table(pq.read_table(path).replace_schema_metadata(None), path)
+
+        assert not expression_db._expression_store_is_current(path, "xe_seedlings_time_course")
+
+    def test_experiments_missing_from_the_store_use_sqlite(self, expression_db, tmp_path, monkeypatch):
+        monkeypatch.setattr(DB, "EXPRESSION_STORE", str(tmp_path))
+        df = expression_db.get_gene_expression_data(["Xele.ptg000001l.1"], "xe_seedlings_time_course")
+        assert len(df) == 4
+
+
+class TestExpressionSummary:
+    """Test the precomputed replicate summary."""
+
+    @pytest.fixture
+    def expression_db(self, seed_expression_db):
+        return seed_expression_db(2, [
+            (1, "De", 3, replicate, value, value / 2) for replicate, value in [("R1", 2.0), ("R2", 4.0), ("R3", 6.0)]
+        ] + [(2, "Re", 0, "R1", 5.0, 1.0)], differential_expression={2: {"re_direction": "Up-regulated"}})
+
+    def test_summarises_each_time_point(self, expression_db):
+        assert expression_db.refresh_expression_summary("xe_seedlings_time_course") == 2
+
+        summary = expression_db.get_expression_summary(["Xele.ptg000001l.1", "Xele.ptg000001l.2"], "xe_seedlings_time_course")
+
+        assert summary.columns.tolist() == DB.SUMMARY_COLUMNS
+        gene_1 = summary.iloc[0]
+        assert (gene_1["gene_name"], gene_1["treatment"], gene_1["time"], gene_1["n"]) == ("Xele.ptg000001l.1", "De", 3, 3)
+        assert gene_1["normalised_expression"] == pytest.approx(4.0)
+        assert gene_1["normalised_expression_sd"] == pytest.approx(2.0)
+        assert gene_1["normalised_expression_sem"] == pytest.approx(2.0 / 3 ** 0.5)
+        assert gene_1["log2_expression"] == pytest.approx(2.0)
+        # a single replicate has no spread
+        assert pd.isna(summary.iloc[1]["normalised_expression_sd"])
+
+    def test_filters_like_the_expression_data(self, expression_db):
+        expression_db.refresh_expression_summary("xe_seedlings_time_course")
+        gene_names = ["Xele.ptg000001l.1", "Xele.ptg000001l.2"]
+
+        up = expression_db.get_expression_summary(gene_names, "xe_seedlings_time_course", filter_deg=DEGFilter.SHOW_UP)
+        dehydration = expression_db.get_expression_summary(gene_names, "xe_seedlings_time_course", treatments=["De"])
+
+        assert up["gene_name"].tolist() == ["Xele.ptg000001l.2"]
+        assert dehydration["gene_name"].tolist() == ["Xele.ptg000001l.1"]
+
+    def test_long_gene_lists_are_read_in_chunks(self, expression_db):
+        expression_db.refresh_expression_summary("xe_seedlings_time_course")
+        gene_names = ["Xele.ptg000001l.2", "Xele.ptg000001l.1"]
+        expected = expression_db.get_expression_summary(gene_names, "xe_seedlings_time_course")
+
+        expression_db.LOOKUP_CHUNK_SIZE = 1
+        summary = expression_db.get_expression_summary(gene_names, "xe_seedlings_time_course")
+        expression = expression_db.get_gene_expression_data(gene_names, "xe_seedlings_time_course")
+
+        pd.testing.assert_frame_equal(summary, expected)
+        assert len(expression) == 4 and expression["gene_name"].dtype == "category"
+
+    def test_refresh_of_some_genes_keeps_the_others(self, expression_db):
+        expression_db.refresh_expression_summary("xe_seedlings_time_course")
+        gene_1 = int(expression_db.get_gene_by_name("Xele.ptg000001l.1").id)
+        expression_db.session.query(Gene_expressions).filter_by(gene_id=gene_1, replicate="R3").delete()
+        expression_db.session.commit()
+
+        expression_db.refresh_expression_summary("xe_seedlings_time_course", [gene_1])
+
+        assert expression_db.session.query(ExpressionSummary).count() == 2
+        assert expression_db.session.query(ExpressionSummary).filter_by(gene_id=gene_1).one().normalised_expression == 3.0
+
+
+class TestReadFrame:
+    """Test loading query results straight into DataFrames."""
+
+    @pytest.fixture
+    def grn_db(self, seed_expression_db):
+        db_instance = seed_expression_db(3)
+        genes = db_instance.get_gene_index()["id"]
+        db_instance.session.add_all([
+            RegulatoryInteraction(regulator_gene_id=int(genes["Xele.ptg000001l.1"]), target_gene_id=int(genes[target]),
+                                  regulatory_cluster="HSF:1", target_cluster=None, direction="Activation")
+            for target in ("Xele.ptg000001l.2", "Xele.ptg000001l.3")
+        ])
+        db_instance.session.commit()
+        return db_instance
+
+    def test_columns_are_named_after_the_query_labels(self, grn_db):
+        df = grn_db.read_frame(grn_db.session.query(Gene.gene_name, Gene.id.label("gene_id")), {"gene_name": "category", "other": "category"})
+
+        assert df.columns.tolist() == ["gene_name", "gene_id"]
+        assert isinstance(df["gene_name"].dtype, pd.CategoricalDtype)
+        assert len(df) == 3
+
+    def test_expression_data_has_categorical_sample_columns(self, db_instance):
+        db_instance.add_species("X. elegans")
+        df = db_instance.get_gene_expression_data(["Xele.ptg000001l.1"], "xe_seedlings_time_course")
+
+        assert df.empty
+        assert df.columns.tolist() == DB.EXPRESSION_COLUMNS
+        assert all(isinstance(df[column].dtype, pd.CategoricalDtype) for column in ["treatment", "replicate", "gene_name"])
+
+    def test_regulatory_interactions(self, grn_db):
+        records = grn_db.get_regulatory_interactions(regulatory_cluster="HSF", species_name="X. elegans")
+        frame = grn_db.get_regulatory_interactions(regulatory_cluster="HSF", as_frame=True)
+
+        assert records[0] == {"Regulator Gene": "Xele.ptg000001l.1", "Target Gene": "Xele.ptg000001l.2",
+                              "Regulatory Cluster": "HSF:1", "Target Cluster": None, "Direction": "Activation"}
+        assert frame["Target Gene"].tolist() == ["Xele.ptg000001l.2", "Xele.ptg000001l.3"]
+        assert grn_db.get_regulatory_interactions(species_name="X. humilis") == []
+
+
+class TestGeneAnnotationReport:
+    """Test the flattened annotation table built in SQL."""
+
+    @pytest.fixture
+    def annotated_db(self, db_instance):
+        session = db_instance.session
+        species = Species(name="X. elegans")
+        session.add(species)
+        session.flush()
+        genes = [Gene(gene_name=f"Xele.ptg000001l.{i}", species_id=species.id, coding_sequence="ATG") for i in range(1, 4)]
+        session.add_all(genes)
+        session.flush()
+
+        annotation = Annotation(gene_id=genes[0].id, description="NAC domain", e_value=1e-10, bit_score=50.0)
+        annotation.go_ids.extend([GO(go_id="F:GO:0003677", go_name="DNA binding"),
+                                  GO(go_id="P:GO:0006355", go_name="regulation of transcription")])
+        annotation.enzyme_codes.append(EnzymeCode(enzyme_code="EC:3.2.2.5", enzyme_name="NAD(+) glycohydrolase"))
+        annotation.interpro_ids.append(InterPro(interpro_id="IPR003441"))
+        session.add(annotation)
+        # annotated, but without any terms
+        session.add(Annotation(gene_id=genes[1].id, description="unknown protein"))
+        genes[0].arabidopsis_homologues.append(ArabidopsisHomologue(a_thaliana_locus="AT1G01010", a_thaliana_common_name="NAC001"))
+        session.commit()
+        return db_instance
+
+    def test_matches_flatten_gene_annotation_data(self, annotated_db):
+        gene_names = ["Xele.ptg000001l.1", "Xele.ptg000001l.2", "Xele.ptg000001l.3"]
+        flattened = pd.DataFrame(annotated_db.flatten_gene_annotation_data(
+            annotated_db.get_gene_annotation_data(gene_names, "xerophyta_gene_name")))
+
+        report = annotated_db.get_gene_annotation_report(gene_names + ["missing_gene"])
+
+        assert report.columns.tolist() == DB.ANNOTATION_REPORT_COLUMNS
+        assert report.iloc[0]["go_ids"] == "F:GO:0003677, P:GO:0006355"
+        assert report.iloc[1]["go_ids"] == ""
+        assert report.iloc[2]["go_ids"] is None
+        pd.testing.assert_frame_equal(
+            report.sort_values("gene_name").reset_index(drop=True),
+            flattened.sort_values("gene_name").reset_index(drop=True),
+            check_dtype=False,
+        )
+
+    def test_species_filter_and_empty_input(self, annotated_db):
+        assert annotated_db.get_gene_annotation_report(["Xele.ptg000001l.1"], species_id=-1).empty
+        assert annotated_db.get_gene_annotation_report([]).columns.tolist() == DB.ANNOTATION_REPORT_COLUMNS
+
+
+    def test_picks_the_last_annotation_and_orders_terms_by_id(self, db_instance):
+        session = db_instance.session
+        species = Species(name="X. elegans")
+        session.add(species)
+        session.flush()
+        gene = Gene(gene_name="Xele.ptg000001l.1", species_id=species.id)
+        session.add(gene)
+        first_go, second_go = GO(go_id="P:GO:0006355", go_name="regulation of transcription"), GO(go_id="F:GO:0003677", go_name="DNA binding")
+        session.add_all([first_go, second_go])
+        session.flush()
+        session.add(Annotation(gene_id=gene.id, description="older annotation"))
+        latest = Annotation(gene_id=gene.id, description="NAC domain")
+        # linked in the opposite order of their ids
+        latest.go_ids.extend([second_go, first_go])
+        session.add(latest)
+        session.commit()
+        session.expire_all()
+
+        report = db_instance.get_gene_annotation_report(["Xele.ptg000001l.1"])
+        flattened = db_instance.flatten_gene_annotation_data(
+            db_instance.get_gene_annotation_data(["Xele.ptg000001l.1"], "xerophyta_gene_name"))
+
+        assert report.iloc[0]["description"] == flattened[0]["description"] == "NAC domain"
+        assert report.iloc[0]["go_ids"] == flattened[0]["go_ids"] == "P:GO:0006355, F:GO:0003677"
+        assert report.iloc[0]["go_names"] == flattened[0]["go_names"] == "regulation of transcription, DNA binding"
+
+    def test_without_sequences(self, annotated_db):
+        report = annotated_db.get_gene_annotation_report(["Xele.ptg000001l.1"], sequences=False)
+        assert report.iloc[0]["coding_sequence"] is None
+
+
+class TestCodingSequences:
+    """Test that coding sequences are only loaded on request."""
+
+    @pytest.fixture
+    def sequence_db(self, db_instance):
+        session = db_instance.session
+        species = Species(name="X. elegans")
+        session.add(species)
+        session.flush()
+        session.add_all([Gene(gene_name="Xele.ptg000001l.1", species_id=species.id, coding_sequence="ATGAAA"),
+                         Gene(gene_name="Xele.ptg000001l.2", species_id=species.id)])
+        session.commit()
+        session.expunge_all()
+        return db_instance
+
+    def test_sequence_is_deferred(self, sequence_db):
+        gene = sequence_db.session.query(Gene).filter_by(gene_name="Xele.ptg000001l.1").one()
+        assert "coding_sequence" not in gene.__dict__
+        # still loaded on access
+        assert gene.coding_sequence == "ATGAAA"
+
+    def test_get_coding_sequences(self, sequence_db):
+        sequences = sequence_db.get_coding_sequences(["Xele.ptg000001l.1", "Xele.ptg000001l.2", "missing_gene"])
+        assert sequences == {"Xele.ptg000001l.1": "ATGAAA", "Xele.ptg000001l.2": None}
+        assert sequence_db.get_coding_sequences(["Xele.ptg000001l.1"], species_id=-1) == {}
+
+
+class TestExistenceChecks:
+    """Test the batched gene and GO term existence checks."""
+
+    @pytest.fixture
+    def go_db(self, db_instance):
+        session = db_instance.session
+        species = Species(name="X. elegans")
+        session.add(species)
+        session.flush()
+        session.add_all([Gene(gene_name=f"Xele.ptg000001l.{i}", species_id=species.id) for i in range(1, 4)])
+        session.add_all([GO(go_id="F:GO:0003677", go_name="DNA binding"), GO(go_id="GO:0006355", go_name="regulation of transcription")])
+        session.commit()
+        return db_instance
+
+    def test_get_gene_ids_by_name(self, go_db):
+        db_instance = go_db
+        db_instance.LOOKUP_CHUNK_SIZE = 2
+        gene_ids = db_instance.get_gene_ids_by_name(["Xele.ptg000001l.3", "missing_gene", "Xele.ptg000001l.1", "Xele.ptg000001l.2"])
+
+        assert list(gene_ids) == ["Xele.ptg000001l.3", "missing_gene", "Xele.ptg000001l.1", "Xele.ptg000001l.2"]
+        assert gene_ids["missing_gene"] is None
+        assert gene_ids["Xele.ptg000001l.1"] == db_instance.get_gene_by_name("Xele.ptg000001l.1").id
+        assert set(db_instance.get_gene_ids_by_name(["Xele.ptg000001l.1"], species_id=-1).values()) == {None}
+        assert db_instance.check_if_gene_in_database(["Xele.ptg000001l.2", "missing_gene", "Xele.ptg000001l.2"]) == [True, False, True]
+
+    def test_get_go_term_ids(self, go_db):
+        go_ids = go_db.get_go_term_ids(["GO:0003677", "c:go:0006355", "DNA binding", "dna binding", "GO:9999999"])
+
+        assert go_ids["GO:0003677"] == go_ids["DNA binding"] is not None
+        assert go_ids["c:go:0006355"] is not None
+        assert go_ids["dna binding"] is None and go_ids["GO:9999999"] is None
+        assert go_db.check_if_go_term_in_database(["DNA binding", "unknown term"]) == [True, False]
+
+    def test_long_lists_stay_within_old_sqlite_parameter_limits(self, go_db):
+        # SQLite builds before 3.32 allow at most 999 bound parameters per statement
+        go_db.session.connection().connection.dbapi_connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        gene_names = [f"Xele.ptg000001l.{i}" for i in range(1, 2001)]
+
+        gene_ids = go_db.get_gene_ids_by_name(gene_names, species_id=1)
+        go_ids = go_db.get_go_term_ids([f"GO:{i:07d}" for i in range(7000)] + ["DNA binding"])
+
+        assert sum(gene_id is not None for gene_id in gene_ids.values()) == 3
+        assert sum(go_id is not None for go_id in go_ids.values()) == 3
+
+        # the read side of a long gene list: annotation lookups, the report and the expression readers
+        assert len(go_db.get_genes_by_ids(range(1, 2001))) == 3
+        assert len(go_db.get_gene_annotation_report(gene_names, sequences=False)) == 3
+        assert len(go_db.get_gene_annotation_data_from_xerophyta_gene_names(gene_names)) == 3
+        assert go_db.get_gene_annotation_data_from_go_ids([f"GO:{i:07d}" for i in range(2000)]) == []
+        assert go_db.get_genes_by_go_term_or_description([f"GO:{i:07d}" for i in range(2000)]) == []
+        assert go_db.get_gene_expression_data(gene_names, "xe_seedlings_time_course").empty
+        assert go_db.get_gene_expression_data(None, "xe_seedlings_time_course", gene_ids=range(1, 2001)).empty
+        assert go_db.get_expression_summary(gene_names, "xe_seedlings_time_course").empty
@@ -0,0 +1,369 @@
+import gzip
+import json
+import os
+import pytest
+import pandas as pd
+import database.db_manager as db_manager
+import database.models as models
+from database.db import DB, dispose_engines
+from database.models import (
+    Gene, Gene_expressions, DifferentialExpression, RegulatoryInteraction, Annotation, GO, EnzymeCode, InterPro,
+    DatabaseBuild, ExpressionSummary
+)
+
+
+@pytest.fixture
+def species_with_genes(db_instance):
+    """X. elegans with three genes, and an experiment to load data into."""
+    species = db_instance.add_species("X. elegans")
+    db_instance.bulk_upsert(
+        Gene,
+        [{"gene_name": f"Xele.ptg000001l.{i}", "species_id": species.id} for i in range(1, 4)],
+        ["gene_name"]
+    )
+    db_manager.add_experiment("xe_seedlings_time_course")
+    return species
+
+
+class TestResolveGeneIds:
+    """Test resolving whole columns of gene names to ids."""
+
+    def test_resolves_names_and_reports_missing(self, db_instance, species_with_genes):
+        gene_index = db_instance.get_gene_index(species_with_genes.id)
+        names = pd.Series(["Xele.ptg000001l.2", "missing_gene", "Xele.ptg000001l.1", "missing_gene"])
+
+        gene_ids, unresolved = db_manager.resolve_gene_ids(names, gene_index)
+
+        expected = gene_index.loc[["Xele.ptg000001l.2", "Xele.ptg000001l.1"], "id"].tolist()
+        assert gene_ids.dropna().tolist() == expected
+        assert gene_ids.isna().tolist() == [False, True, False, True]
+        assert unresolved == ["missing_gene"]
+
+
+class TestIngestion:
+    """Test the loaders that resolve gene names in bulk."""
+
+    def test_add_rna_seq_data(self, db_instance, species_with_genes):
+        df = pd.DataFrame({
+            "gene_name": ["Xele.ptg000001l.1", "Xele.ptg000001l.2"],
+            "treatment": ["De", "De"],
+            "time": [0, 3],
+            "replicate": ["R1", "R1"],
+            "normalised_expression": [1.0, 3.0],
+            "log2_expression": [1.0, 2.0],
+        })
+
+        summary = db_manager.add_rna_seq_data(df, "X. elegans", "xe_seedlings_time_course")
+
+        assert summary == {"inserted": 2, "updated": 0, "skipped": 0}
+        assert db_instance.session.query(Gene_expressions).count() == 2
+        # the replicate summary is rebuilt for the loaded genes
+        assert db_instance.session.query(ExpressionSummary).count() == 2
+
+    def test_add_rna_seq_data_reports_all_missing_genes(self, db_instance, species_with_genes):
+        df = pd.DataFrame({
+            "gene_name": ["missing_1", "Xele.ptg000001l.1", "missing_2"],
+            "treatment": "De", "time": 0, "replicate": "R1",
+            "normalised_expression": 1.0, "log2_expression": 1.0,
+        })
+
+        with pytest.raises(ValueError, match="2 genes not found"):
+            db_manager.add_rna_seq_data(df, "X. elegans", "xe_seedlings_time_course")
+
+    def test_add_rna_seq_matrix_streams_gene_blocks(self, db_instance, species_with_genes):
+        matrix = pd.DataFrame({
+            "Genes": ["Xele.ptg000001l.1", "Xele.ptg000001l.2", "Xele.ptg000001l.3"],
+            "Xe_De_R1_T00": [0.0, 1.0, 3.0],
+            "Xe_Re_R1_T03": [7.0, 15.0, 31.0],
+        })
+
+        totals = db_manager.add_rna_seq_matrix(matrix, "X. elegans", "xe_seedlings_time_course", genes_per_chunk=2)
+
+        assert totals == {"inserted": 6, "updated": 0, "skipped": 0}
+        expression = db_instance.session.query(Gene_expressions).filter_by(treatment="Re").join(Gene).filter(
+            Gene.gene_name == "Xele.ptg000001l.3").one()
+        assert (expression.time, expression.normalised_expression, expression.log2_expression) == (3, 31.0, 5.0)
+
+    def test_add_DEG_data(self, db_instance, species_with_genes, tmp_path):
+        deg_file = tmp_path / "deg.csv"
+        pd.DataFrame({
+            "Genes": ["Xele.ptg000001l.1", "missing_gene"],
+            "Re_Set": ["ReT04", "None"],
+            "Re_direction": ["Up-regulated", "None"],
+            "De_Set": ["None", "None"],
+            "De_direction": ["None", "None"],
+        }).to_csv(deg_file, index=False)
+
+        db_manager.add_DEG_data(deg_file, "xe_seedlings_time_course")
+
+        deg = db_instance.session.query(DifferentialExpression).one()
+        assert deg.gene.gene_name == "Xele.ptg000001l.1"
+        assert deg.re_set == "ReT04"
+        assert deg.de_set is None
+
+    def test_add_regulatory_interactions(self, db_instance, species_with_genes, capsys):
+        grn = pd.DataFrame({
+            "Regulatory cluster": ["HSF:1", "HSF:1", "HSF:2"],
+            "Predicted regulators": ["Xele.ptg000001l.1", "Xele.ptg000001l.1", "missing_regulator"],
+            "Target cluster": ["HD-ZIP:1", "HD-ZIP:1", "HD-ZIP:2"],
+            "Predicted targets": ["Xele.ptg000001l.2", "Xele.ptg000001l.3", "Xele.ptg000001l.3"],
+            "Direction of regulation": ["Activation", "Repression", "Activation"],
+        })
+
+        db_manager.add_regulatory_interactions(grn, species_name="X. elegans")
+
+        assert db_instance.session.query(RegulatoryInteraction).count() == 2
+        output = capsys.readouterr().out
+        assert "Skipped (gene not found): 1 interactions." in output
+        assert "Unique genes not found in DB: 1" in output
+
+    def test_add_regulatory_interactions_dedupes_and_updates(self, db_instance, species_with_genes):
+        grn = pd.DataFrame({
+            "Regulatory cluster": ["HSF:1", "HSF:1", "HSF:1"],
+            "Predicted regulators": ["Xele.ptg000001l.1", "Xele.ptg000001l.1", "Xele.ptg000001l.2"],
+            "Target cluster": ["HD-ZIP:1", "HD-ZIP:1", "HD-ZIP:1"],
+            "Predicted targets": ["Xele.ptg000001l.2", "Xele.ptg000001l.2", "Xele.ptg000001l.3"],
+            "Direction of regulation": ["Activation", "Repression", "Sideways"],
+        })
+
+        first = db_manager.add_regulatory_interactions(grn)
+        assert (first["added"], first["skipped_already_exists"], first["skipped_invalid_direction"]) == (1, 1, 1)
+
+        grn["Direction of regulation"] = "Repression"
+        second = db_manager.add_regulatory_interactions(grn, update_existing=True)
+        assert (second["added"], second["updated"], second["skipped_already_exists"]) == (1, 1, 1)
+
+        db_instance.session.expire_all()
+        directions = [interaction.direction for interaction in db_instance.session.query(RegulatoryInteraction)]
+        assert directions == ["Repression", "Repression"]
+
+
+class TestAddGeneAnnotations:
+    """Test the batched annotation loader."""
+
+    @pytest.fixture
+    def annotation_file(self, tmp_path):
+        path = tmp_path / "annotations.csv"
+        pd.DataFrame({
+            "SeqName": ["Xele.ptg000001l.1", "Xele.ptg000001l.2", "missing_gene"],
+            "Description": ["NAC domain protein", "expansin", "unknown"],
+            "e-Value": [1e-50, None, 1e-5],
+            "GO IDs": ["F:GO:0003677; P:GO:0006355", "F:GO:0003677", "C:GO:0005634"],
+            "GO Names": ["DNA binding; regulation of transcription", "DNA binding", "nucleus"],
+            "Enzyme Codes": ["EC:3.2.2.5", None, None],
+            "Enzyme Names": ["NAD(+) glycohydrolase", None, None],
+            "InterPro IDs": ["IPR003441; IPR036093", "IPR007112", None],
+        }).to_csv(path, index=False)
+        return path
+
+    def test_loads_annotations_and_terms(self, db_instance, species_with_genes, annotation_file):
+        db_manager.add_gene_annotations(annotation_file, species_with_genes.id)
+
+        session = db_instance.session
+        assert session.query(Annotation).count() == 2
+        assert session.query(GO).count() == 2
+        assert session.query(EnzymeCode).count() == 1
+        assert session.query(InterPro).count() == 3
+
+        gene = db_instance.get_gene_by_name("Xele.ptg000001l.1")
+        annotation = gene.annotations[0]
+        assert sorted(go.go_id for go in annotation.go_ids) == ["F:GO:0003677", "P:GO:0006355"]
+        assert annotation.go_ids[0].go_branch in ("F", "P")
+        assert [ec.enzyme_name for ec in annotation.enzyme_codes] == ["NAD(+) glycohydrolase"]
+        assert db_instance.get_gene_by_name("Xele.ptg000001l.2").annotations[0].e_value is None
+
+    def test_reloading_updates_instead_of_duplicating(self, db_instance, species_with_genes, annotation_file):
+        db_manager.add_gene_annotations(annotation_file, species_with_genes.id)
+        df = pd.read_csv(annotation_file)
+        df.loc[0, "Description"] = "NAC transcription factor"
+        df.to_csv(annotation_file, index=False)
+
+        db_manager.add_gene_annotations(annotation_file, species_with_genes.id)
+
+        session = db_instance.session
+        session.expire_all()
+        assert session.query(Annotation).count() == 2
+        assert session.query(GO).count() == 2
+        assert session.query(models.annotations_go).count() == 3
+        assert db_instance.get_gene_by_name("Xele.ptg000001l.1").annotations[0].description == "NAC transcription factor"
+
+
+class TestAddGeneSequenceFromFasta:
+    """Test streaming gene sequences from plain and gzipped FASTA files."""
+
+    FASTA = ">Xele.ptg000001l.1\nATGC\n>Xele.ptg000001l.2\nATGGCC\n>Xele.ptg000001l.3\nATG\n"
+
+    def test_loads_gzipped_fasta_in_chunks(self, db_instance, tmp_path):
+        species = db_instance.add_species("X. elegans")
+        path = tmp_path / "genes.fasta.gz"
+        with gzip.open(path, "wt") as f:
+            f.write(self.FASTA)
+
+        db_manager.add_gene_sequence_from_fasta(str(path), species.id, chunk_size=2)
+
+        assert db_instance.get_gene_by_name("Xele.ptg000001l.2").coding_sequence == "ATGGCC"
+        assert db_instance.session.query(Gene).count() == 3
+
+    def test_resume_skips_loaded_genes(self, db_instance, tmp_path, capsys):
+        species = db_instance.add_species("X. elegans")
+        path = tmp_path / "genes.fasta"
+        path.write_text(self.FASTA)
+        db_instance.bulk_upsert(Gene, [{"gene_name": "Xele.ptg000001l.1", "species_id": species.id,
+                                        "coding_sequence": "ATGC"}], ["gene_name"])
+
+        db_manager.add_gene_sequence_from_fasta(str(path), species.id, resume=True)
+
+        assert "Done: 2 sequences written" in capsys.readouterr().out
+        assert db_instance.session.query(Gene).count() == 3
+
+
+def write_manifest(tmp_path):
+    """Write the input files of one species and a manifest listing them, return the manifest path."""
+    (tmp_path / "genes.fasta").write_text(">Xele.ptg000001l.1\nATGC\n>Xele.ptg000001l.2\nATGGCC\n")
+    pd.DataFrame({
+        "SeqName": ["Xele.ptg000001l.1"], "Description": ["NAC domain protein"], "e-Value": [1e-50],
+        "GO IDs": ["F:GO:0003677"], "GO Names": ["DNA binding"],
+        "Enzyme Codes": ["EC:3.2.2.5"], "Enzyme Names": ["NAD(+) glycohydrolase"], "InterPro IDs": ["IPR003441"],
+    }).to_csv(tmp_path / "annotations.csv", index=False)
+    pd.DataFrame({
+        "Genes": ["Xele.ptg000001l.1", "Xele.ptg000001l.2"],
+        "Xe_De_R1_T00": [0.0, 1.0], "Xe_Re_R1_T03": [3.0, 7.0],
+    }).to_csv(tmp_path / "counts.csv", index=False)
+    pd.DataFrame({
+        "Regulatory cluster": ["HSF:1"], "Predicted regulators": ["Xele.ptg000001l.1"],
+        "Target cluster": ["HD-ZIP:1"], "Predicted targets": ["Xele.ptg000001l.2"],
+        "Direction of regulation": ["Activation"],
+    }).to_csv(tmp_path / "grn.csv", index=False)
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(json.dumps({"species": [{
+        "name": "X. elegans",
+        "fasta": "genes.fasta",
+        "annotations": "annotations.csv",
+        "experiments": [{"name": "xe_seedlings_time_course", "expression": "counts.csv"}],
+        "grn": "grn.csv",
+    }]}))
+    return manifest
+
+
+class TestRunManifest:
+    """Test the manifest-driven ingestion pipeline."""
+
+    def test_loads_all_inputs_of_a_species(self, db_instance, tmp_path):
+        manifest = write_manifest(tmp_path)
+
+        report = db_manager.run_manifest(str(manifest), workers=1)
+
+        session = db_instance.session
+        assert session.query(Gene).count() == 2
+        assert session.query(Annotation).count() == 1
+        assert session.query(Gene_expressions).count() == 4
+        assert session.query(RegulatoryInteraction).count() == 1
+        assert db_instance.get_experiment_by_name("xe_seedlings_time_course").species.name == "X. elegans"
+        assert set(report["step"]) == {"parse", "write"}
+        assert report.loc[(report["stage"] == "sequences") & (report["step"] == "write"), "rows"].item() == 2
+
+
+class TestIncrementalLoad:
+    """Test re-running loaders against the ingestion ledger."""
+
+    @pytest.fixture
+    def deg_file(self, tmp_path):
+        path = tmp_path / "deg.csv"
+        pd.DataFrame({
+            "Genes": ["Xele.ptg000001l.1", "Xele.ptg000001l.2"],
+            "Re_Set": ["ReT04", "ReT08"],
+            "Re_direction": ["Up-regulated", "Down-regulated"],
+            "De_Set": ["None", "None"],
+            "De_direction": ["None", "None"],
+        }).to_csv(path, index=False)
+        return path
+
+    def test_only_changed_rows_are_applied(self, db_instance, species_with_genes, deg_file):
+        first = db_manager.add_DEG_data(deg_file, "xe_seedlings_time_course", incremental=True)
+        assert first == {"inserted": 2, "updated": 0, "deleted": 0, "unchanged": 0}
+
+        unchanged = db_manager.add_DEG_data(deg_file, "xe_seedlings_time_course", incremental=True)
+        assert unchanged == {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 2}
+
+        revised = pd.read_csv(deg_file)
+        revised.loc[0, "Re_Set"] = "ReT12"
+        revised.loc[1, "Genes"] = "Xele.ptg000001l.3"
+        revised.to_csv(deg_file, index=False)
+
+        dry_run = db_manager.add_DEG_data(deg_file, "xe_seedlings_time_course", incremental=True, dry_run=True)
+        assert dry_run == {"inserted": 1, "updated": 1, "deleted": 1, "unchanged": 0}
+        assert db_instance.session.query(DifferentialExpression).filter_by(re_set="ReT12").count() == 0
+
+        db_manager.add_DEG_data(deg_file, "xe_seedlings_time_course", incremental=True)
+
+        db_instance.session.expire_all()
+        rows = {deg.gene.gene_name: deg.re_set for deg in db_instance.session.query(DifferentialExpression)}
+        assert rows == {"Xele.ptg000001l.1": "ReT12", "Xele.ptg000001l.3": "ReT08"}
+
+    def test_rows_skipped_by_the_loader_are_retried(self, db_instance, species_with_genes, deg_file):
+        revised = pd.read_csv(deg_file)
+        revised.loc[1, "Genes"] = "Xele.ptg000001l.4"
+        revised.to_csv(deg_file, index=False)
+        db_manager.add_DEG_data(deg_file, "xe_seedlings_time_course", incremental=True)
+        assert db_instance.session.query(DifferentialExpression).count() == 1
+
+        db_instance.bulk_upsert(Gene, [{"gene_name": "Xele.ptg000001l.4", "species_id": species_with_genes.id}], ["gene_name"])
+        delta = db_manager.add_DEG_data(deg_file, "xe_seedlings_time_course", incremental=True)
+
+        assert delta == {"inserted": 1, "updated": 0, "deleted": 0, "unchanged": 1}
+        assert db_instance.session.query(DifferentialExpression).count() == 2
+
+    def test_row_hashes_do_not_depend_on_inferred_dtypes(self):
+        as_read = pd.DataFrame({"Genes": ["Xele.ptg000001l.1", "Xele.ptg000001l.2"], "time": [3, 4], "Re_Set": ["ReT04", None]})
+        reread = pd.DataFrame({"Re_Set": ["ReT04", float("nan")], "time": ["3", "4.0"],
+                               "Genes": pd.Categorical(["Xele.ptg000001l.1", "Xele.ptg000001l.2"])})
+
+        assert db_manager.hash_rows(as_read, ["Genes"])[1].tolist() == db_manager.hash_rows(reread, ["Genes"])[1].tolist()
+
+    def test_incremental_expression_deletes_removed_samples(self, db_instance, species_with_genes):
+        df = pd.DataFrame({
+            "gene_name": ["Xele.ptg000001l.1", "Xele.ptg000001l.1"],
+            "treatment": ["De", "Re"], "time": [0, 3], "replicate": ["R1", "R1"],
+            "normalised_expression": [1.0, 3.0], "log2_expression": [1.0, 2.0],
+        })
+        db_manager.add_rna_seq_data(df, "X. elegans", "xe_seedlings_time_course", incremental=True)
+
+        delta = db_manager.add_rna_seq_data(df.iloc[:1], "X. elegans", "xe_seedlings_time_course", incremental=True)
+
+        assert delta == {"inserted": 0, "updated": 0, "deleted": 1, "unchanged": 1}
+        assert db_instance.session.query(Gene_expressions).one().treatment == "De"
+        assert db_instance.session.query(ExpressionSummary).one().treatment == "De"
+
+
+class TestBuildDatabase:
+    """Test the offline build of a read-only database artifact."""
+
+    def test_builds_and_publishes_an_immutable_artifact(self, tmp_path, monkeypatch):
+        manifest = write_manifest(tmp_path)
+        releases = tmp_path / "releases"
+        pointer = releases / "CURRENT"
+
+        artifact = db_manager.build_database(str(manifest), str(releases), version="2026.1", workers=1, publish=str(pointer))
+
+        assert os.path.basename(artifact) == "xerophyta_db_2026.1.sqlite"
+        assert sorted(os.listdir(releases)) == ["CURRENT", "xerophyta_db_2026.1.sqlite"]
+        assert db_manager.DB_PROFILE == "read_write"
+
+        monkeypatch.setattr(DB, "RELEASE_POINTER", str(pointer))
+        monkeypatch.setattr(DB, "PROFILE", "immutable")
+        try:
+            database = DB()
+            assert database.database_name == artifact
+            assert database.session.query(Gene).count() == 2
+            assert database.session.query(DatabaseBuild.version).scalar() == "2026.1"
+            assert [row.gene_name for row in database.search_text(["DNA bind"], "go_name")] == ["Xele.ptg000001l.1"]
+            index_names = {name for (name,) in database.conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index'")}
+            assert {"ix_genes_species_id", "ix_GO_lower_go_id", "uq_gene_expressions_sample"} <= index_names
+
+            # a new release is picked up by the next DB() without restarting
+            database.close()
+            rebuilt = db_manager.build_database(str(manifest), str(releases), version="2026.2", workers=1, publish=str(pointer))
+            assert DB().database_name == rebuilt
+        finally:
+            dispose_engines()
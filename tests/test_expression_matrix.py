@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+from database.expression_matrix import export_expression_matrix, open_expression_matrix
+
+
+@pytest.fixture
+def expression_db(seed_expression_db):
+    """Three genes with De/Re values at 0 and 3h; the third gene has no Re values."""
+    return seed_expression_db(3, [
+        (i, treatment, time, "R1", float(i * 10 + time), float(time))
+        for i in range(1, 4) for treatment in ("De", "Re") for time in (0, 3) if not (i == 3 and treatment == "Re")
+    ])
+
+
+class TestExpressionMatrix:
+    """Test exporting and slicing the memory-mapped expression matrices."""
+
+    def test_slice_returns_gene_by_sample_grid(self, expression_db, tmp_path):
+        export_expression_matrix(expression_db, "xe_seedlings_time_course", str(tmp_path))
+        matrix = open_expression_matrix(str(tmp_path), "xe_seedlings_time_course")
+
+        grid = matrix.slice(["Xele.ptg000001l.3", "missing_gene", "Xele.ptg000001l.1"])
+
+        assert grid.index.tolist() == ["Xele.ptg000001l.3", "Xele.ptg000001l.1"]
+        assert grid.columns.tolist() == [("De", 0, "R1"), ("De", 3, "R1"), ("Re", 0, "R1"), ("Re", 3, "R1")]
+        assert grid.dtypes.unique().tolist() == [np.float32]
+        gene_3 = grid.loc["Xele.ptg000001l.3"]
+        assert gene_3[("De", 3, "R1")] == 33.0
+        assert np.isnan(gene_3[("Re", 0, "R1")])
+
+    def test_long_format_matches_sqlite(self, expression_db, tmp_path):
+        export_expression_matrix(expression_db, "xe_seedlings_time_course", str(tmp_path))
+        matrix = open_expression_matrix(str(tmp_path), "xe_seedlings_time_course")
+        gene_names = ["Xele.ptg000001l.2", "Xele.ptg000001l.3"]
+
+        sort_by = ["gene_name", "treatment", "time"]
+        from_matrix = matrix.to_long(gene_names).sort_values(sort_by).reset_index(drop=True)
+        from_sqlite = expression_db.get_gene_expression_data(gene_names, "xe_seedlings_time_course")
+        pd.testing.assert_frame_equal(from_matrix, from_sqlite.sort_values(sort_by).reset_index(drop=True))
+
+        assert set(matrix.to_long(gene_names, treatments=["Re"])["treatment"]) == {"Re"}
+
+    def test_reopened_after_a_new_export(self, expression_db, tmp_path):
+        assert open_expression_matrix(str(tmp_path), "xe_seedlings_time_course") is None
+        export_expression_matrix(expression_db, "xe_seedlings_time_course", str(tmp_path))
+        first = open_expression_matrix(str(tmp_path), "xe_seedlings_time_course")
+        assert open_expression_matrix(str(tmp_path), "xe_seedlings_time_course") is first
+
+        export_expression_matrix(expression_db, "xe_seedlings_time_course", str(tmp_path))
+        assert open_expression_matrix(str(tmp_path), "xe_seedlings_time_course") is not first
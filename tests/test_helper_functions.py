@@ -1,6 +1,7 @@
 import pytest
+import pandas as pd
 from unittest.mock import Mock, patch
-from utils.helper_functions import parse_input, retreive_query_data
+from utils.helper_functions import parse_input, resolve_query_genes, retreive_query_data
 
 
 class TestHelperFunctions:
@@ -60,11 +61,14 @@ class TestHelperFunctions:
         
         # Mock gene objects
         mock_gene1 = Mock()
-        mock_gene1.gene_name = "Gene1"
+        mock_gene1.gene_name = "gene1"
         mock_gene2 = Mock()
-        mock_gene2.gene_name = "Gene2"
+        mock_gene2.gene_name = "gene2"
         
-        mock_db.get_gene_annotation_data.return_value = [mock_gene1, mock_gene2]
+        mock_db.match_terms_to_genes.return_value = pd.DataFrame({
+            "gene_id": [1, 2], "gene_name": ["gene1", "gene2"], "term": ["gene1", "gene2"]
+        })
+        mock_db.get_genes_by_ids.return_value = [mock_gene1, mock_gene2]
         
         # Test
         input_genes = ["gene1", "gene2", "gene3"]
@@ -74,8 +78,9 @@ class TestHelperFunctions:
         
         # Assertions
         assert len(annotation_data) == 2
-        assert "gene1" in matched_input or "gene2" in matched_input
-        mock_db.get_gene_annotation_data.assert_called_once_with(
+        assert matched_input == {"gene1", "gene2"}
+        assert missing_input == {"gene3"}
+        mock_db.match_terms_to_genes.assert_called_once_with(
             input_genes, "xerophyta_gene_name", "X. elegans"
         )
 
@@ -85,15 +90,10 @@ class TestHelperFunctions:
         # Setup mock
         mock_db = Mock()
         mock_db_class.return_value = mock_db
-        
-        # Mock gene with arabidopsis homologue
-        mock_homologue = Mock()
-        mock_homologue.a_thaliana_locus = "AT1G01010"
-        
-        mock_gene = Mock()
-        mock_gene.arabidopsis_homologues = [mock_homologue]
-        
-        mock_db.get_gene_annotation_data.return_value = [mock_gene]
+        mock_db.match_terms_to_genes.return_value = pd.DataFrame({
+            "gene_id": [1], "gene_name": ["Xele.ptg000001l.1"], "term": ["AT1G01010"]
+        })
+        mock_db.get_genes_by_ids.return_value = [Mock()]
         
         # Test
         input_genes = ["AT1G01010", "AT1G01020"]
@@ -104,113 +104,92 @@ class TestHelperFunctions:
         # Assertions
         assert len(annotation_data) == 1
         assert "at1g01010" in matched_input
-        assert "at1g01020" in missing_input
+        assert "AT1G01020" in missing_input
 
     @patch('utils.helper_functions.db.DB')
     def test_retreive_query_data_go_id(self, mock_db_class):
-        """Test query data retrieval by GO ID."""
+        """Test that GO ids are reported normalised."""
         # Setup mock
         mock_db = Mock()
         mock_db_class.return_value = mock_db
-        mock_db.normalize_go_term.side_effect = lambda x: x.replace("GO:", "")
-        
-        # Mock gene with GO annotation
-        mock_go = Mock()
-        mock_go.go_id = "GO:0003677"
-        
-        mock_annotation = Mock()
-        mock_annotation.go_ids = [mock_go]
-        
-        mock_gene = Mock()
-        mock_gene.annotations = [mock_annotation]
-        
-        mock_db.get_gene_annotation_data.return_value = [mock_gene]
+        mock_db.normalize_go_term.side_effect = lambda x: x.upper().replace("F:", "")
+        mock_db.match_terms_to_genes.return_value = pd.DataFrame({
+            "gene_id": [1], "gene_name": ["Xele.ptg000001l.1"], "term": ["f:go:0003677"]
+        })
+        mock_db.get_genes_by_ids.return_value = [Mock()]
         
         # Test
-        input_genes = ["GO:0003677", "GO:0006355"]
+        input_genes = ["f:go:0003677", "GO:0006355"]
         annotation_data, matched_input, missing_input = retreive_query_data(
             input_genes, "X. elegans", "GO_id"
         )
         
         # Assertions
-        assert len(annotation_data) == 1
-        mock_db.normalize_go_term.assert_called()
+        assert matched_input == {"GO:0003677"}
+        assert missing_input == {"GO:0006355"}
 
     @patch('utils.helper_functions.db.DB')
-    def test_retreive_query_data_no_results(self, mock_db_class):
-        """Test query data retrieval with no results."""
+    def test_retreive_query_data_term_matching_several_genes(self, mock_db_class):
+        """Test that a term matching several genes is reported once and the genes are loaded once."""
         # Setup mock
         mock_db = Mock()
         mock_db_class.return_value = mock_db
-        mock_db.get_gene_annotation_data.return_value = []
+        mock_db.match_terms_to_genes.return_value = pd.DataFrame({
+            "gene_id": [1, 2, 2], "gene_name": ["gene1", "gene2", "gene2"],
+            "term": ["dna", "dna", "binding"]
+        })
+        mock_db.get_genes_by_ids.return_value = [Mock(), Mock()]
         
         # Test
-        input_genes = ["nonexistent_gene"]
+        input_genes = ["dna", "binding", "rna"]
         annotation_data, matched_input, missing_input = retreive_query_data(
-            input_genes, "X. elegans", "Gene_ID"
+            input_genes, "X. elegans", "GO_name"
         )
         
         # Assertions
-        assert len(annotation_data) == 0
-        assert len(matched_input) == 0
-        assert "nonexistent_gene" in missing_input
+        assert len(annotation_data) == 2
+        assert matched_input == {"dna", "binding"}
+        assert missing_input == ["rna"]
+        assert list(mock_db.get_genes_by_ids.call_args.args[0]) == [1, 2]
 
     @patch('utils.helper_functions.db.DB')
-    def test_retreive_query_data_go_name(self, mock_db_class):
-        """Test query data retrieval by GO name."""
+    def test_retreive_query_data_no_results(self, mock_db_class):
+        """Test query data retrieval with no results."""
         # Setup mock
         mock_db = Mock()
         mock_db_class.return_value = mock_db
-        
-        # Mock gene with GO annotation
-        mock_go = Mock()
-        mock_go.go_name = "DNA binding"
-        
-        mock_annotation = Mock()
-        mock_annotation.go_ids = [mock_go]
-        
-        mock_gene = Mock()
-        mock_gene.annotations = [mock_annotation]
-        
-        mock_db.get_gene_annotation_data.return_value = [mock_gene]
+        mock_db.match_terms_to_genes.return_value = pd.DataFrame(columns=["gene_id", "gene_name", "term"])
         
         # Test
-        input_genes = ["dna", "rna"]
+        input_genes = ["nonexistent_gene"]
         annotation_data, matched_input, missing_input = retreive_query_data(
-            input_genes, "X. elegans", "GO_name"
+            input_genes, "X. elegans", "Gene_ID"
         )
         
         # Assertions
-        assert len(annotation_data) == 1
-        assert "dna" in matched_input
-        assert "rna" in missing_input
+        assert len(annotation_data) == 0
+        assert len(matched_input) == 0
+        assert "nonexistent_gene" in missing_input
+        mock_db.get_genes_by_ids.assert_not_called()
 
     @patch('utils.helper_functions.db.DB')
-    def test_retreive_query_data_enzyme_code(self, mock_db_class):
-        """Test query data retrieval by enzyme code."""
+    def test_resolve_query_genes_does_not_load_genes(self, mock_db_class):
+        """Test that resolving the input to gene ids does not load the Gene objects."""
         # Setup mock
         mock_db = Mock()
         mock_db_class.return_value = mock_db
-        
-        # Mock gene with enzyme annotation
-        mock_enzyme = Mock()
-        mock_enzyme.enzyme_code = "EC:1.1.1.1"
-        
-        mock_annotation = Mock()
-        mock_annotation.enzyme_codes = [mock_enzyme]
-        
-        mock_gene = Mock()
-        mock_gene.annotations = [mock_annotation]
-        
-        mock_db.get_gene_annotation_data.return_value = [mock_gene]
+        mock_db.match_terms_to_genes.return_value = pd.DataFrame({
+            "gene_id": [7, 7], "gene_name": ["gene7", "gene7"], "term": ["nac", "domain"]
+        })
         
         # Test
-        input_genes = ["1.1.1.1", "2.2.2.2"]
-        annotation_data, matched_input, missing_input = retreive_query_data(
-            input_genes, "X. elegans", "EC_code"
+        gene_ids, matched_input, missing_input = resolve_query_genes(
+            ["nac", "domain", "expansin"], "X. elegans", "Arab_common_name"
         )
         
         # Assertions
-        assert len(annotation_data) == 1
-        assert "EC:1.1.1.1" in matched_input
-        assert "2.2.2.2" in missing_input
\ No newline at end of file
+        assert gene_ids == [7]
+        assert matched_input == {"nac", "domain"}
+        assert missing_input == ["expansin"]
+        mock_db.get_genes_by_ids.assert_not_called()
+
@@ -0,0 +1,138 @@
+import re
+import pytest
+from sqlalchemy import event
+from database.models import (
+    Species, Gene, Annotation, GO, EnzymeCode, InterPro, ArabidopsisHomologue,
+    Gene_expressions, Experiments, DifferentialExpression, RegulatoryInteraction
+)
+from utils.constants import DEGFilter
+
+
+# Tables with only a handful of rows, where a full scan is cheaper than an index lookup
+SMALL_TABLES = {"species", "experiments"}
+
+# (DB method, args, kwargs) for every public query that is expected to be served by an index
+INDEXED_QUERIES = [
+    ("get_gene_expression_data", (["Xele.ptg000001l.1"], "xe_seedlings_time_course"), {}),
+    ("get_gene_expression_data", (["Xele.ptg000001l.1"], "xe_seedlings_time_course"), {"filter_deg": DEGFilter.SHOW_DEG}),
+    ("get_gene_expression_data", (["Xele.ptg000001l.1"], "xe_seedlings_time_course"), {"filter_deg": DEGFilter.SHOW_UP}),
+    ("get_gene_expression_data", (["Xele.ptg000001l.1"], "xe_seedlings_time_course"), {"filter_deg": DEGFilter.SHOW_DOWN}),
+    ("get_gene_expression_data", (None, "xe_seedlings_time_course"), {"gene_ids": [1]}),
+    ("get_gene_by_name", ("Xele.ptg000001l.1",), {}),
+    ("get_gene_names_from_species", ("X. elegans",), {}),
+    ("get_distinct_regulator_gene_names", ("X. elegans",), {}),
+    ("get_distinct_target_gene_names", ("X. elegans",), {}),
+    ("get_regulatory_interactions", (), {"directions": ["Activation"], "species_name": "X. elegans"}),
+    ("get_gene_annotation_data", (["Xele.ptg000001l.1"], "xerophyta_gene_name"), {}),
+    ("get_gene_annotation_data", (["Xele.ptg000001l.1"], "xerophyta_gene_name", "X. elegans"), {}),
+    ("get_gene_annotation_data", (["at1g01010", "AT1G01020"], "a_thaliana_locus"), {}),
+    ("get_gene_annotation_data", (["GO:0003677", "f:go:0006355"], "go_id"), {}),
+    ("get_gene_annotation_data", (["EC:3.2.2.5", "ec:2.7.1.94"], "enzyme_code"), {}),
+    ("get_gene_annotation_data", (["dna bind", "leaf senescence"], "go_name"), {}),
+    ("get_gene_annotation_data", (["glycohydrolase", "oxalate oxidase"], "enzyme_name"), {}),
+    ("get_gene_annotation_data", (["NAC domain", "expansin A4"], "a_thaliana_common_name"), {}),
+    ("get_gene_annotation_report", (["Xele.ptg000001l.1", "Xele.ptg000001l.2"],), {}),
+    ("match_terms_to_genes", (["Xele.ptg000001l.1"], "xerophyta_gene_name"), {}),
+    ("match_terms_to_genes", (["at1g01010", "AT1G01020"], "a_thaliana_locus", "X. elegans"), {}),
+    ("match_terms_to_genes", (["GO:0003677", "f:go:0006355"], "go_id"), {}),
+    ("match_terms_to_genes", (["EC:3.2.2.5", "ec:2.7.1.94"], "enzyme_code"), {}),
+    ("match_terms_to_genes", (["dna bind", "leaf senescence"], "go_name"), {}),
+    ("get_gene_ids_by_name", (["Xele.ptg000001l.1", "missing_gene"],), {}),
+    ("get_gene_ids_by_name", (["Xele.ptg000001l.1"], 1), {}),
+    ("get_go_term_ids", (["GO:0003677", "DNA binding"],), {}),
+    ("get_species_by_name", ("X. elegans",), {}),
+    ("get_experiment_by_name", ("xe_seedlings_time_course",), {}),
+    ("get_experiments_by_species", ("X. elegans",), {}),
+]
+
+
+@pytest.fixture
+def populated_db(db_instance):
+    """A database with one row in every table, so that relationship loaders also emit their queries."""
+    session = db_instance.session
+    species = Species(name="X. elegans")
+    session.add(species)
+    session.flush()
+
+    regulator = Gene(gene_name="Xele.ptg000001l.1", species_id=species.id, coding_sequence="ATG")
+    target = Gene(gene_name="Xele.ptg000001l.2", species_id=species.id, coding_sequence="ATG")
+    session.add_all([regulator, target])
+    session.flush()
+
+    annotation = Annotation(gene_id=regulator.id, description="test", e_value=1e-10)
+    annotation.go_ids.append(GO(go_id="F:GO:0003677", go_branch="F", go_name="DNA binding"))
+    annotation.enzyme_codes.append(EnzymeCode(enzyme_code="EC:3.2.2.5", enzyme_name="NAD(+) glycohydrolase"))
+    annotation.interpro_ids.append(InterPro(interpro_id="IPR000001"))
+    session.add(annotation)
+    regulator.arabidopsis_homologues.append(
+        ArabidopsisHomologue(a_thaliana_locus="AT1G01010", a_thaliana_common_name="NAC domain protein")
+    )
+
+    experiment = Experiments(experiment_name="xe_seedlings_time_course", species_id=species.id)
+    session.add(experiment)
+    session.flush()
+    session.add(Gene_expressions(
+        treatment="De", time=0, replicate="R1", normalised_expression=1.0, log2_expression=1.0,
+        experiment_id=experiment.id, species_id=species.id, gene_id=regulator.id
+    ))
+    session.add(DifferentialExpression(
+        gene_id=regulator.id, experiment_id=experiment.id, de_set="DeT12", de_direction="Up-regulated"
+    ))
+    session.add(RegulatoryInteraction(
+        regulator_gene_id=regulator.id, target_gene_id=target.id,
+        regulatory_cluster="HSF:1", target_cluster="HD-ZIP:1", direction="Activation"
+    ))
+    session.commit()
+    return db_instance
+
+
+def query_plans(database, method, *args, **kwargs):
+    """Call a DB method and return the EXPLAIN QUERY PLAN details of every SELECT it executed."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(database.engine, "before_cursor_execute", capture)
+    try:
+        getattr(database, method)(*args, **kwargs)
+    finally:
+        event.remove(database.engine, "before_cursor_execute", capture)
+
+    plans = []
+    for statement, parameters in statements:
+        rows = database.conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        plans.append([row[-1] for row in rows])
+    return plans
+
+
+def full_table_scans(plan):
+    """Return the tables in a query plan that are read with a full table scan rather than an index."""
+    scans = []
+    # subqueries SQLite builds itself (e.g. the matched search terms) are scanned by design
+    subqueries = set()
+    for detail in plan:
+        if detail.startswith(("MATERIALIZE ", "CO-ROUTINE ")):
+            subqueries.add(detail.split()[1])
+        if not detail.startswith("SCAN ") or "INDEX" in detail:
+            continue
+        table = detail.split()[1]
+        if table == "CONSTANT" or table.startswith("(") or table in subqueries:
+            continue
+        # strip the alias suffix SQLAlchemy adds to joined tables, e.g. annotations_go_1
+        if re.sub(r"_\d+$", "", table) not in SMALL_TABLES:
+            scans.append(table)
+    return scans
+
+
+class TestQueryPlans:
+    """Check that the public query methods are served by indexes instead of full table scans."""
+
+    @pytest.mark.parametrize("method, args, kwargs", INDEXED_QUERIES)
+    def test_query_uses_index(self, populated_db, method, args, kwargs):
+        plans = query_plans(populated_db, method, *args, **kwargs)
+
+        assert plans, f"{method} did not execute any query"
+        for plan in plans:
+            assert full_table_scans(plan) == [], f"{method} scans a table: {plan}"
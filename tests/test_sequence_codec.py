@@ -0,0 +1,68 @@
+import gzip
+import pytest
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+from sqlalchemy import text
+from database.sequence_codec import encode_sequence, decode_sequence, PACKED_2BIT, ZLIB
+from database.models import Gene
+from utils.fasta import iter_fasta, write_fasta
+
+
+class TestSequenceCodec:
+    """Test the compact storage of coding sequences."""
+
+    @pytest.mark.parametrize("sequence", ["A", "ACGT", "ATGGCCAAATTTGGGCCCTAA" * 10, "ATGNNNRYTAA", "atgcc", ""])
+    def test_round_trip(self, sequence):
+        assert decode_sequence(encode_sequence(sequence)) == sequence
+
+    def test_acgt_is_packed_four_bases_per_byte(self):
+        stored = encode_sequence("ACGT" * 250)
+        assert stored[:1] == PACKED_2BIT
+        assert len(stored) == 1 + 4 + 250
+        assert encode_sequence("ACGTN")[:1] == ZLIB
+
+    def test_none_and_plain_text(self):
+        assert encode_sequence(None) is None
+        assert decode_sequence(None) is None
+        # values stored before compression was introduced
+        assert decode_sequence("ATGC") == "ATGC"
+
+    def test_column_stores_compressed_sequence(self, db_instance):
+        species = db_instance.add_species("X. elegans")
+        db_instance.bulk_upsert(Gene, [{"gene_name": "Xele.ptg000001l.1", "species_id": species.id,
+                                        "coding_sequence": "ATGAAA" * 100}], ["gene_name"])
+
+        stored = db_instance.session.execute(text("SELECT coding_sequence FROM genes")).scalar_one()
+        assert isinstance(stored, bytes) and len(stored) < 600
+        assert db_instance.get_coding_sequences(["Xele.ptg000001l.1"]) == {"Xele.ptg000001l.1": "ATGAAA" * 100}
+
+
+class TestFastaWriter:
+    """Test streaming FASTA exports."""
+
+    def test_entries_are_line_wrapped(self):
+        entries = list(iter_fasta([("gene1 NAC domain", "ACGTACGTAC"), ("gene2 None", None)], line_width=4))
+        assert entries == [">gene1 NAC domain\nACGT\nACGT\nAC\n", ">gene2 None\n"]
+
+    def test_write_fasta(self):
+        records = [("gene1", "ACGT" * 30), ("gene2", "ATG")]
+
+        # the file is handed to st.download_button, so it must be a type Streamlit can serve
+        def download_bytes(fasta_file):
+            data, _ = convert_data_to_bytes_and_infer_mime(fasta_file, unsupported_error=TypeError("unsupported"))
+            return data
+
+        plain = download_bytes(write_fasta(records)).decode()
+        assert plain == "".join(iter_fasta(records))
+        assert gzip.decompress(download_bytes(write_fasta(iter(records), compress=True))).decode() == plain
+
+    def test_iter_coding_sequences_keeps_input_order(self, db_instance):
+        species = db_instance.add_species("X. elegans")
+        db_instance.bulk_upsert(Gene, [{"gene_name": f"Xele.ptg000001l.{i}", "species_id": species.id,
+                                        "coding_sequence": "ATG" * i} for i in range(1, 4)], ["gene_name"])
+        db_instance.SEQUENCE_CHUNK_SIZE = 2
+
+        sequences = list(db_instance.iter_coding_sequences(
+            ["Xele.ptg000001l.3", "missing_gene", "Xele.ptg000001l.1", "Xele.ptg000001l.2"]))
+
+        assert sequences == [("Xele.ptg000001l.3", "ATGATGATG"), ("Xele.ptg000001l.1", "ATG"),
+                             ("Xele.ptg000001l.2", "ATGATG")]
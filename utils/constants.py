@@ -73,4 +73,15 @@ GENE_SELECTION_OPTIONS = {
         "input_label": "Enter enzyme names separated by commas or newline:"
     }
 
-}
\ No newline at end of file
+}
+
+# DB.get_gene_annotation_data / DB.match_terms_to_genes query type of each gene selection input type
+GENE_INPUT_QUERY_TYPES = {
+    "Gene_ID": "xerophyta_gene_name",
+    "Arab_loci": "a_thaliana_locus",
+    "Arab_common_name": "a_thaliana_common_name",
+    "GO_id": "go_id",
+    "GO_name": "go_name",
+    "EC_code": "enzyme_code",
+    "EC_name": "enzyme_name",
+}
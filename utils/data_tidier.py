@@ -1,59 +1,82 @@
 import pandas as pd
 import numpy as np
 
+SPECIES_CODES = {
+    "Xe": "X. elegans",
+    "Xs": "X. schlechteri",
+    "Xh": "X. humilis",
+}
 
-def transform_to_long(df):
+
+def parse_sample_columns(columns):
     '''
-    Data: dataframe contating the gene expression data
-        Expects the header to be in the format:
-            "Species_Treatment_Replicate_Time" 
-            e.g "Xe_De_R2_T03", etc.
+    Parse the sample column headers of an expression matrix, once per column.
+
+    columns: the sample column names, in the format "Species_Treatment_Replicate_Time" e.g "Xe_De_R2_T03"
+
+    Returns a DataFrame indexed by column name, with categorical species, treatment, replicate and time columns.
     '''
-    # Parse the header and split it into columns
-    header = df.columns.tolist()
     parsed_columns = []
-
-    # Expects the header to be in the format "Species_Treatment_Replicate_Time" e.g "Xe_De_R2_T03", etc.
-    for col in header[1:]:  # Skip the first gene column
+    for col in columns:
         # Extract the species, treatment, replicate, and time
         parts = col.split("_")
-        
+
         species = parts[0]  # e.g., "Xe"
-        if species == "Xe":
-            species = "X. elegans"
-        elif species == "Xs":
-            species = "X. schlechteri"
-        elif species == "Xh":
-            species = "X. humilis"
-        else:
+        if species not in SPECIES_CODES:
             raise ValueError(f"Unknown species: {species}. Expected 'Xe', 'Xs', or 'Xh'.")
-        
+
         treatment = parts[1]  # e.g., "De" or "Re"
         replicate = parts[2]  # e.g., "R2", "R3", etc.
         time = parts[3]  # e.g., "T00", "T03", etc.
-        parsed_columns.append((species, treatment, replicate, time))
-
-    # Create a long-form DataFrame for database insertion
-    data = []
-    for index, row in df.iterrows():
-        gene_name = row[0]  # First column is the gene name
-        for col, (species, treatment, replicate, time) in zip(header[1:], parsed_columns):
-            expression = row[col]
-            data.append({
-                "gene_name": gene_name,
-                "species": species,
-                "treatment": treatment,
-                "replicate": replicate,
-                "time": time,
-                "expression": expression
-            })
-
-    # Convert to DataFrame
-    long_df = pd.DataFrame(data)
+        parsed_columns.append((SPECIES_CODES[species], treatment, replicate, time))
+
+    samples = pd.DataFrame(parsed_columns, index=pd.Index(columns, name="sample"),
+                           columns=["species", "treatment", "replicate", "time"])
+    return samples.astype("category")
+
+
+def transform_to_long(df, log2=False, time_as_int=False, experiment_time=False):
+    '''
+    Data: dataframe contating the gene expression data
+        Expects the first column to hold the gene names, and the header of the other columns to be in the format:
+            "Species_Treatment_Replicate_Time"
+            e.g "Xe_De_R2_T03", etc.
 
+    Returns one row per (gene, sample) with the columns gene_name, species, treatment, replicate, time and expression.
+    The sample attributes are categorical. Optionally the following steps are applied in the same pass:
+        log2: add a log2_expression column (see add_log2)
+        time_as_int: convert the time points to integers, e.g. "T03" -> 3 (see format_time_points)
+        experiment_time: convert the time points to hours since the start of the experiment (see add_experiment_time)
+    '''
+    gene_column = df.columns[0]
+    samples = parse_sample_columns(df.columns[1:].tolist())
+
+    long_df = df.melt(id_vars=gene_column, var_name="sample", value_name="expression")
+    long_df = long_df.rename(columns={gene_column: "gene_name"})
+    long_df["sample"] = long_df["sample"].astype(pd.CategoricalDtype(samples.index))
+    long_df = long_df.join(samples, on="sample")
+    long_df = long_df[["gene_name", "species", "treatment", "replicate", "time", "expression"]]
+
+    if log2:
+        long_df = add_log2(long_df)
+    if time_as_int or experiment_time:
+        long_df = format_time_points(long_df)
+    if experiment_time:
+        long_df = add_experiment_time(long_df)
     return long_df
 
- 
+
+def iter_long_chunks(df, genes_per_chunk=5000, **kwargs):
+    '''
+    Reshape an expression matrix to long format a block of genes at a time, so the long table never has to be held
+    in memory in full (e.g. when streaming it into db_manager.add_rna_seq_data).
+
+    Accepts the same keyword arguments as transform_to_long and yields its output for each block of genes.
+    '''
+    for start in range(0, len(df), genes_per_chunk):
+        yield transform_to_long(df.iloc[start:start + genes_per_chunk], **kwargs)
+
+
 def add_log2(df):
     df["log2_expression"] = np.log2(df['expression']+1)
     return df
@@ -65,6 +88,20 @@ def calculate_experiment_time(row):
     elif row['treatment'] == 'Re':
         return 24 + time
 
+def add_experiment_time(df):
+    '''
+    Vectorised calculate_experiment_time: rehydration (Re) time points follow the 24h of dehydration (De).
+    Rows with any other treatment get no time.
+    '''
+    time = df["time"].astype("Int64")
+    treatment = df["treatment"].astype(str)
+    df["time"] = time.where(treatment == "De", time + 24).where(treatment.isin(["De", "Re"]))
+    return df
+
 def format_time_points(df):
-    df["time"] = df["time"].str.replace("T", "").astype(int)
-    return df
\ No newline at end of file
+    if isinstance(df["time"].dtype, pd.CategoricalDtype):
+        # convert each distinct time point once rather than every row
+        df["time"] = df["time"].cat.rename_categories(lambda time: int(str(time).replace("T", ""))).astype(int)
+    else:
+        df["time"] = df["time"].str.replace("T", "").astype(int)
+    return df
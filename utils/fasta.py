@@ -0,0 +1,47 @@
+import io
+import zlib
+
+FASTA_LINE_WIDTH = 60
+
+
+def iter_fasta(records, line_width=FASTA_LINE_WIDTH):
+    '''
+    Lazily format FASTA entries, one string per entry.
+
+    records: iterable of (header, sequence), the header without the leading ">". A missing sequence gives an
+        entry with only the header line.
+    line_width: sequence characters per line
+    '''
+    for header, sequence in records:
+        sequence = sequence or ""
+        lines = [f">{header}"]
+        lines.extend(sequence[start:start + line_width] for start in range(0, len(sequence), line_width))
+        yield "\n".join(lines) + "\n"
+
+
+def iter_gzip(chunks, compresslevel=6):
+    '''Gzip a stream of strings, yielding the compressed bytes as they become available.'''
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, zlib.MAX_WBITS | 16)  # gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def write_fasta(records, compress=False, line_width=FASTA_LINE_WIDTH):
+    '''
+    Stream FASTA entries into an in-memory file, e.g. for st.download_button (which accepts io.BytesIO).
+
+    The entries are written (and gzipped) one at a time, so only the finished file is held in memory, never an
+    intermediate list or joined string. The file is returned rewound to the start.
+
+    records: iterable of (header, sequence), see iter_fasta
+    compress: gzip the file
+    '''
+    fasta_file = io.BytesIO()
+    entries = iter_fasta(records, line_width)
+    for data in (iter_gzip(entries) if compress else (entry.encode() for entry in entries)):
+        fasta_file.write(data)
+    fasta_file.seek(0)
+    return fasta_file
@@ -1,5 +1,6 @@
 import re 
 import database.db as db
+from utils.constants import GENE_INPUT_QUERY_TYPES
 
 
 
@@ -20,123 +21,49 @@ def parse_input(input):
     # Return unique tokens
     return tokens
 
-def retreive_query_data(input_genes,selected_species, gene_input_type):
-    """Process the logic for querying the database based on the user's input. 
+def resolve_query_genes(input_genes, selected_species, gene_input_type):
+    """Resolve the user's input to gene ids in one query, without loading the genes.
+
+    The database labels every gene it finds with the input term that matched it, so the matched and missing
+    input terms are set operations on the result.
 
     Args:
-        input_genes (_type_): _description_
-        selected_species (_type_): _description_
-        gene_input_type (_type_): _description_
+        input_genes (list): the user's search terms, e.g. from parse_input
+        selected_species (str): species name, or "Any"
+        gene_input_type (str): one of the GENE_SELECTION_OPTIONS keys, e.g. "Gene_ID" or "GO_name"
 
     Returns:
-        _type_: _description_
+        (list, set, list): the ids of the matched genes, the input terms that matched at least one gene,
+                           and the input terms that matched none
     """
     database = db.DB()
-    annotation_data = []
-    matched_input = set()
-    missing_input = set()
-
-    if gene_input_type == "Gene_ID":
-        annotation_data = database.get_gene_annotation_data(input_genes, "xerophyta_gene_name",selected_species)
-    
-        if annotation_data:
-            matched_input = {gene.gene_name.lower() for gene in annotation_data}
-        else:
-            matched_input = set()
-        missing_input = {gene for gene in input_genes if gene.lower() not in matched_input}
+    matches = database.match_terms_to_genes(input_genes, GENE_INPUT_QUERY_TYPES[gene_input_type], selected_species)
+    gene_ids = matches["gene_id"].unique().tolist()
 
-    elif gene_input_type == "Arab_loci":
-        annotation_data = database.get_gene_annotation_data(input_genes, "a_thaliana_locus",selected_species)
-    
-        if annotation_data:
-            matched_input = {gene.arabidopsis_homologues[0].a_thaliana_locus.lower() for gene in annotation_data}
-        
-        else:
-            matched_input = set()
-        
+    if gene_input_type in ("Gene_ID", "Arab_loci"):
+        # gene names and loci are reported lower-cased
+        matched_input = {term.lower() for term in matches["term"]}
         missing_input = {gene for gene in input_genes if gene.lower() not in matched_input}
-
-
-    elif gene_input_type == "Arab_common_name":
-        annotation_data = database.get_gene_annotation_data(input_genes, "a_thaliana_common_name",selected_species)
-
-        if annotation_data:
-            # Determine which search terms did not match any homologues
-            for gene in annotation_data:
-                for homologue in gene.arabidopsis_homologues:
-                    common_name = homologue.a_thaliana_common_name.lower()
-                    for term in input_genes:
-                        if term.lower() in common_name:
-                            matched_input.add(term)
-
-        missing_input = [term for term in input_genes if term not in matched_input]
-
     elif gene_input_type == "GO_id":
-        annotation_data = database.get_gene_annotation_data(input_genes, "go_id",selected_species)
-        
-        normalized_inputs = {database.normalize_go_term(term) for term in input_genes}
-
-        if annotation_data:
-            for gene in annotation_data:
-                for annotation in gene.annotations:
-                    for go in annotation.go_ids:
-                        normalized_go = database.normalize_go_term(go.go_id)
-                        # Check for partial match: if either string contains the other.
-                        # print(f'normalized_go: {normalized_go}')
-                        for user_term in normalized_inputs:
-                            if user_term in normalized_go:
-                                matched_input.add(normalized_go)
-
-        else:
-            matched_input = set()
-        missing_input = normalized_inputs - matched_input
+        matched_input = {database.normalize_go_term(term) for term in matches["term"]}
+        missing_input = {database.normalize_go_term(term) for term in input_genes} - matched_input
+    else:
+        matched_input = set(matches["term"])
+        missing_input = [term for term in input_genes if term not in matched_input]
 
-    elif gene_input_type == "GO_name":
-        annotation_data = database.get_gene_annotation_data(input_genes, "go_name",selected_species)
-        if annotation_data:
-            for gene in annotation_data:
-                for annotation in gene.annotations:
-                    # iterate over GO objects via the go_ids relationship
-                    for go in annotation.go_ids:
-                        # Ensure go.go_name exists and normalize it to lowercase
-                        go_name = go.go_name.lower() if go.go_name else ""
-                        for term in input_genes:
-                            # Check if the lowercase search term is in the GO name
-                            if term.lower() in go_name:
-                                matched_input.add(term)
-        missing_input = [term for term in input_genes if term.lower() not in {m.lower() for m in matched_input}]
+    return gene_ids, matched_input, missing_input
 
-    elif gene_input_type == "EC_code":
-        annotation_data = database.get_gene_annotation_data(input_genes, "enzyme_code",selected_species)
-        
-        matched_input = set()
-        normalized_inputs = {term for term in input_genes}
-        if annotation_data:
-            for gene in annotation_data:
-                for annotation in gene.annotations:
-                    for enzyme_code in annotation.enzyme_codes:
-                        for user_term in input_genes:
-                            if user_term in enzyme_code.enzyme_code:
-                                matched_input.add(enzyme_code.enzyme_code)
-                        
+def retreive_query_data(input_genes,selected_species, gene_input_type):
+    """Process the logic for querying the database based on the user's input. 
 
-        else:
-            matched_input = set()
-        missing_input = normalized_inputs - matched_input
-    
-    elif gene_input_type == "EC_name":
-        annotation_data = database.get_gene_annotation_data(input_genes, "enzyme_name",selected_species)
-        if annotation_data:
-            for gene in annotation_data:
-                for annotation in gene.annotations:
-                    # iterate over GO objects via the go_ids relationship
-                    for enzyme in annotation.enzyme_codes:
-                        # Ensure go.go_name exists and normalize it to lowercase
-                        enzyme_name = enzyme.enzyme_name.lower() if enzyme.enzyme_name else ""
-                        for term in input_genes:
-                            # Check if the lowercase search term is in the GO name
-                            if term.lower() in enzyme_name:
-                                matched_input.add(term)
-        missing_input = [term for term in input_genes if term.lower() not in {m.lower() for m in matched_input}]
+    Args:
+        input_genes (list): the user's search terms, e.g. from parse_input
+        selected_species (str): species name, or "Any"
+        gene_input_type (str): one of the GENE_SELECTION_OPTIONS keys, e.g. "Gene_ID" or "GO_name"
 
-    return annotation_data, matched_input, missing_input
\ No newline at end of file
+    Returns:
+        (list, set, list): the matched Gene objects, and the matched and missing input terms (see resolve_query_genes)
+    """
+    gene_ids, matched_input, missing_input = resolve_query_genes(input_genes, selected_species, gene_input_type)
+    annotation_data = db.DB().get_genes_by_ids(gene_ids) if gene_ids else []
+    return annotation_data, matched_input, missing_input
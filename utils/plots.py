@@ -11,10 +11,10 @@ mpl.rcParams['ytick.labelsize'] = 14
 
 
 
-def multi_panel_gene_expression(df, expression_values):
+def multi_panel_gene_expression(df, expression_values, replicates=True):
    
     figures = []
-    grouped = df.groupby(['gene_name', 'treatment'])
+    grouped = df.groupby(['gene_name', 'treatment'], observed=True)
 
     # Iterate over the groups and plot each
     for (gene, treatment), group in grouped:
@@ -22,7 +22,8 @@ def multi_panel_gene_expression(df, expression_values):
         fig, ax = plt.subplots(figsize=(8, 6))
 
         # Plot points for individual replicates
-        ax.scatter(group['time'], group[expression_values], label='Replicates', color='blue', alpha=0.6)
+        if replicates:
+            ax.scatter(group['time'], group[expression_values], label='Replicates', color='blue', alpha=0.6)
         
         # Calculate the mean log2_expression for each time
         avg_group = group.groupby('time').agg({expression_values: 'mean'}).reset_index()
@@ -41,11 +42,11 @@ def multi_panel_gene_expression(df, expression_values):
     return figures
 
 
-def single_panel_gene_expression(df, expression_values):
+def single_panel_gene_expression(df, expression_values, replicates=True):
     figures = []
     
     # Group by treatment (this will group all genes by their treatments)
-    grouped = df.groupby('treatment')
+    grouped = df.groupby('treatment', observed=True)
 
     fig_width, fig_height = 10, 6
 
@@ -55,15 +56,17 @@ def single_panel_gene_expression(df, expression_values):
         fig, ax = plt.subplots(figsize=(fig_width, fig_height))
 
         unique_gene_labels = [] 
-        for gene, gene_group in group.groupby('gene_name'):
+        for gene, gene_group in group.groupby('gene_name', observed=True):
             # Plot points for individual replicates
-            ax.scatter(gene_group['time'], gene_group[expression_values], label=f'{gene}', alpha=0.6)
+            if replicates:
+                ax.scatter(gene_group['time'], gene_group[expression_values], label=f'{gene}', alpha=0.6)
 
             # Calculate the mean log2_expression for each time
             avg_gene_group = gene_group.groupby('time').agg({expression_values: 'mean'}).reset_index()
 
             # Plot the average line for this gene
-            ax.plot(avg_gene_group['time'], avg_gene_group[expression_values], marker='o')
+            ax.plot(avg_gene_group['time'], avg_gene_group[expression_values], marker='o',
+                    label=None if replicates else f'{gene}')
 
             if gene not in unique_gene_labels:
                 unique_gene_labels.append(gene)
@@ -87,8 +90,8 @@ def single_panel_gene_expression(df, expression_values):
         figures.append(fig)
 
     return figures
-def dual_panel_gene_expression(df, expression_values):
-    grouped = df.groupby('treatment')
+def dual_panel_gene_expression(df, expression_values, replicates=True):
+    grouped = df.groupby('treatment', observed=True)
     treatments = sorted(grouped.groups.keys())
     
     fig_width, fig_height = 10, 6
@@ -101,20 +104,21 @@ def dual_panel_gene_expression(df, expression_values):
         times = sorted(group['time'].unique())
         ax.set_xticks(times)
         
-        for gene, gene_group in group.groupby('gene_name'):
-            if gene not in legend_handles:
+        for gene, gene_group in group.groupby('gene_name', observed=True):
+            color = legend_handles[gene][1] if gene in legend_handles else None
+            avg_gene_group = gene_group.groupby('time').agg({expression_values: 'mean'}).reset_index()
+
+            if replicates:
                 sc = ax.scatter(gene_group['time'], gene_group[expression_values],
-                                label=gene, alpha=0.6)
+                                label=gene, color=color, alpha=0.6)
                 color = sc.get_facecolors()[0]
-                legend_handles[gene] = (sc, color)
-            else:
-                color = legend_handles[gene][1]
-                ax.scatter(gene_group['time'], gene_group[expression_values],
-                           color=color, alpha=0.6)
-            
-            avg_gene_group = gene_group.groupby('time').agg({expression_values: 'mean'}).reset_index()
-            ax.plot(avg_gene_group['time'], avg_gene_group[expression_values],
-                    marker='o', color=color)
+                handle = sc
+            line, = ax.plot(avg_gene_group['time'], avg_gene_group[expression_values],
+                            marker='o', color=color)
+            if not replicates:
+                color = line.get_color()
+                handle = line
+            legend_handles.setdefault(gene, (handle, color))
         
         ax.set_xlabel('Treatment Time')
         ax.set_title(f"Expression of Genes under {treatment}hydration")
@@ -133,7 +137,7 @@ def dual_panel_gene_expression(df, expression_values):
     
     return fig
 
-def individual_gene_expression(df, expression_values):
+def individual_gene_expression(df, expression_values, replicates=True):
     """
     Creates a figure with one row per gene. For each gene, the left panel shows the dehydration data
     and the right panel shows the rehydration data. Each panel plots individual sample points along with 
@@ -143,6 +147,8 @@ def individual_gene_expression(df, expression_values):
         df (pd.DataFrame): DataFrame containing columns 'gene_name', 'treatment', 'time', and the 
                            expression values (e.g., 'log2_expression').
         expression_values (str): The name of the expression column in df.
+        replicates (bool): Plot the individual sample points. Set to False for a df that already holds
+                           one mean per time point (e.g. from DB.get_expression_summary).
         
     Returns:
         fig (matplotlib.figure.Figure): The combined figure.
@@ -179,7 +185,8 @@ def individual_gene_expression(df, expression_values):
                 ax.set_title(f"{gene} - {treatment_mapping[treatment]} (No Data)")
             else:
                 # Plot individual sample points
-                ax.scatter(treatment_data['time'], treatment_data[expression_values], alpha=0.6)
+                if replicates:
+                    ax.scatter(treatment_data['time'], treatment_data[expression_values], alpha=0.6)
                 
                 # Compute and plot the average expression per time point
                 avg_df = treatment_data.groupby('time', as_index=False).agg({expression_values: 'mean'})